@@ -0,0 +1,119 @@
+"""Durable agent checkpoints, so interrupted runs resume instead of restarting.
+
+Agent runs given a thread ID save their graph state after every step to a local
+SQLite database instead of process memory. A generation job uses its job ID as
+the thread ID: when the worker running it dies, the job is picked up again on
+restart and continues from its last completed model turn or tool call, with
+the story itself restored from its journal.
+
+Disk use stays bounded in two ways. Each thread keeps only its latest
+checkpoint and the one before it, since resuming never needs older ones, and
+threads nobody has touched within the retention window (jobs abandoned by a
+crash and never resumed) are deleted by prune(). Finished runs delete their
+thread straight away.
+
+Settings (environment variables):
+    STORYTIME_CHECKPOINT_DB=src/backend/agents/checkpoints.db    checkpoint database
+    STORYTIME_CHECKPOINT_RETENTION=259200                        seconds an untouched thread is kept
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from .instrumentation import metrics
+
+CHECKPOINT_DB_PATH = os.getenv("STORYTIME_CHECKPOINT_DB", "src/backend/agents/checkpoints.db")
+CHECKPOINT_RETENTION_SECONDS = int(os.getenv("STORYTIME_CHECKPOINT_RETENTION", str(3 * 24 * 60 * 60)))
+
+
+class TrimmingSqliteSaver(SqliteSaver):
+    """SqliteSaver that drops a thread's older checkpoints as new ones are saved.
+
+    Every checkpoint holds the thread's whole message history, so keeping them all
+    grows quadratically with the number of steps.
+    """
+
+    def setup(self):
+        super().setup()
+        with self.cursor() as cur:
+            cur.execute(
+                """CREATE TABLE IF NOT EXISTS checkpoint_threads (
+                    thread_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            cur.execute("CREATE INDEX IF NOT EXISTS checkpoint_threads_updated ON checkpoint_threads (updated_at)")
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        parent_id = config["configurable"].get("checkpoint_id")
+        if parent_id:
+            # The parent is kept too: it is the one a step in progress is writing to
+            key = (str(config["configurable"]["thread_id"]), config["configurable"].get("checkpoint_ns", ""), parent_id)
+            with self.cursor() as cur:
+                cur.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?", key)
+                cur.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?", key)
+        return saved
+
+    def delete_thread(self, thread_id: str):
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM checkpoint_threads WHERE thread_id = ?", (str(thread_id),))
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer() -> TrimmingSqliteSaver:
+    """Return the process-wide durable checkpointer, opening its database on first use."""
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            if os.path.dirname(CHECKPOINT_DB_PATH):
+                os.makedirs(os.path.dirname(CHECKPOINT_DB_PATH), exist_ok=True)
+            # Shared by every agent thread in the process; the saver serializes access itself.
+            # The timeout covers other worker processes writing to the same database.
+            conn = sqlite3.connect(CHECKPOINT_DB_PATH, check_same_thread=False, timeout=30)
+            checkpointer = TrimmingSqliteSaver(conn)
+            checkpointer.setup()
+            _checkpointer = checkpointer
+    return _checkpointer
+
+
+def touch(thread_id: str):
+    """Record that a thread is in use, restarting its retention window."""
+    with get_checkpointer().cursor() as cur:
+        cur.execute(
+            "INSERT INTO checkpoint_threads (thread_id, updated_at) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+            (thread_id, time.time()),
+        )
+
+
+def has_checkpoint(checkpointer, thread_id: str) -> bool:
+    """Whether a thread has saved state to resume from."""
+    return checkpointer.get_tuple({"configurable": {"thread_id": thread_id}}) is not None
+
+
+def delete_thread(thread_id: str):
+    """Delete everything saved for a thread."""
+    get_checkpointer().delete_thread(thread_id)
+
+
+def prune(max_age_seconds: float = CHECKPOINT_RETENTION_SECONDS) -> int:
+    """Delete threads not touched within max_age_seconds. Returns the number deleted."""
+    checkpointer = get_checkpointer()
+    with checkpointer.cursor() as cur:
+        cur.execute("SELECT thread_id FROM checkpoint_threads WHERE updated_at < ?", (time.time() - max_age_seconds,))
+        stale = [row[0] for row in cur.fetchall()]
+    for thread_id in stale:
+        checkpointer.delete_thread(thread_id)
+    if stale:
+        metrics.increment("storytime_checkpoint_threads_pruned_total", {}, len(stale),
+                          help="Agent checkpoint threads deleted after the retention window")
+    return len(stale)
@@ -0,0 +1,69 @@
+"""Agent graphs compiled once per process.
+
+create_agent builds and compiles a LangGraph graph, which costs far more than an
+agent run's setup should. Each agent's graph is compiled on first use for a
+model and set of extra tools and then shared by every later agent instance.
+Nothing request-specific is baked into a shared graph: tools reach the story or
+report they work on through the runtime context passed with each invocation,
+and each agent instance runs a shallow copy of the graph holding its own
+checkpointer.
+
+Settings (environment variables):
+    STORYTIME_AGENT_SETUP_BUDGET=0.05    seconds an agent instance may take to set up
+"""
+
+import os
+import threading
+import time
+
+from .instrumentation import DURATION_BUCKETS, metrics
+
+AGENT_SETUP_BUDGET_SECONDS = float(os.getenv("STORYTIME_AGENT_SETUP_BUDGET", "0.05"))
+SETUP_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def get_graph(agent_name: str, model, extra_tools, build):
+    """Return the shared graph of an agent, compiling it with build() on first use.
+
+    Args:
+        agent_name: "news" or "tester".
+        model: Model name or chat model the graph uses.
+        extra_tools: Tools added to the agent's own, part of the graph's identity.
+        build: Callable compiling the graph.
+    """
+    from .replay import get_replay_session
+
+    # Models are wrapped for the active replay session when the graph is built, so graphs
+    # built inside different sessions (or outside any) are kept apart
+    key = (
+        agent_name,
+        model if isinstance(model, str) else id(model),
+        tuple(id(tool) for tool in extra_tools),
+        id(get_replay_session()),
+    )
+    with _graphs_lock:
+        graph = _graphs.get(key)
+        if graph is None:
+            started = time.perf_counter()
+            graph = build()
+            metrics.observe("storytime_agent_graph_build_seconds", {"agent": agent_name},
+                            time.perf_counter() - started, DURATION_BUCKETS, "Time to compile an agent graph")
+            _graphs[key] = graph
+    return graph
+
+
+def with_checkpointer(graph, checkpointer):
+    """A shallow copy of a compiled graph that saves its state to checkpointer."""
+    return graph.copy(update={"checkpointer": checkpointer})
+
+
+def record_setup(agent_name: str, seconds: float):
+    """Record how long an agent instance took to set up, and whether it exceeded the budget."""
+    labels = {"agent": agent_name}
+    metrics.observe("storytime_agent_setup_seconds", labels, seconds, SETUP_BUCKETS, "Time to set up an agent instance")
+    if seconds > AGENT_SETUP_BUDGET_SECONDS:
+        metrics.increment("storytime_agent_setup_over_budget_total", labels,
+                          help="Agent instances that took longer than the setup budget to set up")
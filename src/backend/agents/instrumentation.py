@@ -0,0 +1,200 @@
+"""Latency, token, cost and payload instrumentation for agent tool and model calls.
+
+InstrumentationMiddleware (in middleware.py) is added to every create_agent graph and
+records each model call and tool call twice: into process-wide histograms and counters,
+exposed in Prometheus text format by the API's /metrics endpoint, and into the
+current Trace, if one is active. A trace covers one job (a story generation or
+a simulation topic), is aggregated per tool and model, and is written to
+TRACE_STORAGE_DIR so the slowest steps of a story can be found afterwards.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+TRACE_STORAGE_DIR = "src/backend/agents/traces"
+
+# USD per million (input, output) tokens, used to estimate model call cost
+MODEL_PRICES_PER_MILLION = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+BYTES_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+def estimate_cost(model_name: str, input_tokens: int, output_tokens: int) -> float:
+    """Estimate the USD cost of a model call, or 0 for models without a known price."""
+    # Dated snapshots like gpt-4o-mini-2024-07-18 are priced like their base model
+    for name in sorted(MODEL_PRICES_PER_MILLION, key=len, reverse=True):
+        if model_name and model_name.startswith(name):
+            input_price, output_price = MODEL_PRICES_PER_MILLION[name]
+            return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+    return 0.0
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """Process-wide histograms, counters and gauges, keyed by metric name and label values."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self.values: Dict[Tuple[str, Tuple], float] = {}
+        self.help = {}
+
+    def observe(self, name: str, labels: dict, value: float, buckets: Tuple[float, ...], help: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.help[name] = ("histogram", help)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def increment(self, name: str, labels: dict, value: float = 1.0, help: str = ""):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.help[name] = ("counter", help)
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, labels: dict, value: float, help: str = ""):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.help[name] = ("gauge", help)
+            self.values[key] = value
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self.lock:
+            for name in sorted(self.help):
+                kind, help = self.help[name]
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "histogram":
+                    for (metric, labels), histogram in sorted(self.histograms.items()):
+                        if metric != name:
+                            continue
+                        for bound, count in zip(histogram.buckets, histogram.counts):
+                            lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {count}")
+                        lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+                        lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+                        lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+                else:
+                    for (metric, labels), value in sorted(self.values.items()):
+                        if metric == name:
+                            lines.append(f"{name}{label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class Trace:
+    """Spans recorded for one job, aggregated and written to a trace file when it ends."""
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.started_at = time.time()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add_span(self, span: dict):
+        with self.lock:
+            self.spans.append(span)
+
+    def summary(self) -> dict:
+        """Aggregate spans per tool and per model, plus the slowest individual steps."""
+        with self.lock:
+            spans = list(self.spans)
+        totals = {}
+        for span in spans:
+            group = totals.setdefault(f"{span['kind']}:{span['name']}", {
+                "calls": 0, "errors": 0, "duration_seconds": 0.0,
+                "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+                "input_bytes": 0, "output_bytes": 0,
+            })
+            group["calls"] += 1
+            group["errors"] += 1 if span.get("error") else 0
+            for field in ("duration_seconds", "input_tokens", "output_tokens", "cost_usd", "input_bytes", "output_bytes"):
+                group[field] += span.get(field, 0)
+        return {
+            "model_turns": sum(1 for span in spans if span["kind"] == "llm"),
+            "tool_calls": sum(1 for span in spans if span["kind"] == "tool"),
+            "input_tokens": sum(span.get("input_tokens", 0) for span in spans),
+            "output_tokens": sum(span.get("output_tokens", 0) for span in spans),
+            "cost_usd": sum(span.get("cost_usd", 0.0) for span in spans),
+            "context_tokens_saved": sum(span.get("tokens_saved", 0) for span in spans),
+            "by_step": totals,
+            "slowest": sorted(spans, key=lambda span: span["duration_seconds"], reverse=True)[:10],
+        }
+
+    def save(self) -> str:
+        """Write the trace and its summary to TRACE_STORAGE_DIR and return the path."""
+        os.makedirs(TRACE_STORAGE_DIR, exist_ok=True)
+        path = os.path.join(TRACE_STORAGE_DIR, f"{self.trace_id}.json")
+        with self.lock:
+            spans = list(self.spans)
+        with open(path, 'w') as f:
+            json.dump({
+                "trace_id": self.trace_id,
+                "started_at": self.started_at,
+                "duration_seconds": time.time() - self.started_at,
+                "summary": self.summary(),
+                "spans": spans,
+            }, f, indent=2)
+        return path
+
+
+_current_trace = contextvars.ContextVar("storytime_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def tracing(trace_id: str):
+    """Collect spans from agent calls made inside the block into a trace, saved on exit."""
+    trace = Trace(trace_id)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.save()
+
+
+def load_trace(trace_id: str) -> Optional[dict]:
+    """Read a saved trace file, or return None if there is none."""
+    path = os.path.join(TRACE_STORAGE_DIR, f"{os.path.basename(trace_id)}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,268 @@
+"""Agent middleware shared by the news and tester agent graphs.
+
+Kept apart from instrumentation.py so that the metrics and traces it feeds can be
+imported (by the API, for /metrics) without loading LangChain.
+
+Settings (environment variables):
+    STORYTIME_CONTEXT_TOKEN_BUDGET=40000    estimated tokens of conversation sent per model call
+    STORYTIME_CONTEXT_KEEP_TURNS=3          model turns whose tool results are always sent whole
+"""
+
+import json
+import os
+import time
+
+from langchain.agents.middleware import AgentMiddleware
+
+from .instrumentation import (
+    BYTES_BUCKETS,
+    DURATION_BUCKETS,
+    TOKEN_BUCKETS,
+    current_trace,
+    estimate_cost,
+    metrics,
+)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("STORYTIME_CONTEXT_TOKEN_BUDGET", "40000"))
+CONTEXT_KEEP_TURNS = int(os.getenv("STORYTIME_CONTEXT_KEEP_TURNS", "3"))
+# Rough size of a token in English text and JSON, good enough for budgeting
+CHARS_PER_TOKEN = 4
+# Tool results shorter than this cost less than the reference that would replace them
+MIN_COMPACT_CHARS = 600
+COMPACT_PREVIEW_CHARS = 200
+
+
+def _payload_bytes(value) -> int:
+    if isinstance(value, str):
+        return len(value.encode())
+    return len(json.dumps(value, default=str).encode())
+
+
+class InstrumentationMiddleware(AgentMiddleware):
+    """Agent middleware timing every model and tool call made by an agent graph."""
+    def __init__(self, agent_name: str):
+        super().__init__()
+        self.agent_name = agent_name
+
+    def wrap_model_call(self, request, handler):
+        started = time.perf_counter()
+        error = None
+        try:
+            response = handler(request)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            messages = [] if error is not None else getattr(response, "result", [response])
+            self._record_model_call(request, messages, duration, error)
+        return response
+
+    def _record_model_call(self, request, messages, duration, error):
+        ai_message = messages[-1] if messages else None
+        usage = (getattr(ai_message, "usage_metadata", None) or {}) if ai_message is not None else {}
+        response_metadata = getattr(ai_message, "response_metadata", None) or {}
+        model_name = response_metadata.get("model_name") or getattr(request.model, "model_name", None) or "unknown"
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        cost = estimate_cost(model_name, input_tokens, output_tokens)
+        labels = {"agent": self.agent_name, "model": model_name}
+
+        metrics.observe("storytime_llm_duration_seconds", labels, duration, DURATION_BUCKETS, "Model call latency")
+        metrics.observe("storytime_llm_input_tokens", labels, input_tokens, TOKEN_BUCKETS, "Prompt tokens per model call")
+        metrics.increment("storytime_llm_tokens_total", {**labels, "direction": "input"}, input_tokens, "Tokens used by model calls")
+        metrics.increment("storytime_llm_tokens_total", {**labels, "direction": "output"}, output_tokens, "Tokens used by model calls")
+        metrics.increment("storytime_llm_cost_usd_total", labels, cost, "Estimated model cost in USD")
+        if error is not None:
+            metrics.increment("storytime_llm_errors_total", labels, help="Model calls that raised")
+
+        trace = current_trace()
+        if trace is not None:
+            trace.add_span({
+                "kind": "llm",
+                "name": model_name,
+                "agent": self.agent_name,
+                "started_at": time.time() - duration,
+                "duration_seconds": duration,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cost_usd": cost,
+                "input_messages": len(request.messages),
+                "input_bytes": sum(_payload_bytes(message.content) for message in request.messages),
+                "output_bytes": sum(_payload_bytes(message.content) for message in messages),
+                "tool_calls": [call["name"] for call in getattr(ai_message, "tool_calls", None) or []],
+                "error": str(error) if error is not None else None,
+            })
+
+    def wrap_tool_call(self, request, handler):
+        tool_name = request.tool_call["name"]
+        started = time.perf_counter()
+        error = None
+        result = None
+        try:
+            result = handler(request)
+            # Tools report failures as strings, so treat those like raised errors
+            content = str(getattr(result, "content", ""))
+            if getattr(result, "status", None) == "error" or content.startswith("Error"):
+                error = content[:500]
+            return result
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            input_bytes = _payload_bytes(request.tool_call.get("args", {}))
+            output_bytes = _payload_bytes(getattr(result, "content", "")) if result is not None else 0
+            labels = {"agent": self.agent_name, "tool": tool_name}
+            metrics.observe("storytime_tool_duration_seconds", labels, duration, DURATION_BUCKETS, "Tool call latency")
+            metrics.observe("storytime_tool_output_bytes", labels, output_bytes, BYTES_BUCKETS, "Size of tool results")
+            if error is not None:
+                metrics.increment("storytime_tool_errors_total", labels, help="Tool calls that failed")
+            trace = current_trace()
+            if trace is not None:
+                trace.add_span({
+                    "kind": "tool",
+                    "name": tool_name,
+                    "agent": self.agent_name,
+                    "started_at": time.time() - duration,
+                    "duration_seconds": duration,
+                    "input_bytes": input_bytes,
+                    "output_bytes": output_bytes,
+                    "error": error,
+                })
+
+
+def _estimate_tokens(message) -> int:
+    size = _payload_bytes(message.content)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        size += _payload_bytes([call.get("args", {}) for call in tool_calls])
+    return size // CHARS_PER_TOKEN
+
+
+def compact_messages(messages: list, keep_turns: int = CONTEXT_KEEP_TURNS, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                     hints: dict = None, snapshot_tools=()) -> tuple:
+    """Replace stale tool results in a conversation with short references.
+
+    A tool result is stale when it answers a model turn older than the last keep_turns
+    (never the latest turn, even with keep_turns <= 0), or when it is a snapshot (e.g.
+    the whole story) that a later call of the same tool replaced. If the conversation is still over token_budget, results are compacted
+    from the oldest on, except those answering the latest model turn.
+
+    Args:
+        messages: The conversation sent to the model. Not modified.
+        keep_turns: Number of most recent model turns whose tool results are kept whole.
+        token_budget: Estimated tokens the conversation may take.
+        hints: Tool name to a sentence telling the model where a removed result can be found again.
+        snapshot_tools: Names of tools whose results are superseded by their next call.
+
+    Returns:
+        (compacted messages, estimated tokens saved)
+    """
+    hints = hints or {}
+    calls = {}
+    turn_starts = []
+    for i, message in enumerate(messages):
+        if message.type == "ai":
+            turn_starts.append(i)
+            for call in getattr(message, "tool_calls", None) or []:
+                calls[call["id"]] = call
+    if keep_turns <= 0:
+        recent_from = len(messages)
+    else:
+        recent_from = turn_starts[-keep_turns] if len(turn_starts) >= keep_turns else 0
+    latest_from = turn_starts[-1] if turn_starts else 0
+    # The latest turn's results are always kept whole, however few turns are kept
+    recent_from = min(recent_from, latest_from)
+
+    def tool_name(message):
+        return message.name or calls.get(message.tool_call_id, {}).get("name", "tool")
+
+    latest_snapshot = {}
+    for i, message in enumerate(messages):
+        if message.type == "tool" and tool_name(message) in snapshot_tools:
+            latest_snapshot[tool_name(message)] = i
+
+    def compactable(message):
+        return message.type == "tool" and len(str(message.content)) >= MIN_COMPACT_CHARS
+
+    def compacted(message):
+        content = str(message.content)
+        name = tool_name(message)
+        args = json.dumps(calls.get(message.tool_call_id, {}).get("args", {}), default=str)[:COMPACT_PREVIEW_CHARS]
+        hint = hints.get(name, f"Call {name} again if you need it.")
+        return message.model_copy(update={"content": (
+            f"[Result of {name}({args}) from an earlier turn removed to save context: "
+            f"{len(content) // CHARS_PER_TOKEN} tokens, starting: {content[:COMPACT_PREVIEW_CHARS]!r}. {hint}]"
+        )})
+
+    result = list(messages)
+    for i, message in enumerate(messages):
+        superseded = message.type == "tool" and latest_snapshot.get(tool_name(message), i) != i
+        if compactable(message) and (i < recent_from or superseded):
+            result[i] = compacted(message)
+    tokens = sum(_estimate_tokens(message) for message in result)
+    for i, message in enumerate(messages):
+        if tokens <= token_budget or i >= latest_from:
+            break
+        if result[i] is message and compactable(message):
+            result[i] = compacted(message)
+            tokens -= _estimate_tokens(message) - _estimate_tokens(result[i])
+    saved = sum(_estimate_tokens(message) for message in messages) - tokens
+    return result, saved
+
+
+class ContextWindowMiddleware(AgentMiddleware):
+    """Agent middleware keeping the conversation sent to the model within a token budget.
+
+    Agents re-send their whole history every turn, and tool results such as search
+    result pages or the full story JSON dominate it. Stale results are replaced with
+    short references (see compact_messages) in what is sent to the model only; the
+    graph state keeps every message, and the data itself lives on in the story or
+    report the tools work on.
+    """
+    def __init__(self, agent_name: str, hints: dict = None, snapshot_tools=(),
+                 keep_turns: int = CONTEXT_KEEP_TURNS, token_budget: int = CONTEXT_TOKEN_BUDGET):
+        """
+        Args:
+            agent_name: Label for metrics and traces.
+            hints: Tool name to a sentence telling the model where a removed result can be found again.
+            snapshot_tools: Names of tools whose results are superseded by their next call.
+            keep_turns: Number of most recent model turns whose tool results are kept whole.
+            token_budget: Estimated tokens of conversation sent per model call.
+        """
+        super().__init__()
+        self.agent_name = agent_name
+        self.hints = hints or {}
+        self.snapshot_tools = frozenset(snapshot_tools)
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+
+    def wrap_model_call(self, request, handler):
+        started = time.perf_counter()
+        messages, saved = compact_messages(request.messages, self.keep_turns, self.token_budget,
+                                           self.hints, self.snapshot_tools)
+        tokens = sum(_estimate_tokens(message) for message in messages)
+        duration = time.perf_counter() - started
+
+        labels = {"agent": self.agent_name}
+        metrics.observe("storytime_context_tokens", labels, tokens, TOKEN_BUCKETS,
+                        "Estimated conversation tokens sent per model call, after compaction")
+        metrics.increment("storytime_context_tokens_saved_total", labels, saved,
+                          "Estimated tokens removed from model calls by compacting stale tool results")
+        if tokens > self.token_budget:
+            metrics.increment("storytime_context_over_budget_total", labels,
+                              help="Model calls still over the context token budget after compaction")
+        trace = current_trace()
+        if trace is not None:
+            trace.add_span({
+                "kind": "context",
+                "name": self.agent_name,
+                "started_at": time.time() - duration,
+                "duration_seconds": duration,
+                "context_tokens": tokens,
+                "tokens_saved": saved,
+            })
+        if saved == 0:
+            return handler(request)
+        return handler(request.override(messages=messages))
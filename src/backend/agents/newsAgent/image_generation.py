@@ -0,0 +1,122 @@
+"""Pooled, concurrent client for the OpenAI image generation API.
+
+All image requests go through one requests.Session so connections are reused,
+every request has a timeout, and batches of images for a story are generated
+concurrently (up to IMAGE_GENERATION_CONCURRENCY at a time) instead of one
+after another.
+"""
+
+import base64
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Tuple
+
+from ...stories import image_store, thumbnails
+from ..replay import get_replay_session, ReplayHTTPSession
+
+IMAGE_GENERATION_URL = "https://api.openai.com/v1/images/generations"
+IMAGE_GENERATION_MODEL = "gpt-image-1"
+IMAGE_GENERATION_CONCURRENCY = int(os.getenv("STORYTIME_IMAGE_CONCURRENCY", "4"))
+# (connect, read) timeouts; generating a single image can take a minute or more
+IMAGE_GENERATION_TIMEOUT = (10, float(os.getenv("STORYTIME_IMAGE_TIMEOUT_SECONDS", "180")))
+
+
+class ImageGenerationError(Exception):
+    """Raised when the image API fails or returns no usable image."""
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            replay_session = get_replay_session()
+            if replay_session is not None and not replay_session.recording:
+                _session = ReplayHTTPSession(replay_session)
+                return _session
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            # Enough pooled connections for a full batch to run at once
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=IMAGE_GENERATION_CONCURRENCY)
+            _session.mount("https://", adapter)
+            if replay_session is not None:
+                _session = ReplayHTTPSession(replay_session, inner=_session)
+        return _session
+
+
+def generate_image(prompt: str, size: str = "1024x1024") -> str:
+    """Generate one image and return a URL to it.
+
+    Base64 responses are written to the image store and its URL is returned.
+
+    Raises:
+        ImageGenerationError: If the request fails or the response has no image.
+    """
+    import requests
+    try:
+        response = _get_session().post(
+            IMAGE_GENERATION_URL,
+            headers={
+                "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": IMAGE_GENERATION_MODEL,
+                "prompt": prompt,
+                "size": size
+            },
+            timeout=IMAGE_GENERATION_TIMEOUT
+        )
+    except requests.exceptions.RequestException as e:
+        raise ImageGenerationError(f"Request failed - {str(e)}") from e
+    if response.status_code != 200:
+        error_detail = response.text
+        try:
+            error_detail = response.json().get('error', {}).get('message', error_detail)
+        except ValueError:
+            pass
+        raise ImageGenerationError(f"HTTP {response.status_code} - {error_detail}")
+
+    data = response.json()
+    if not data.get('data'):
+        raise ImageGenerationError("Invalid response format")
+    image_data = data['data'][0]
+    if 'url' in image_data:
+        return image_data['url']
+    if 'b64_json' in image_data:
+        image_url = image_store.image_url(image_store.save_image(base64.b64decode(image_data['b64_json'])))
+        # Done here so a batch's thumbnails are made concurrently with the rest of the batch
+        thumbnails.create_thumbnails(image_url)
+        return image_url
+    raise ImageGenerationError("No image data found in response")
+
+
+def generate_images(image_requests: List[dict], max_workers: int = IMAGE_GENERATION_CONCURRENCY) -> Iterator[Tuple[dict, str, Exception]]:
+    """Generate several images concurrently, yielding each as soon as it finishes.
+
+    Args:
+        image_requests: Dicts with "prompt" and optional "size", plus any other keys
+            the caller wants handed back (e.g. "segment_title").
+        max_workers: Maximum number of images generated at once.
+
+    Yields:
+        (request, image_url, error) tuples in completion order. Exactly one of
+        image_url and error is None.
+    """
+    if not image_requests:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(image_requests)), thread_name_prefix="image-gen") as executor:
+        futures = {
+            executor.submit(generate_image, request["prompt"], request.get("size") or "1024x1024"): request
+            for request in image_requests
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
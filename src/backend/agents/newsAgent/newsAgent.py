@@ -1,6 +1,7 @@
 from langgraph.checkpoint.memory import InMemorySaver
 from langchain.agents import create_agent
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional
+import time
 import uuid
 import os
 import dotenv
@@ -9,24 +10,104 @@ env_path = os.path.join(backend_dir, '.env')
 dotenv.load_dotenv(env_path)
 
 from .prompts import news_agent_system_prompt
-from .story_tools_interface import create_story_tools
+from .story_tools_interface import STORY_TOOLS, STORY_SNAPSHOT_TOOLS, STORY_TOOL_RESULT_HINTS, StoryContext
 from ...stories.story_structure import StoryStructure
+from ..replay import resolve_chat_model
+from ..graph_cache import get_graph, record_setup, with_checkpointer
+from .. import checkpoints
+from ..middleware import ContextWindowMiddleware, InstrumentationMiddleware
+
+# Tool results can be whole search result pages, so streamed events only carry the start
+TOOL_RESULT_PREVIEW_CHARS = 500
+
+def get_news_agent_graph(model: str = "gpt-4o-mini", tools: tuple = ()):
+    """Return the news agent graph for a model, compiling it on first use in this process."""
+    return get_graph("news", model, tools, lambda: create_agent(
+        model=resolve_chat_model(model),
+        tools=STORY_TOOLS + list(tools),
+        system_prompt=news_agent_system_prompt,
+        # Compaction runs first, so instrumentation records what is actually sent to the model
+        middleware=[
+            ContextWindowMiddleware("news", hints=STORY_TOOL_RESULT_HINTS, snapshot_tools=STORY_SNAPSHOT_TOOLS),
+            InstrumentationMiddleware("news"),
+        ],
+        context_schema=StoryContext
+    ))
 
 class NewsAgent:
-    def __init__(self, story: StoryStructure, model: str = "gpt-4o-mini", tools = []):
+    def __init__(self, story: StoryStructure, model: str = "gpt-4o-mini", tools = [], thread_id: str = None):
+        """
+        Args:
+            story: The story the agent writes.
+            model: Chat model name.
+            tools: Tools added to the story tools.
+            thread_id: Saves the run's state durably under this ID (see agents.checkpoints), so an
+                interrupted run can be resumed by a new agent with the same ID. The story should then
+                be journaled, so its edits survive too. Without it, state is kept in memory.
+        """
+        started = time.perf_counter()
         self.story = story
         self.model = model
         self.system_prompt = news_agent_system_prompt
-        self.tools = create_story_tools(story) + tools
-        self.checkpointer = InMemorySaver()
-        self.thread_id = str(uuid.uuid4())
-        self.agent = create_agent( 
-            model=model,
-            tools=self.tools,
-            system_prompt=self.system_prompt,
-            checkpointer=self.checkpointer
-        )
+        self.tools = STORY_TOOLS + tools
+        self.context = StoryContext(story=story)
+        if thread_id is None:
+            self.checkpointer = InMemorySaver()
+            self.thread_id = str(uuid.uuid4())
+        else:
+            self.checkpointer = checkpoints.get_checkpointer()
+            self.thread_id = thread_id
+            checkpoints.touch(thread_id)
+        self.agent = with_checkpointer(get_news_agent_graph(model, tuple(tools)), self.checkpointer)
+        record_setup("news", time.perf_counter() - started)
+
+    def has_checkpoint(self) -> bool:
+        """Whether this agent's thread has saved state, i.e. invoking with no input resumes a run."""
+        return checkpoints.has_checkpoint(self.checkpointer, self.thread_id)
+
+    def discard(self):
+        """Delete the saved state of this agent's thread once its run is finished."""
+        self.checkpointer.delete_thread(self.thread_id)
     
-    def invoke(self, input: Dict[str, Any]):
-        response = self.agent.invoke(input, config={"configurable": {"thread_id": self.thread_id}})
+    def invoke(self, input: Optional[Dict[str, Any]]):
+        """Run the agent on input, or with None continue from the thread's last checkpoint."""
+        response = self.agent.invoke(input, config={"configurable": {"thread_id": self.thread_id}}, context=self.context)
         return response
+
+    def stream(self, input: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Run the agent like invoke, yielding progress events as it works.
+
+        Tool calls come from the graph's "updates" stream, and story edits (segments,
+        text, images, title) from the "custom" events the story tools write.
+        """
+        for mode, chunk in self.agent.stream(
+            input,
+            config={"configurable": {"thread_id": self.thread_id}},
+            context=self.context,
+            stream_mode=["updates", "custom"]
+        ):
+            if mode == "custom":
+                yield chunk
+                continue
+            for update in chunk.values():
+                if not isinstance(update, dict):
+                    continue
+                for message in update.get("messages", []):
+                    yield from _message_events(message)
+
+
+def _message_events(message) -> Iterator[Dict[str, Any]]:
+    """Translate a message from a graph update into progress events."""
+    if message.type == "ai":
+        for tool_call in message.tool_calls:
+            yield {"event": "tool_started", "tool": tool_call["name"], "id": tool_call["id"], "args": tool_call["args"]}
+        if not message.tool_calls and message.content:
+            yield {"event": "message", "content": message.content}
+    elif message.type == "tool":
+        yield {
+            "event": "tool_finished",
+            "tool": message.name,
+            "id": message.tool_call_id,
+            "status": getattr(message, "status", "success"),
+            "result": str(message.content)[:TOOL_RESULT_PREVIEW_CHARS]
+        }
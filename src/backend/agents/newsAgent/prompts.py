@@ -64,14 +64,25 @@ You should now build the story. If necesssary, conduct background research
 on the topic and collect citations, storing them in your research document.
 Then, write each story segment and add images, making sure to maintain
 the clever, concise and engaging narrative style characterisitc of StoryTime.
+Once the segments exist, illustrate them with a single generate_and_add_images
+call covering every segment, so the images are generated in parallel.
 Finally, write a citations section at the end of the story to list
 sources you used to build the story, and save the story by calling the save_story tool.
 
 Your tool calls will inform you of the progress ofo your story. You can
 use them to check the progress of the story by reading segments
-so far, and when you take an action (eg generate an image for a specific segment),
+so far, use search_research to find the research relevant to the segment you are writing, and when you take an action (eg generate an image for a specific segment),
 you will be informed of the result. Sometimes you will be asked to revise the story 
 when calling a tool, for example to ensure a segment exists before you can add an image to it.
 If you are asked to revise, you must retry the action after the revision.
 """
 
+
+news_agent_research_ready_prompt = """
+Background research for this topic has already been collected into the story's research
+document, from these searches:
+{queries}
+
+Do not repeat these searches. Use search_research to find the passages relevant to each
+segment as you write it, and only call perplexity_search for details the research is missing.
+"""
@@ -0,0 +1,140 @@
+"""Planned, parallel background research for the news agent.
+
+Left to itself, the news agent researches a topic one perplexity_search at a
+time, waiting for a model turn between searches, so a story's research takes
+as long as the sum of its 8-15 searches and turns. ResearchPlanner instead asks
+the model for the whole query plan in a single call, runs every query
+concurrently through the shared search service, and merges the results into
+the story's research before the writing loop starts. Research then takes
+roughly one model call plus the slowest search, and the agent only searches
+again for gaps it finds while writing.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Tuple
+
+from pydantic import BaseModel, Field
+
+from ..search_service import get_search_service, normalize_query
+from ..replay import resolve_chat_model
+
+RESEARCH_CONCURRENCY = int(os.getenv("STORYTIME_RESEARCH_CONCURRENCY", "6"))
+RESEARCH_MAX_QUERIES = int(os.getenv("STORYTIME_RESEARCH_MAX_QUERIES", "12"))
+
+
+class ResearchPlan(BaseModel):
+    """The searches to run before writing a story."""
+    queries: List[str] = Field(description="Distinct web search queries, each covering one aspect of the topic")
+
+
+PLANNING_PROMPT = """You are planning the background research for a StoryTime story, a narrative, illustrated
+story about a news or historical topic. List 6-{max_queries} distinct web search queries that together cover
+what the story needs: the core events and their dates, the people and organizations involved, background and
+causes, consequences, notable quotes and statistics, and reliable sources to cite. Make each query specific
+and self-contained. Return no queries if the topic is fictional or otherwise one StoryTime would reject.
+
+Topic: {topic}"""
+
+
+def _chat_model(model):
+    model = resolve_chat_model(model)
+    if isinstance(model, str):
+        from langchain.chat_models import init_chat_model
+        model = init_chat_model(model)
+    return model
+
+
+class ResearchPlanner:
+    def __init__(self, model: str = "gpt-4o-mini", max_workers: int = RESEARCH_CONCURRENCY,
+                 max_queries: int = RESEARCH_MAX_QUERIES):
+        """
+        Args:
+            model: Chat model used to plan the queries.
+            max_workers: Maximum searches in flight at once.
+            max_queries: Maximum queries run for one topic.
+        """
+        self.model = _chat_model(model)
+        self.max_workers = max_workers
+        self.max_queries = max_queries
+
+    def plan(self, topic: str) -> List[str]:
+        """Plan the research queries for a topic in one model call. Near-identical queries are dropped."""
+        plan = self.model.with_structured_output(ResearchPlan).invoke(
+            PLANNING_PROMPT.format(topic=topic, max_queries=self.max_queries)
+        )
+        queries = []
+        seen = set()
+        for query in plan.queries:
+            key = normalize_query(query)
+            if key and key not in seen:
+                seen.add(key)
+                queries.append(query.strip())
+        return queries[:self.max_queries]
+
+    def search_all(self, queries: List[str]) -> Iterator[Tuple[str, list, Exception]]:
+        """Run queries concurrently, yielding each as soon as it finishes.
+
+        Yields:
+            (query, results, error) tuples in completion order. Exactly one of
+            results and error is None. Closing the iterator early cancels the
+            searches not yet started.
+        """
+        if not queries:
+            return
+        search_service = get_search_service()
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(queries)), thread_name_prefix="research")
+        try:
+            futures = {executor.submit(search_service.search, query): query for query in queries}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
+        finally:
+            # A caller that stops early (or is closed) shouldn't wait on searches it no longer wants
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def research(self, story, topic: str, on_event=None) -> dict:
+        """Plan and run the research for a topic and add the results to the story's research.
+
+        Results are added in plan order once all searches are done, so the research reads
+        the same however the searches raced.
+
+        Args:
+            story: The StoryStructure being written.
+            topic: The story topic.
+            on_event: Optional callback receiving a research_planned event, then a
+                research_search_finished event per query as it completes.
+
+        Returns:
+            {"queries": the planned queries, "results": results found, "added": results new to
+             the story, "errors": {query: error message} for failed searches}.
+        """
+        queries = self.plan(topic)
+        if on_event is not None:
+            on_event({"event": "research_planned", "queries": queries})
+        found = {}
+        errors = {}
+        for query, results, error in self.search_all(queries):
+            if error is not None:
+                errors[query] = str(error)
+            else:
+                found[query] = results
+            if on_event is not None:
+                on_event({
+                    "event": "research_search_finished",
+                    "query": query,
+                    "results": len(results) if results is not None else 0,
+                    "error": str(error) if error is not None else None,
+                })
+        added = 0
+        for query in queries:
+            if query in found:
+                added += len(story.add_research_results(query, found[query]))
+        return {
+            "queries": queries,
+            "results": sum(len(results) for results in found.values()),
+            "added": added,
+            "errors": errors,
+        }
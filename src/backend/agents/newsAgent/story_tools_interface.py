@@ -1,209 +1,263 @@
 """Tool agent interface drafted by Cursor (Claude)"""
 
-from langchain.tools import tool
+from dataclasses import dataclass
+from typing import List
+from langchain.tools import tool, ToolRuntime
+from pydantic import BaseModel
 from ...stories.story_structure import StoryStructure
+from ...stories.research import format_passages
+from ...stories.thumbnails import create_thumbnails
+from .image_generation import generate_image, generate_images, ImageGenerationError
+from ..search_service import get_search_service, format_results
 
-def create_story_tools(story: StoryStructure):
-    """Create LangChain tools for interacting with a story structure."""
-    story = story
-    @tool
-    def add_story_segment(title: str, text: str = "") -> str:
-        """Add a new segment to the story. Use this when creating new sections of the story.
-        
-        Args:
-            title: The title of the segment
-            text: The text content of the segment (optional)
-        """
-        story.add_segment(title=title, text=text)
-        return f"Added segment '{title}' to the story"
-    
-    @tool
-    def write_segment_text(segment_title: str, text: str, replace: bool = False) -> str:
-        """Write or update text in a specific story segment.
-        
-        Args:
-            segment_title: The title of the segment to update
-            text: The text to write
-            replace: If True, replace existing text. If False, append to existing text.
-        """
-        try:
-            story.write_story_section(segment_title, "text", text, replace)
-            return f"Updated text in segment '{segment_title}'"
-        except ValueError as e:
-            return str(e)
-    
-    @tool
-    def add_segment_image(segment_title: str, image_url: str) -> str:
-        """Add an image URL to a specific story segment.
-        
-        Args:
-            segment_title: The title of the segment
-            image_url: The URL of the image to add
-        """
-        try:
-            story.write_story_section(segment_title, "images", image_url, replace=False)
-            return f"Added image to segment '{segment_title}'"
-        except ValueError as e:
-            return str(e)
-    
-    @tool
-    def set_story_title(title: str) -> str:
-        """Set the title of the story.
-        
-        Args:
-            title: The story title
-        """
-        story.write_story_title(title)
-        return f"Story title set to: {title}"
-    
-    @tool
-    def save_story(version_name: str) -> str:
-        """Persist the current story snapshot using the supplied version label."""
-        if story.title == "":
-            return "Story title is not set. Please set the story title first and then save the story."
-        if story.segments == []:
-            return "Story segments are not set. Please add segments first and then save the story."
-        if story.citations == [] and story.research_document == "":
-            return "Story citations or research document are not set. Please add research information first using add_research_document and then save the story."
-        saved_path = story.save_story(version_name)
-        return f"Story successfully saved to {saved_path}"
-    
-    @tool
-    def get_story_json() -> str:
-        """Get the current story as a JSON string. Use this to see the full story structure.
-        Note: Image data is excluded to avoid token limits - images are still stored in the story object.
-        """
-        import json
-        story_data = story.to_json()
-        for segment in story_data.get('segments', []):
-            if 'images' in segment and len(segment['images']) > 0:
-                segment['images'] = [f"[{len(segment['images'])} images - data excluded to save tokens]"]
-        return json.dumps(story_data, indent=2)
-    @tool
-    def add_research_document(research_text: str, replace: bool = False) -> str:
-        """Add research information to the story. Use this to store research findings that inform the story.
-        
-        Args:
-            research_text: The research information to add
-            replace: If True, replace existing research. If False, append to existing research.
-        """
-        story.set_research_document(research_text, replace)
-        return f"Research document updated. Length: {len(story.research_document)} characters"
-    @tool
-    def perplexity_search(query: str) -> str:
-        """Search for information using Perplexity web search. Results are automatically added to the research document in
-        a string format like: --- Search Query: <query> --- <formatted results> ---
-        <formatted results> is a string with the title, URL, and snippet of the result.
-        <query> is the search query that was used.
-        --- is a separator between the search query and the formatted results.
-        <formatted results> is a string with the title, URL, and snippet of the result.
-        <formatted results> is a string with the title, URL, and snippet of the result.
-        
-        Args:
-            query: The search query to look up information about
-            
-        Returns:
-            Formatted search results with titles, URLs, and snippets
-        """
-        from perplexity import Perplexity
-        import os
-        
-        try:
-            perplexity_client = Perplexity(api_key=os.getenv("PERPLEXITY_API_KEY"))
-            search = perplexity_client.search.create(
-                query=query,
-                max_results=5,
-                max_tokens_per_page=1024
-            )
-            
-            results = []
-            for result in search.results:
-                result_text = f"Title: {result.title}\nURL: {result.url}\nSnippet: {getattr(result, 'snippet', '')}"
-                results.append(result_text)
-            
-            formatted_results = "\n\n".join(results)
-            research_entry = f"\n\n--- Search Query: {query} ---\n{formatted_results}"
-            story.set_research_document(research_entry, replace=False)
-            
-            return f"Search completed. Found {len(results)} results. Results have been added to the research document.\n\n{formatted_results}"
-        except Exception as e:
-            return f"Error searching Perplexity: {str(e)}"
-
-    @tool
-    def get_story_segments() -> str:
-        """Get a list of all story segment titles. Use this to see what segments have been created."""
-        if not story.segments:
-            return "No segments have been created yet."
-        segment_titles = [seg.get('title', 'Untitled') for seg in story.segments]
-        return f"Story segments: {', '.join(segment_titles)}"
-    
-    @tool
-    def generate_and_add_image(segment_title: str, prompt: str, size: str = "1024x1024") -> str:
-        """Generate an image and automatically add it to a story segment.
-        
-        Args:
-            segment_title: The title of the segment to add the image to
-            prompt: A detailed description of the image you want to generate. Make sure to mention the StoryTime style.
-            size: Image size - "1024x1024", "1792x1024", or "1024x1792"
-        
-        Returns:
-            Confirmation message that the image was added
-        """
-        import requests
-        import os
-        try:
-            # Generate the image
-            response = requests.post(
-                "https://api.openai.com/v1/images/generations",
-                headers={
-                    "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-image-1",
-                    "prompt": prompt,
-                    "size": size
-                }
-            )
-            if response.status_code != 200:
-                error_detail = response.text
-                try:
-                    error_json = response.json()
-                    error_detail = error_json.get('error', {}).get('message', error_detail)
-                except:
-                    pass
-                return f"Error generating image: HTTP {response.status_code} - {error_detail}"
-            
-            data = response.json()
-            
-            if 'data' in data and len(data['data']) > 0:
-                image_data = data['data'][0]
-                # Get image URL or convert base64 to data URI
-                if 'url' in image_data:
-                    image_url = image_data['url']
-                elif 'b64_json' in image_data:
-                    image_url = f"data:image/png;base64,{image_data['b64_json']}"
-                else:
-                    return f"Error: No image data found in response"
-                
-                # Add to story segment - has direct access to story via closure
-                story.write_story_section(segment_title, "images", image_url, replace=False)
-                return f"Generated and added image to segment '{segment_title}'"
-            return f"Error: Invalid response format"
-        except requests.exceptions.RequestException as e:
-            return f"Error generating and adding image: Request failed - {str(e)}"
-        except Exception as e:
-            return f"Error generating and adding image: {str(e)}"
-    
-    return [
-        add_story_segment,
-        write_segment_text,
-        add_segment_image,
-        generate_and_add_image,
-        set_story_title,
-        save_story,
-        get_story_json,
-        add_research_document,
-        get_story_segments,
-        perplexity_search
-    ]
\ No newline at end of file
+class ImageRequest(BaseModel):
+    """One image to generate for a story segment."""
+    segment_title: str
+    prompt: str
+    size: str = "1024x1024"
+
+@dataclass
+class StoryContext:
+    """Runtime context of a news agent run: the story its tools work on.
+
+    The news agent graph is compiled once and shared, so the story is passed with
+    each invocation instead of being captured by the tools.
+    """
+    story: StoryStructure
+
+def emit_story_event(runtime: ToolRuntime, event: str, **data):
+    """Send a story progress event to clients streaming the agent run.
+
+    Uses LangGraph's custom stream, so it is a no-op unless the agent is run with
+    stream_mode "custom".
+    """
+    runtime.stream_writer({"event": event, **data})
+
+@tool
+def add_story_segment(runtime: ToolRuntime[StoryContext], title: str, text: str = "") -> str:
+    """Add a new segment to the story. Use this when creating new sections of the story.
+
+    Args:
+        title: The title of the segment
+        text: The text content of the segment (optional)
+    """
+    story = runtime.context.story
+    story.add_segment(title=title, text=text)
+    emit_story_event(runtime, "segment_added", title=title, text=text)
+    return f"Added segment '{title}' to the story"
+
+@tool
+def write_segment_text(runtime: ToolRuntime[StoryContext], segment_title: str, text: str, replace: bool = False) -> str:
+    """Write or update text in a specific story segment.
+
+    Args:
+        segment_title: The title of the segment to update
+        text: The text to write
+        replace: If True, replace existing text. If False, append to existing text.
+    """
+    story = runtime.context.story
+    try:
+        story.write_story_section(segment_title, "text", text, replace)
+        emit_story_event(runtime, "text_written", segment_title=segment_title, text=text, replace=replace)
+        return f"Updated text in segment '{segment_title}'"
+    except ValueError as e:
+        return str(e)
+
+@tool
+def add_segment_image(runtime: ToolRuntime[StoryContext], segment_title: str, image_url: str) -> str:
+    """Add an image URL to a specific story segment.
+
+    Args:
+        segment_title: The title of the segment
+        image_url: The URL of the image to add
+    """
+    story = runtime.context.story
+    try:
+        story.write_story_section(segment_title, "images", image_url, replace=False)
+        create_thumbnails(image_url)
+        emit_story_event(runtime, "image_added", segment_title=segment_title, image_url=image_url)
+        return f"Added image to segment '{segment_title}'"
+    except ValueError as e:
+        return str(e)
+
+@tool
+def set_story_title(runtime: ToolRuntime[StoryContext], title: str) -> str:
+    """Set the title of the story.
+
+    Args:
+        title: The story title
+    """
+    story = runtime.context.story
+    story.write_story_title(title)
+    emit_story_event(runtime, "title_set", title=title)
+    return f"Story title set to: {title}"
+
+@tool
+def save_story(runtime: ToolRuntime[StoryContext], version_name: str) -> str:
+    """Persist the current story snapshot using the supplied version label."""
+    story = runtime.context.story
+    if story.title == "":
+        return "Story title is not set. Please set the story title first and then save the story."
+    if story.segments == []:
+        return "Story segments are not set. Please add segments first and then save the story."
+    if story.citations == [] and not story.research:
+        return "Story citations or research document are not set. Please add research information first using add_research_document and then save the story."
+    saved_path = story.save_story(version_name)
+    return f"Story successfully saved to {saved_path}"
+
+@tool
+def get_story_json(runtime: ToolRuntime[StoryContext]) -> str:
+    """Get the current story as a JSON string. Use this to see the full story structure.
+    Note: Image data and research are excluded to avoid token limits - they are still stored in the story object.
+    Use search_research to read the research relevant to a claim or segment.
+    """
+    story = runtime.context.story
+    import json
+    story_data = story.to_json()
+    story_data['research'] = f"[{len(story.research)} research entries - use search_research to find relevant passages]"
+    for segment in story_data.get('segments', []):
+        if 'images' in segment and len(segment['images']) > 0:
+            segment['images'] = [f"[{len(segment['images'])} images - data excluded to save tokens]"]
+    return json.dumps(story_data, indent=2)
+
+@tool
+def search_research(runtime: ToolRuntime[StoryContext], query: str, k: int = 5) -> str:
+    """Find the passages of the story's research most relevant to a claim, segment or question.
+    Searches the research already collected, so it is much cheaper than perplexity_search.
+
+    Args:
+        query: The claim, segment text or question to find supporting research for
+        k: Maximum number of passages to return
+
+    Returns:
+        The best matching passages with their titles, URLs and relevance scores
+    """
+    story = runtime.context.story
+    passages = story.search_research(query, k)
+    if not passages:
+        return "No research matches this query. Use perplexity_search to research it."
+    return format_passages(passages)
+
+@tool
+def add_research_document(runtime: ToolRuntime[StoryContext], research_text: str, replace: bool = False) -> str:
+    """Add research information to the story. Use this to store research findings that inform the story.
+
+    Args:
+        research_text: The research information to add
+        replace: If True, replace existing research. If False, append to existing research.
+    """
+    story = runtime.context.story
+    story.set_research_document(research_text, replace)
+    return f"Research document updated. It now holds {len(story.research)} research entries"
+
+@tool
+def perplexity_search(runtime: ToolRuntime[StoryContext], query: str) -> str:
+    """Search for information using Perplexity web search. Results are automatically added to the story's research,
+    each with its query, title, URL and snippet. Results whose URL or snippet is already in the research are not
+    added again.
+
+    Args:
+        query: The search query to look up information about
+
+    Returns:
+        Formatted search results with titles, URLs, and snippets
+    """
+    story = runtime.context.story
+    try:
+        results = get_search_service().search(query)
+        formatted_results = format_results(results)
+        added = story.add_research_results(query, results)
+
+        return f"Search completed. Found {len(results)} results, {len(added)} of them new. New results have been added to the research document.\n\n{formatted_results}"
+    except Exception as e:
+        return f"Error searching Perplexity: {str(e)}"
+
+@tool
+def get_story_segments(runtime: ToolRuntime[StoryContext]) -> str:
+    """Get a list of all story segment titles. Use this to see what segments have been created."""
+    story = runtime.context.story
+    if not story.segments:
+        return "No segments have been created yet."
+    segment_titles = [seg.get('title', 'Untitled') for seg in story.segments]
+    return f"Story segments: {', '.join(segment_titles)}"
+
+@tool
+def generate_and_add_image(runtime: ToolRuntime[StoryContext], segment_title: str, prompt: str, size: str = "1024x1024") -> str:
+    """Generate an image and automatically add it to a story segment.
+
+    Args:
+        segment_title: The title of the segment to add the image to
+        prompt: A detailed description of the image you want to generate. Make sure to mention the StoryTime style.
+        size: Image size - "1024x1024", "1792x1024", or "1024x1792"
+
+    Returns:
+        Confirmation message that the image was added
+    """
+    story = runtime.context.story
+    if story.find_segment_index(segment_title) == -1:
+        return f"Segment '{segment_title}' not found. Add the segment before generating its image."
+    try:
+        image_url = generate_image(prompt, size)
+    except ImageGenerationError as e:
+        return f"Error generating image: {str(e)}"
+    except Exception as e:
+        return f"Error generating and adding image: {str(e)}"
+    story.write_story_section(segment_title, "images", image_url, replace=False)
+    emit_story_event(runtime, "image_added", segment_title=segment_title, image_url=image_url)
+    return f"Generated and added image to segment '{segment_title}'"
+
+@tool
+def generate_and_add_images(runtime: ToolRuntime[StoryContext], images: List[ImageRequest]) -> str:
+    """Generate images for several segments at once and add each to its segment.
+    The images are generated concurrently, so prefer this over repeated
+    generate_and_add_image calls when illustrating more than one segment.
+
+    Args:
+        images: One entry per image, each with segment_title, prompt (mention the StoryTime style)
+            and optional size ("1024x1024", "1792x1024", or "1024x1792")
+
+    Returns:
+        One line per image saying whether it was added
+    """
+    story = runtime.context.story
+    lines = []
+    image_requests = []
+    for image in images:
+        if story.find_segment_index(image.segment_title) == -1:
+            lines.append(f"Segment '{image.segment_title}' not found. Add the segment before generating its image.")
+        else:
+            image_requests.append(image.model_dump())
+    for request, image_url, error in generate_images(image_requests):
+        segment_title = request["segment_title"]
+        if error is not None:
+            lines.append(f"Error generating image for segment '{segment_title}': {str(error)}")
+            continue
+        story.write_story_section(segment_title, "images", image_url, replace=False)
+        emit_story_event(runtime, "image_added", segment_title=segment_title, image_url=image_url)
+        lines.append(f"Generated and added image to segment '{segment_title}'")
+    return "\n".join(lines) if lines else "No images requested"
+
+STORY_TOOLS = [
+    add_story_segment,
+    write_segment_text,
+    add_segment_image,
+    generate_and_add_image,
+    generate_and_add_images,
+    set_story_title,
+    save_story,
+    get_story_json,
+    add_research_document,
+    search_research,
+    get_story_segments,
+    perplexity_search,
+]
+
+# What the model is told when the context window middleware removes an old result of these tools
+STORY_TOOL_RESULT_HINTS = {
+    "perplexity_search": "Its results were added to the story's research; use search_research to find them.",
+    "get_story_json": "Call get_story_json for the current story.",
+    "get_story_segments": "Call get_story_segments for the current segments.",
+    "search_research": "Call search_research again if you need these passages.",
+}
+# Tools returning the current state of the story, so each result supersedes the previous one
+STORY_SNAPSHOT_TOOLS = ("get_story_json", "get_story_segments")
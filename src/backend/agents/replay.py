@@ -0,0 +1,219 @@
+"""Record/replay stand-ins for the chat model, Perplexity and image APIs.
+
+In record mode the real services are called and every response is saved to a
+fixture file. In replay mode nothing touches the network: responses come from
+the fixture, optionally after an injected delay, so the pipeline can be
+benchmarked and profiled deterministically on a machine with no API keys.
+
+Enable it for a process with environment variables:
+    STORYTIME_REPLAY_MODE=record|replay
+    STORYTIME_REPLAY_FIXTURE=path/to/fixture.json
+    STORYTIME_REPLAY_LATENCY=0.5   (seconds added to every replayed call)
+or programmatically with activate_replay().
+
+The benchmarks drive it, but it lives with the agents, whose model, search
+and image calls it wraps, so production code never imports the benchmarks.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+REPLAY_MODE_RECORD = "record"
+REPLAY_MODE_REPLAY = "replay"
+
+
+class ReplayMissError(Exception):
+    """Raised in replay mode when the fixture has no response left for a call."""
+
+
+def _key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ReplaySession:
+    def __init__(self, fixture_path: str, mode: str, latency: float = 0.0):
+        """
+        Args:
+            fixture_path: JSON file responses are recorded to or replayed from.
+            mode: REPLAY_MODE_RECORD or REPLAY_MODE_REPLAY.
+            latency: Seconds to sleep before returning each replayed response.
+        """
+        if mode not in (REPLAY_MODE_RECORD, REPLAY_MODE_REPLAY):
+            raise ValueError(f"Unknown replay mode '{mode}'")
+        self.fixture_path = fixture_path
+        self.mode = mode
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.entries = {"chat": [], "search": [], "image": []}
+        self.consumed = set()
+        if mode == REPLAY_MODE_REPLAY:
+            with open(fixture_path, 'r') as f:
+                self.entries.update(json.load(f))
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == REPLAY_MODE_RECORD
+
+    def record(self, kind: str, key: str, response):
+        with self.lock:
+            self.entries[kind].append({"key": key, "response": response})
+
+    def replay(self, kind: str, key: str):
+        """Return the recorded response for a call.
+
+        Prefers the first unused entry recorded with the same key, and falls back to
+        the next unused entry of that kind in recording order, so calls whose inputs
+        carry timestamps or random IDs still replay in sequence.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            candidates = [
+                (i, entry) for i, entry in enumerate(self.entries[kind])
+                if (kind, i) not in self.consumed
+            ]
+            if not candidates:
+                raise ReplayMissError(f"No recorded {kind} responses left in {self.fixture_path}")
+            i, entry = next(((i, entry) for i, entry in candidates if entry["key"] == key), candidates[0])
+            self.consumed.add((kind, i))
+            return entry["response"]
+
+    def save(self):
+        """Write recorded responses to the fixture file."""
+        if not self.recording:
+            return
+        if os.path.dirname(self.fixture_path):
+            os.makedirs(os.path.dirname(self.fixture_path), exist_ok=True)
+        with self.lock:
+            with open(self.fixture_path, 'w') as f:
+                json.dump(self.entries, f)
+
+
+_session = None
+_session_loaded = False
+_session_lock = threading.Lock()
+
+
+def activate_replay(fixture_path: str, mode: str, latency: float = 0.0) -> ReplaySession:
+    """Make a replay session active for the whole process, replacing any previous one."""
+    global _session, _session_loaded
+    with _session_lock:
+        _session = ReplaySession(fixture_path, mode, latency)
+        _session_loaded = True
+        if _session.recording:
+            atexit.register(_session.save)
+        return _session
+
+
+def deactivate_replay():
+    """Go back to calling the real services."""
+    global _session, _session_loaded
+    with _session_lock:
+        _session = None
+        _session_loaded = True
+
+
+def get_replay_session() -> Optional[ReplaySession]:
+    """Return the active replay session, configuring it from the environment on first use."""
+    global _session_loaded
+    if not _session_loaded:
+        mode = os.getenv("STORYTIME_REPLAY_MODE")
+        if mode:
+            return activate_replay(
+                os.getenv("STORYTIME_REPLAY_FIXTURE", "replay_fixture.json"),
+                mode,
+                float(os.getenv("STORYTIME_REPLAY_LATENCY", "0"))
+            )
+        _session_loaded = True
+    return _session
+
+
+def resolve_chat_model(model):
+    """Return the model create_agent should use, wrapped for record/replay when a session is active."""
+    session = get_replay_session()
+    if session is None:
+        return model
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import messages_from_dict, messages_to_dict
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class ReplayChatModel(BaseChatModel):
+        inner: Any = None
+
+        @property
+        def _llm_type(self) -> str:
+            return "storytime-replay"
+
+        def bind_tools(self, tools, **kwargs):
+            if self.inner is None:
+                return self
+            return self.model_copy(update={"inner": self.inner.bind_tools(tools, **kwargs)})
+
+        def _generate(self, messages: List, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            key = _key([(m.type, m.content, getattr(m, "tool_calls", None)) for m in messages])
+            if session.recording:
+                message = self.inner.invoke(messages, stop=stop, **kwargs)
+                session.record("chat", key, messages_to_dict([message])[0])
+            else:
+                message = messages_from_dict([session.replay("chat", key)])[0]
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    if not session.recording:
+        return ReplayChatModel()
+    if isinstance(model, str):
+        from langchain.chat_models import init_chat_model
+        model = init_chat_model(model)
+    return ReplayChatModel(inner=model)
+
+
+class ReplaySearchClient:
+    """Stand-in for the Perplexity client, exposing the same search.create call."""
+    def __init__(self, session: ReplaySession, inner=None):
+        self.session = session
+        self.inner = inner
+        self.search = self
+
+    def create(self, query: str, **params):
+        key = _key(query, params)
+        if self.session.recording:
+            search = self.inner.search.create(query=query, **params)
+            results = [
+                {"title": result.title, "url": result.url, "snippet": getattr(result, 'snippet', '')}
+                for result in search.results
+            ]
+            self.session.record("search", key, results)
+        else:
+            results = self.session.replay("search", key)
+        return SimpleNamespace(results=[SimpleNamespace(**result) for result in results])
+
+
+class ReplayResponse:
+    """Minimal requests.Response stand-in for replayed image API calls."""
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ReplayHTTPSession:
+    """Stand-in for the requests.Session used for image generation."""
+    def __init__(self, session: ReplaySession, inner=None):
+        self.session = session
+        self.inner = inner
+
+    def post(self, url: str, json=None, **kwargs):
+        key = _key(url, json)
+        if self.session.recording:
+            response = self.inner.post(url, json=json, **kwargs)
+            self.session.record("image", key, {"status_code": response.status_code, "text": response.text})
+            return response
+        recorded = self.session.replay("image", key)
+        return ReplayResponse(recorded["status_code"], recorded["text"])
@@ -0,0 +1,179 @@
+"""Shared Perplexity search service used by both the news and tester agents.
+
+Searches are cached on the normalized query plus search parameters, first in an
+in-memory LRU and then in an SQLite table on disk, so the tester agent
+fact-checking a story the news agent just researched (or a simulation
+revisiting a popular topic) reuses earlier results instead of hitting the API.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+SEARCH_CACHE_DB_PATH = "src/backend/agents/search_cache.db"
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("STORYTIME_SEARCH_CACHE_TTL", str(6 * 60 * 60)))
+SEARCH_CACHE_MEMORY_ENTRIES = int(os.getenv("STORYTIME_SEARCH_CACHE_MEMORY_ENTRIES", "512"))
+SEARCH_CACHE_DISK_ENTRIES = int(os.getenv("STORYTIME_SEARCH_CACHE_DISK_ENTRIES", "20000"))
+
+# How many disk inserts happen between sweeps of expired and overflow rows
+_PRUNE_EVERY = 100
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase a query, collapse whitespace and drop surrounding punctuation."""
+    return re.sub(r"\s+", " ", query.lower()).strip(" \t\n?.!,;:'\"")
+
+
+def format_results(results: list) -> str:
+    """Format search results the way the agent tools have always presented them."""
+    return "\n\n".join(
+        f"Title: {result['title']}\nURL: {result['url']}\nSnippet: {result['snippet']}"
+        for result in results
+    )
+
+
+class SearchService:
+    def __init__(self, ttl_seconds: int = SEARCH_CACHE_TTL_SECONDS, memory_entries: int = SEARCH_CACHE_MEMORY_ENTRIES,
+                 disk_entries: int = SEARCH_CACHE_DISK_ENTRIES, db_path: str = SEARCH_CACHE_DB_PATH):
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.db_path = db_path
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.client = None
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "errors": 0}
+        self.disk_inserts = 0
+
+    @contextmanager
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """CREATE TABLE IF NOT EXISTS searches (
+                        key TEXT PRIMARY KEY,
+                        created_at REAL NOT NULL,
+                        results TEXT NOT NULL
+                    )"""
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS searches_created_at ON searches (created_at)")
+                yield conn
+        finally:
+            conn.close()
+
+    def _client(self):
+        # The Perplexity SDK is only imported, and its client only built, on first use
+        if self.client is None:
+            from .replay import get_replay_session, ReplaySearchClient
+            session = get_replay_session()
+            if session is not None and not session.recording:
+                self.client = ReplaySearchClient(session)
+                return self.client
+            from perplexity import Perplexity
+            self.client = Perplexity(api_key=os.getenv("PERPLEXITY_API_KEY"))
+            if session is not None:
+                self.client = ReplaySearchClient(session, inner=self.client)
+        return self.client
+
+    def _count(self, counter: str):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def search(self, query: str, max_results: int = 5, max_tokens_per_page: int = 1024) -> list:
+        """Search Perplexity, serving repeated queries from cache.
+
+        Returns:
+            A list of {"title", "url", "snippet"} dicts.
+        """
+        key = hashlib.sha256(
+            json.dumps([normalize_query(query), max_results, max_tokens_per_page]).encode()
+        ).hexdigest()
+        now = time.time()
+
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and now - entry[0] < self.ttl_seconds:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return [dict(result) for result in entry[1]]
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT created_at, results FROM searches WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+        if row is not None:
+            results = json.loads(row[1])
+            self._remember(key, row[0], results)
+            self._count("disk_hits")
+            return [dict(result) for result in results]
+
+        self._count("misses")
+        try:
+            search = self._client().search.create(
+                query=query,
+                max_results=max_results,
+                max_tokens_per_page=max_tokens_per_page
+            )
+        except Exception:
+            self._count("errors")
+            raise
+        results = [
+            {"title": result.title, "url": result.url, "snippet": getattr(result, 'snippet', '')}
+            for result in search.results
+        ]
+        self._remember(key, now, results)
+        self._store(key, now, results)
+        return [dict(result) for result in results]
+
+    def _remember(self, key: str, created_at: float, results: list):
+        with self.lock:
+            self.memory[key] = (created_at, results)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def _store(self, key: str, created_at: float, results: list):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO searches (key, created_at, results) VALUES (?, ?, ?)",
+                (key, created_at, json.dumps(results)),
+            )
+            self.disk_inserts += 1
+            if self.disk_inserts % _PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM searches WHERE created_at <= ?", (created_at - self.ttl_seconds,))
+                conn.execute(
+                    "DELETE FROM searches WHERE key NOT IN (SELECT key FROM searches ORDER BY created_at DESC LIMIT ?)",
+                    (self.disk_entries,),
+                )
+
+    def stats(self) -> dict:
+        """Return cache hit/miss counters and the current in-memory size."""
+        with self.lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self.memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_search_service = None
+_search_service_lock = threading.Lock()
+
+
+def get_search_service() -> SearchService:
+    """Return the process-wide search service, creating it on first use."""
+    global _search_service
+    with _search_service_lock:
+        if _search_service is None:
+            _search_service = SearchService()
+        return _search_service
@@ -0,0 +1,198 @@
+"""Structured, parallel claim verification for the tester agent.
+
+TesterAgent.test_story checks claims one at a time inside a ReAct loop, so a
+story's evaluation takes as long as the sum of its searches and model turns.
+ClaimVerifier instead extracts every claim and citation in a single model call,
+gathers evidence for all of them concurrently (the story's own research first,
+the shared search service only when that is not enough), and judges them in
+batches, several batches at a time. Evaluation then takes roughly as long as
+the slowest claim.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from ..search_service import get_search_service, format_results
+from ..replay import resolve_chat_model
+from ...stories.research import format_passages
+
+VERIFY_CONCURRENCY = int(os.getenv("STORYTIME_VERIFY_CONCURRENCY", "4"))
+VERIFY_BATCH_SIZE = int(os.getenv("STORYTIME_VERIFY_BATCH_SIZE", "5"))
+# BM25 score a story's best research passage needs before it settles a claim without a web search.
+# Scores grow with query overlap and term rarity; lower it to search less, raise it to search more.
+LOCAL_EVIDENCE_MIN_SCORE = float(os.getenv("STORYTIME_LOCAL_EVIDENCE_MIN_SCORE", "2.0"))
+EVIDENCE_PASSAGES = 3
+
+
+class ClaimExtraction(BaseModel):
+    """The checkable content of a story."""
+    claims: List[str] = Field(description="Specific, verifiable factual claims from the story: dates, names, events, quotes, statistics")
+    citations: List[str] = Field(description="Every source URL the story cites")
+
+
+class Verdict(BaseModel):
+    index: int = Field(description="Number of the item being judged")
+    supported: bool = Field(description="True if the evidence shows the claim is accurate, or the citation is a real source supporting the story")
+    explanation: str = Field(description="One sentence explaining the verdict")
+
+
+class BatchVerdicts(BaseModel):
+    verdicts: List[Verdict]
+
+
+EXTRACTION_PROMPT = """Extract the content of this StoryTime story that a fact-checker should verify.
+List 5-10 specific factual claims (dates, names, events, quotes, statistics), each specific and
+verifiable on its own, and every source URL the story cites.
+
+Story:
+{story}"""
+
+JUDGMENT_PROMPTS = {
+    "claim": """You are fact-checking claims from a StoryTime news story. For each numbered claim, decide from its
+evidence whether the claim is ACCURATE (supported = true) or INACCURATE (supported = false). Be critical: a claim
+the evidence does not support is inaccurate.
+
+{items}""",
+    "citation": """You are checking the citations of a StoryTime news story. For each numbered URL, decide from its
+evidence whether it is a VALID citation (supported = true): a real source relevant to the story. Otherwise it is
+INVALID (supported = false).
+
+{items}""",
+}
+
+
+def _chat_model(model):
+    model = resolve_chat_model(model)
+    if isinstance(model, str):
+        from langchain.chat_models import init_chat_model
+        model = init_chat_model(model)
+    return model
+
+
+class ClaimVerifier:
+    def __init__(self, model: str = "gpt-4o-mini", max_workers: int = VERIFY_CONCURRENCY, batch_size: int = VERIFY_BATCH_SIZE):
+        """
+        Args:
+            model: Chat model used for extraction and judgments.
+            max_workers: Maximum evidence lookups and judgment batches in flight at once.
+            batch_size: Number of claims or citations judged per model call.
+        """
+        self.model = _chat_model(model)
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+
+    def extract(self, story_data: dict) -> ClaimExtraction:
+        """Extract all claims and citations from a story in one model call."""
+        import json
+        story_data = {key: value for key, value in story_data.items() if key != "research"}
+        return self.model.with_structured_output(ClaimExtraction).invoke(
+            EXTRACTION_PROMPT.format(story=json.dumps(story_data, indent=2))
+        )
+
+    def gather_evidence(self, story, kind: str, text: str) -> dict:
+        """Collect evidence for a claim or citation, searching the web only if the story's research falls short.
+
+        Args:
+            story: The StoryStructure being evaluated, whose research is checked first.
+            kind: "claim" or "citation".
+            text: The claim, or the cited URL.
+
+        Returns:
+            A dict with the evidence text and its "source": "research" or "search".
+        """
+        if kind == "citation" and story is not None:
+            cited = [chunk for chunk in story.research.chunks if chunk["url"] == text]
+            if cited:
+                return {"source": "research", "evidence": format_passages(cited)}
+        passages = story.search_research(text, EVIDENCE_PASSAGES) if story is not None else []
+        if passages and passages[0]["score"] >= LOCAL_EVIDENCE_MIN_SCORE:
+            return {"source": "research", "evidence": format_passages(passages)}
+        try:
+            results = get_search_service().search(text)
+        except Exception as e:
+            return {"source": "search", "evidence": f"Search failed: {str(e)}"}
+        return {"source": "search", "evidence": format_results(results) or "No results found."}
+
+    def judge(self, kind: str, items: list) -> list:
+        """Judge a batch of claims or citations with their evidence in one model call.
+
+        Args:
+            kind: "claim" or "citation".
+            items: Dicts with "text" and "evidence".
+
+        Returns:
+            One Verdict per item, in the order of items.
+        """
+        numbered = "\n\n".join(
+            f"{i}. {item['text']}\nEvidence:\n{item['evidence']}" for i, item in enumerate(items, start=1)
+        )
+        response = self.model.with_structured_output(BatchVerdicts).invoke(JUDGMENT_PROMPTS[kind].format(items=numbered))
+        verdicts = {verdict.index: verdict for verdict in response.verdicts}
+        # An item the model skipped counts as unverified rather than failing the batch
+        return [
+            verdicts.get(i) or Verdict(index=i, supported=False, explanation="No verdict returned")
+            for i in range(1, len(items) + 1)
+        ]
+
+    def verify(self, story) -> dict:
+        """Extract, gather evidence for and judge every claim and citation of a story.
+
+        Returns:
+            {"claims": [...], "citations": [...]}, each entry a dict with the claim or URL
+            "text", "supported", "explanation" and the evidence "source".
+        """
+        extraction = self.extract(story.to_json())
+        items = [{"kind": "claim", "text": claim} for claim in extraction.claims]
+        citations = list(dict.fromkeys(extraction.citations + list(story.citations)))
+        items += [{"kind": "citation", "text": url} for url in citations]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for item, evidence in zip(items, executor.map(lambda item: self.gather_evidence(story, item["kind"], item["text"]), items)):
+                item.update(evidence)
+            batches = []
+            for kind in ("claim", "citation"):
+                of_kind = [item for item in items if item["kind"] == kind]
+                batches += [(kind, of_kind[i:i + self.batch_size]) for i in range(0, len(of_kind), self.batch_size)]
+            for (kind, batch), verdicts in zip(batches, executor.map(lambda batch: self.judge(*batch), batches)):
+                for item, verdict in zip(batch, verdicts):
+                    item["supported"] = verdict.supported
+                    item["explanation"] = verdict.explanation
+
+        results = {"claims": [], "citations": []}
+        for item in items:
+            results["claims" if item["kind"] == "claim" else "citations"].append({
+                "text": item["text"],
+                "supported": item["supported"],
+                "explanation": item["explanation"],
+                "source": item["source"],
+            })
+        return results
+
+
+def _section(results: list, checked_label: str, total_label: str, supported_label: str, verdicts: tuple):
+    supported = sum(1 for result in results if result["supported"])
+    lines = [f"{checked_label}: {len(results)}", ""]
+    for i, result in enumerate(results, start=1):
+        lines.append(f"{i}. {result['text']} - {verdicts[0] if result['supported'] else verdicts[1]} - {result['explanation']}")
+    proportion = supported / len(results) if results else None
+    lines += ["", f"{total_label}: {len(results)}", f"{supported_label}: {supported}"]
+    if proportion is not None:
+        lines.append(f"CALCULATION: {supported}/{len(results)} = {proportion}")
+    return proportion, "\n".join(lines)
+
+
+def fill_report(evaluation_report, results: dict):
+    """Write verification results into an EvaluationReport, in the tester agent's report format."""
+    accuracy_proportion, accuracy_report = _section(
+        results["claims"], "CLAIMS CHECKED", "TOTAL CLAIMS", "ACCURATE CLAIMS", ("ACCURATE", "INACCURATE"))
+    citations_proportion, citations_report = _section(
+        results["citations"], "CITATIONS CHECKED", "TOTAL CITATIONS", "VALID CITATIONS", ("VALID", "INVALID"))
+    evaluation_report.update_report(
+        accuracy_proportion=accuracy_proportion,
+        citations_proportion=citations_proportion,
+        accuracy_report=accuracy_report,
+        citations_report=citations_report,
+    )
@@ -15,9 +15,12 @@ title, segments, images, and citations.
    - Create a numbered list of claims
    - Each claim should be specific and verifiable
 
-3. Use perplexity_search to fact-check EACH claim individually - do not skip this step
+3. Fact-check EACH claim individually - do not skip this step:
+   - First call search_story_research with the claim to get the passages of the story's own research about it
+   - If those passages clearly confirm or contradict the claim, use them and move on to the next claim
+   - Only call perplexity_search when the research has no relevant passage or the passages are inconclusive
 
-4. After receiving search results, analyze them carefully:
+4. After receiving research passages and search results, analyze them carefully:
    - For EACH claim, mark it as either ACCURATE or INACCURATE based on search results
    - Compare each claim in the story against what you found in the search results
    - Note any discrepancies, inaccuracies, or unsupported claims
@@ -82,14 +85,15 @@ tester_agent_metrics_system_prompt = """
 The metrics you will collect for each story are:
 
 1. Accuracy Proportion: The proportion of the story's content that is accurate and correct. 
-   - You MUST fact-check at least 5 specific claims from the story using perplexity_search
+   - You MUST fact-check at least 5 specific claims from the story using search_story_research, and perplexity_search
+     when the story's research does not settle a claim
    - Verify dates, names, quotes, and key events individually
    - Count how many claims are accurate vs total claims checked
    - Be critical - don't assume everything is correct just because the general topic is real
    - IMPORTANT: If you check 6 claims and find 6 accurate, the proportion is 6/6 = 1.0, NOT 0.7
    
 2. Citations Proportion: The portion of facts in the story supported by provided citations.
-   - You MUST verify each citation URL exists and is relevant using perplexity_search
+   - You MUST verify each citation URL exists and is relevant, using search_story_research and perplexity_search
    - Check that specific claims in the story actually appear in the cited sources
    - Count how many citations are valid vs total citations provided
    - A citation section alone is not enough - the citations must actually support the specific claims
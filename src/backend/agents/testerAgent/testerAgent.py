@@ -1,10 +1,10 @@
 from langgraph.checkpoint.memory import InMemorySaver
 from langchain.agents import create_agent
-from typing import Dict, Any
+import time
 import uuid
 import os
 import dotenv
-from .tester_tools import create_tester_tools
+from .tester_tools import TESTER_TOOLS, TESTER_SNAPSHOT_TOOLS, TESTER_TOOL_RESULT_HINTS, EvaluationContext
 
 backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 env_path = os.path.join(backend_dir, '.env')
@@ -12,28 +12,74 @@ dotenv.load_dotenv(env_path)
 
 from .prompts import tester_agent_system_prompt
 from ...evaluations.evaluation import EvaluationReport
+from ...stories.story_structure import StoryStructure
+from ..replay import resolve_chat_model
+from ..graph_cache import get_graph, record_setup, with_checkpointer
+from ..middleware import ContextWindowMiddleware, InstrumentationMiddleware
+from .claim_verification import ClaimVerifier, fill_report, VERIFY_CONCURRENCY
+
+def get_tester_agent_graph(model: str = "gpt-4o-mini", tools: tuple = ()):
+    """Return the tester agent graph for a model, compiling it on first use in this process."""
+    return get_graph("tester", model, tools, lambda: create_agent(
+        model=resolve_chat_model(model),
+        tools=TESTER_TOOLS + list(tools),
+        system_prompt=tester_agent_system_prompt,
+        # Compaction runs first, so instrumentation records what is actually sent to the model
+        middleware=[
+            ContextWindowMiddleware("tester", hints=TESTER_TOOL_RESULT_HINTS, snapshot_tools=TESTER_SNAPSHOT_TOOLS),
+            InstrumentationMiddleware("tester"),
+        ],
+        context_schema=EvaluationContext
+    ))
+
 class TesterAgent:
     def __init__(self, story: StoryStructure, model: str = "gpt-4o-mini", tools = []):
+        started = time.perf_counter()
         self.model = model
-        self.evaluation_report = EvaluationReport(story)
-        self.tools = create_tester_tools(self.evaluation_report) + tools
+        self.context = EvaluationContext(evaluation_report=EvaluationReport(story))
+        self.tools = TESTER_TOOLS + tools
         self.system_prompt = tester_agent_system_prompt
         self.checkpointer = InMemorySaver()
         self.thread_id = str(uuid.uuid4())
-        self.agent = create_agent(
-            model=model,
-            tools=self.tools,
-            system_prompt=self.system_prompt,
-            checkpointer=self.checkpointer
-        )
+        self.agent = with_checkpointer(get_tester_agent_graph(model, tuple(tools)), self.checkpointer)
         self.story = story
+        record_setup("tester", time.perf_counter() - started)
+
+    def discard(self):
+        """Free the message history of this agent's thread once its run is finished."""
+        self.checkpointer.delete_thread(self.thread_id)
+
+    @property
+    def evaluation_report(self) -> EvaluationReport:
+        """The report being filled in; the generate_story tool may replace it."""
+        return self.context.evaluation_report
+
     def test_story(self):
         import json
-        story_json_str = json.dumps(self.story.to_json(), indent=2)
+        story_data = self.story.to_json()
+        # Research is looked up per claim with search_story_research rather than pasted in whole
+        story_data["research"] = f"[{len(self.story.research)} research entries - use search_story_research to find evidence for a claim]"
+        story_json_str = json.dumps(story_data, indent=2)
         response = self.agent.invoke({
             "messages": [{
                 "role": "user", 
                 "content": f"Test the story and save the evaluation report. The story is:\n\n{story_json_str}"
             }]
-        }, config={"configurable": {"thread_id": self.thread_id}})
+        }, config={"configurable": {"thread_id": self.thread_id}}, context=self.context)
         return response
+
+    def evaluate_story(self, max_workers: int = VERIFY_CONCURRENCY) -> dict:
+        """Evaluate the story in structured mode instead of with the agent loop.
+
+        All claims and citations are extracted in one pass and verified concurrently in
+        batches, and the aggregated results fill self.evaluation_report.
+
+        Args:
+            max_workers: Maximum evidence lookups and judgment batches in flight at once.
+
+        Returns:
+            The per-claim and per-citation results, as returned by ClaimVerifier.verify.
+        """
+        results = ClaimVerifier(self.model, max_workers=max_workers).verify(self.story)
+        fill_report(self.evaluation_report, results)
+        return results
@@ -1,181 +1,204 @@
 """Tool agent interface for tester agent to interact with evaluation reports. Written by Cursor (Claude) using previously written code defining the tester agent, the evaluation report class. and the news agent tools file."""
 
-from langchain.tools import tool
+from dataclasses import dataclass
+from langchain.tools import tool, ToolRuntime
 from ...evaluations.evaluation import EvaluationReport
 from ...stories.story_structure import StoryStructure
 from ..newsAgent.newsAgent import NewsAgent
-import os
-
-def create_tester_tools(evaluation_report: EvaluationReport = None):
-    """Create LangChain tools for the tester agent to generate stories and create evaluation reports."""
-    
-    current_evaluation = evaluation_report
-    current_story = None
-    
-    @tool
-    def generate_story(topic: str) -> str:
-        """Generate a story about a given topic using the NewsAgent.
-        
-        Args:
-            topic: The topic to generate a story about
-            
-        Returns:
-            The full story as a JSON string including title, segments, images, research document, and citations
-        """
-        nonlocal current_story, current_evaluation
-        try:
-            # Create a new story structure
-            story = StoryStructure()
-            
-            # Create a news agent with the story
-            news_agent = NewsAgent(story=story)
-            
-            # Generate the story
-            from ..newsAgent.prompts import news_agent_writing_action_prompt
-            prompt = news_agent_writing_action_prompt.format(topic=topic)
-            response = news_agent.invoke({"messages": [{"role": "user", "content": prompt}]})
-            
-            # Store the current story for evaluation
-            current_story = story
-            current_evaluation = EvaluationReport(story)
-            
-            # Return the full story JSON
-            import json
-            story_data = story.to_json()
-            return f"Story generated successfully:\n{json.dumps(story_data, indent=2)}"
-        except Exception as e:
-            return f"Error generating story: {str(e)}"
-    
-    @tool
-    def perplexity_search(query: str) -> str:
-        """Search for information using Perplexity web search for fact-checking.
-        
-        Args:
-            query: The search query to look up information about
-            
-        Returns:
-            Formatted search results with titles, URLs, and snippets
-        """
-        from perplexity import Perplexity
-        
-        try:
-            perplexity_client = Perplexity(api_key=os.getenv("PERPLEXITY_API_KEY"))
-            search = perplexity_client.search.create(
-                query=query,
-                max_results=5,
-                max_tokens_per_page=1024
-            )
-            
-            results = []
-            for result in search.results:
-                result_text = f"Title: {result.title}\nURL: {result.url}\nSnippet: {getattr(result, 'snippet', '')}"
-                results.append(result_text)
-            
-            formatted_results = "\n\n".join(results)
-            return f"Search completed. Found {len(results)} results.\n\n{formatted_results}"
-        except Exception as e:
-            return f"Error searching Perplexity: {str(e)}"
-    
-    @tool
-    def get_current_evaluation_status() -> str:
-        """Get the current status of the evaluation report.
-        
-        Returns:
-            Summary of current evaluation metrics and report status
-        """
-        nonlocal current_evaluation
-        if current_evaluation is None:
-            return "No evaluation report exists. Please generate a story first."
-        
+from ..search_service import get_search_service, format_results
+from ...stories.research import format_passages
+
+@dataclass
+class EvaluationContext:
+    """Runtime context of a tester agent run: the evaluation report its tools fill in.
+
+    The tester agent graph is compiled once and shared, so the report is passed with
+    each invocation instead of being captured by the tools. generate_story replaces it.
+    """
+    evaluation_report: EvaluationReport = None
+
+
+@tool
+def generate_story(runtime: ToolRuntime[EvaluationContext], topic: str) -> str:
+    """Generate a story about a given topic using the NewsAgent.
+
+    Args:
+        topic: The topic to generate a story about
+
+    Returns:
+        The full story as a JSON string including title, segments, images, research document, and citations
+    """
+    try:
+        # Create a new story structure, stored under its topic like the stories the API generates
+        story = StoryStructure(topic)
+
+        # Create a news agent with the story
+        news_agent = NewsAgent(story=story)
+
+        # Generate the story
+        from ..newsAgent.prompts import news_agent_writing_action_prompt
+        prompt = news_agent_writing_action_prompt.format(topic=topic)
+        news_agent.invoke({"messages": [{"role": "user", "content": prompt}]})
+
+        # Evaluate the new story from now on
+        runtime.context.evaluation_report = EvaluationReport(story)
+
+        # Return the full story JSON
         import json
-        status = {
-            "accuracy_proportion": current_evaluation.accuracy_proportion,
-            "citations_proportion": current_evaluation.citations_proportion,
-            "report": current_evaluation.report
-        }
-        return json.dumps(status, indent=2)
-    
-    @tool
-    def update_evaluation_report(accuracy_proportion: float = None, citations_proportion: float = None, accuracy_report: str = None, citations_report: str = None) -> str:
-        """Update the evaluation report with accuracy and citations metrics and details.
-        
-        Args:
-            accuracy_proportion: A float between 0 and 1 representing the proportion of accurate content (optional)
-            citations_proportion: A float between 0 and 1 representing the proportion of facts supported by citations (optional)
-            accuracy_report: Detailed text describing accuracy findings (optional)
-            citations_report: Detailed text describing citations findings (optional)
-            
-        Returns:
-            Confirmation message
-        """
-        nonlocal current_evaluation
-        if current_evaluation is None:
-            return "No evaluation report exists. Please generate a story first."
-        
-        # Validate proportions
-        if accuracy_proportion is not None and not 0 <= accuracy_proportion <= 1:
-            return "Accuracy proportion must be between 0 and 1"
-        
-        if citations_proportion is not None and not 0 <= citations_proportion <= 1:
-            return "Citations proportion must be between 0 and 1"
-        
-        # Use the update_report method from EvaluationReport class
-        current_evaluation.update_report(
-            accuracy_proportion=accuracy_proportion,
-            citations_proportion=citations_proportion,
-            accuracy_report=accuracy_report,
-            citations_report=citations_report
-        )
-        
-        # Build confirmation message
-        updates = []
-        if accuracy_proportion is not None:
-            updates.append(f"accuracy proportion to {accuracy_proportion}")
-        if citations_proportion is not None:
-            updates.append(f"citations proportion to {citations_proportion}")
-        if accuracy_report is not None:
-            updates.append("accuracy report details")
-        if citations_report is not None:
-            updates.append("citations report details")
-        
-        if not updates:
-            return "No updates provided"
-        
-        return f"Updated evaluation report: {', '.join(updates)}"
-    
-    @tool
-    def calculate_evaluation_metrics(total, num_correct):
-        """Very simple tools to calculate proportions of accuracy and citations in the current evaluation report. Just provide
-        the total number of facts in the story and the number of facts that are accurate or supported by citations and 
-        the function will calculate the proportions.
-        """
-        proportion = num_correct / total
-        return "Proportion: " + str(proportion)
-    @tool
-    def save_evaluation_report(report_name: str) -> str:
-        """Save the current evaluation report to disk.
-        
-        Args:
-            report_name: The name to save the report under (without .json extension)
-            
-        Returns:
-            Confirmation message with save location
-        """
-        nonlocal current_evaluation
-        if current_evaluation is None:
-            return "No evaluation report exists. Please generate a story first."
-        
-        try:
-            current_evaluation.save_report(report_name)
-            return f"Evaluation report saved successfully as '{report_name}.json'"
-        except Exception as e:
-            return f"Error saving evaluation report: {str(e)}"
-    
-    return [
-        generate_story,
-        perplexity_search,
-        get_current_evaluation_status,
-        update_evaluation_report,
-        save_evaluation_report,
-        calculate_evaluation_metrics
-    ]
+        story_data = story.to_json()
+        return f"Story generated successfully:\n{json.dumps(story_data, indent=2)}"
+    except Exception as e:
+        return f"Error generating story: {str(e)}"
+
+@tool
+def perplexity_search(query: str) -> str:
+    """Search for information using Perplexity web search for fact-checking.
+
+    Args:
+        query: The search query to look up information about
+
+    Returns:
+        Formatted search results with titles, URLs, and snippets
+    """
+    try:
+        results = get_search_service().search(query)
+        formatted_results = format_results(results)
+        return f"Search completed. Found {len(results)} results.\n\n{formatted_results}"
+    except Exception as e:
+        return f"Error searching Perplexity: {str(e)}"
+
+@tool
+def search_story_research(runtime: ToolRuntime[EvaluationContext], claim: str, k: int = 5) -> str:
+    """Find the passages of the story's own research most relevant to a claim. Check this before
+    searching the web: if the passages clearly confirm or contradict the claim, no web search is needed.
+
+    Args:
+        claim: The claim or citation to look for evidence of
+        k: Maximum number of passages to return
+
+    Returns:
+        The best matching research passages with their titles, URLs and relevance scores
+    """
+    current_evaluation = runtime.context.evaluation_report
+    if current_evaluation is None or current_evaluation.story is None:
+        return "No story is being evaluated. Please generate a story first."
+    passages = current_evaluation.story.search_research(claim, k)
+    if not passages:
+        return "The story's research has nothing on this claim. Use perplexity_search to verify it."
+    return format_passages(passages)
+
+@tool
+def get_current_evaluation_status(runtime: ToolRuntime[EvaluationContext]) -> str:
+    """Get the current status of the evaluation report.
+
+    Returns:
+        Summary of current evaluation metrics and report status
+    """
+    current_evaluation = runtime.context.evaluation_report
+    if current_evaluation is None:
+        return "No evaluation report exists. Please generate a story first."
+
+    import json
+    status = {
+        "accuracy_proportion": current_evaluation.accuracy_proportion,
+        "citations_proportion": current_evaluation.citations_proportion,
+        "report": current_evaluation.report
+    }
+    return json.dumps(status, indent=2)
+
+@tool
+def update_evaluation_report(runtime: ToolRuntime[EvaluationContext], accuracy_proportion: float = None, citations_proportion: float = None, accuracy_report: str = None, citations_report: str = None) -> str:
+    """Update the evaluation report with accuracy and citations metrics and details.
+
+    Args:
+        accuracy_proportion: A float between 0 and 1 representing the proportion of accurate content (optional)
+        citations_proportion: A float between 0 and 1 representing the proportion of facts supported by citations (optional)
+        accuracy_report: Detailed text describing accuracy findings (optional)
+        citations_report: Detailed text describing citations findings (optional)
+
+    Returns:
+        Confirmation message
+    """
+    current_evaluation = runtime.context.evaluation_report
+    if current_evaluation is None:
+        return "No evaluation report exists. Please generate a story first."
+
+    # Validate proportions
+    if accuracy_proportion is not None and not 0 <= accuracy_proportion <= 1:
+        return "Accuracy proportion must be between 0 and 1"
+
+    if citations_proportion is not None and not 0 <= citations_proportion <= 1:
+        return "Citations proportion must be between 0 and 1"
+
+    # Use the update_report method from EvaluationReport class
+    current_evaluation.update_report(
+        accuracy_proportion=accuracy_proportion,
+        citations_proportion=citations_proportion,
+        accuracy_report=accuracy_report,
+        citations_report=citations_report
+    )
+
+    # Build confirmation message
+    updates = []
+    if accuracy_proportion is not None:
+        updates.append(f"accuracy proportion to {accuracy_proportion}")
+    if citations_proportion is not None:
+        updates.append(f"citations proportion to {citations_proportion}")
+    if accuracy_report is not None:
+        updates.append("accuracy report details")
+    if citations_report is not None:
+        updates.append("citations report details")
+
+    if not updates:
+        return "No updates provided"
+
+    return f"Updated evaluation report: {', '.join(updates)}"
+
+@tool
+def calculate_evaluation_metrics(total, num_correct):
+    """Very simple tools to calculate proportions of accuracy and citations in the current evaluation report. Just provide
+    the total number of facts in the story and the number of facts that are accurate or supported by citations and 
+    the function will calculate the proportions.
+    """
+    proportion = num_correct / total
+    return "Proportion: " + str(proportion)
+
+@tool
+def save_evaluation_report(runtime: ToolRuntime[EvaluationContext], report_name: str) -> str:
+    """Save the current evaluation report to disk.
+
+    Args:
+        report_name: The name to save the report under (without .json extension)
+
+    Returns:
+        Confirmation message with save location
+    """
+    current_evaluation = runtime.context.evaluation_report
+    if current_evaluation is None:
+        return "No evaluation report exists. Please generate a story first."
+
+    try:
+        current_evaluation.save_report(report_name)
+        return f"Evaluation report saved successfully as '{report_name}.json'"
+    except Exception as e:
+        return f"Error saving evaluation report: {str(e)}"
+
+TESTER_TOOLS = [
+    generate_story,
+    search_story_research,
+    perplexity_search,
+    get_current_evaluation_status,
+    update_evaluation_report,
+    save_evaluation_report,
+    calculate_evaluation_metrics,
+]
+
+# What the model is told when the context window middleware removes an old result of these tools
+TESTER_TOOL_RESULT_HINTS = {
+    "perplexity_search": "Search again if you need these results; repeated searches are served from cache.",
+    "search_story_research": "Call search_story_research again if you need this evidence.",
+    "get_current_evaluation_status": "Call get_current_evaluation_status for the current report.",
+    "generate_story": "The generated story is the one now being evaluated.",
+}
+# Tools returning the current state of the report, so each result supersedes the previous one
+TESTER_SNAPSHOT_TOOLS = ("get_current_evaluation_status",)
@@ -0,0 +1,512 @@
+"""Background queue for story generation jobs.
+
+Generating a story takes minutes, so instead of holding an HTTP connection open
+for the whole agent run, clients enqueue a job, get a job ID back and poll for
+its status and result. Jobs run on a bounded worker pool, admission is refused
+once the queue is full, and job state is kept in SQLite so queued or
+interrupted jobs are picked up again when the API restarts. The agent run of a
+job is checkpointed under the job ID, so an interrupted job resumes from its
+last completed step rather than starting over.
+
+Identical requests are coalesced: while a topic is being generated, further
+submissions for the same normalized topic attach to the running job and share
+its result. Across uvicorn workers this is coordinated with a lease file per
+topic, locked by the process running the generation; other processes follow
+that job through the shared job database.
+"""
+
+import fcntl
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from ..agents.instrumentation import tracing
+from ..agents.search_service import normalize_query
+from ..stories.story_structure import StoryStructure
+
+JOB_DB_PATH = "src/backend/api/jobs.db"
+LEASE_DIR = "src/backend/api/leases"
+MAX_CONCURRENT_JOBS = int(os.getenv("STORYTIME_MAX_CONCURRENT_JOBS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("STORYTIME_MAX_QUEUED_JOBS", "20"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Used for Retry-After estimates until a job has actually finished
+DEFAULT_JOB_SECONDS = 120.0
+# How often a process following another process's job checks on it
+FOLLOW_POLL_SECONDS = 1.0
+# How long to wait for a process that just took a topic's lease to name its job
+LEASE_NAMING_TIMEOUT_SECONDS = 5.0
+LEASE_NAMING_POLL_SECONDS = 0.01
+
+
+class JobAbandoned(Exception):
+    """Raised inside a job's progress callback once everyone waiting on it has left."""
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Story generation queue is full, retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+def flight_key(topic: str) -> str:
+    """Key under which concurrent requests for a topic are coalesced."""
+    return normalize_query(topic)
+
+
+class GenerationLease:
+    """A lock file held by the process generating a topic, naming the job doing it.
+
+    The lock is an flock, so it is released by the OS if that process dies.
+    """
+
+    def __init__(self, key: str, lease_dir: str = LEASE_DIR):
+        self.path = os.path.join(lease_dir, hashlib.sha256(key.encode()).hexdigest()[:32] + ".lease")
+        self.fd = None
+
+    def acquire(self, job_id: str) -> bool:
+        """Take the lease for job_id. Returns False if another job holds it."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, job_id.encode())
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is None:
+            return
+        # Emptied first so nobody mistakes this job for the next holder's
+        os.ftruncate(self.fd, 0)
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+
+    def is_held(self) -> bool:
+        """Whether any process currently holds the lease."""
+        if self.fd is not None:
+            return True
+        if not os.path.exists(self.path):
+            return False
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            return False
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(fd)
+
+    def holder(self) -> str:
+        """ID of the job holding the lease, or "" if it is free or not yet named."""
+        try:
+            with open(self.path, 'r') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ""
+
+
+class _Flight:
+    """One in-progress generation and everyone waiting on it."""
+
+    def __init__(self, key: str, job_id: str, lease: GenerationLease = None):
+        self.key = key
+        self.job_id = job_id
+        self.lease = lease
+        self.future: Future = None
+        self.listeners = []
+        self.waiters = 0
+        # Set when the last waiter leaves; the job stops at its next progress event
+        self.abandoned = False
+
+
+def load_story(filename: str) -> StoryStructure:
+    """Load a finished story from its storage filename."""
+    story = StoryStructure(os.path.splitext(filename)[0], journaled=False)
+    story.load_from_file()
+    return story
+
+
+class GenerationJobQueue:
+    def __init__(self, generate: Callable, db_path: str = JOB_DB_PATH,
+                 max_workers: int = MAX_CONCURRENT_JOBS, max_queued: int = MAX_QUEUED_JOBS):
+        """
+        Args:
+            generate: Callable taking a topic, an optional on_event progress callback and the job_id
+                to checkpoint its run under, returning the generated StoryStructure already saved to
+                its storage location. Called again with the same job_id for a job that was interrupted.
+            db_path: SQLite file holding job state.
+            max_workers: Number of stories generated concurrently.
+            max_queued: Number of jobs allowed to wait for a worker before submissions are refused.
+        """
+        self.generate = generate
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.executor = None
+        self.futures: Dict[str, Future] = {}
+        self.flights: Dict[str, _Flight] = {}
+        # Topics whose flight is being started, set once it is registered in self.flights
+        self.starting: Dict[str, threading.Event] = {}
+        self.lock = threading.RLock()
+        # Flights by job ID until their future resolves, so waiters can leave after the flight lands
+        self.joined: Dict[str, _Flight] = {}
+        self.average_job_seconds = DEFAULT_JOB_SECONDS
+
+    @contextmanager
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        topic TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        started_at REAL,
+                        finished_at REAL,
+                        result_filename TEXT,
+                        error TEXT
+                    )"""
+                )
+                yield conn
+        finally:
+            conn.close()
+
+    def start(self):
+        """Start the worker pool and re-enqueue jobs left queued or running by a previous process.
+
+        Jobs that were running resume from their agent checkpoints. Jobs whose topic lease is
+        held by another live worker process are left to it.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="story-job")
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, topic FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (JOB_QUEUED, JOB_RUNNING),
+            ).fetchall()
+        for row in rows:
+            key = flight_key(row["topic"])
+            lease = GenerationLease(key)
+            with self.lock:
+                if key in self.flights:
+                    self._mark_failed(row["id"], f"Superseded by job {self.flights[key].job_id}")
+                    continue
+                if not lease.acquire(row["id"]):
+                    holder = lease.holder()
+                    if holder and holder != row["id"]:
+                        # The topic was generated again by another job while this one was interrupted
+                        self._mark_failed(row["id"], f"Superseded by job {holder}")
+                    continue
+                with self._connect() as conn:
+                    conn.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE id = ?", (JOB_QUEUED, row["id"]))
+                flight = _Flight(key, row["id"], lease)
+                self.flights[key] = flight
+                self._dispatch(row["id"], row["topic"], flight)
+
+    def shutdown(self):
+        """Stop accepting work. Jobs still queued stay persisted and resume on the next start."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def pending_count(self) -> int:
+        """Number of jobs queued or running in this process."""
+        with self.lock:
+            return len(self.futures)
+
+    def retry_after(self) -> int:
+        """Estimate how many seconds until a worker frees up for a new job."""
+        # With all workers busy, one of them finishes roughly every average/max_workers seconds
+        return max(1, math.ceil(self.average_job_seconds / self.max_workers))
+
+    def submit(self, topic: str, on_event: Callable = None):
+        """Enqueue a generation job for a topic, or join the one already generating it.
+
+        Args:
+            topic: The story topic.
+            on_event: Optional callback receiving progress event dicts while the job runs.
+                If it raises, it stops receiving events and stops waiting. Callers passing
+                no on_event call leave when they stop waiting. The job is abandoned once
+                nobody is waiting on it any more.
+
+        Returns:
+            A (job_id, future) tuple. The future resolves to the generated story. Concurrent
+            submissions of the same topic get the same job ID and result.
+
+        Raises:
+            QueueFullError: If the queue already holds max_workers + max_queued jobs, or another
+                worker process is starting the same topic and doesn't name its job in time.
+        """
+        key = flight_key(topic)
+        while True:
+            with self.lock:
+                flight = self.flights.get(key)
+                if flight is not None:
+                    return self._join(flight, on_event)
+                starting = self.starting.get(key)
+                if starting is None:
+                    # Admission is checked under the lock, counting flights still being started,
+                    # so concurrent submits can't overshoot
+                    if len(self.futures) + len(self.starting) >= self.max_workers + self.max_queued:
+                        raise QueueFullError(self.retry_after())
+                    starting = self.starting[key] = threading.Event()
+                    break
+            # Another thread is starting this topic's flight; join it once it is registered
+            starting.wait()
+        try:
+            flight = self._start_flight(key, topic)
+            with self.lock:
+                # The flight may already have landed; its future still holds the outcome
+                return self._join(flight, on_event)
+        finally:
+            with self.lock:
+                del self.starting[key]
+            starting.set()
+
+    def _join(self, flight: _Flight, on_event: Callable = None):
+        """Add a waiter to a flight. Called with self.lock held."""
+        flight.waiters += 1
+        flight.abandoned = False
+        if on_event is not None:
+            flight.listeners.append(on_event)
+        if not flight.future.done():
+            self.joined[flight.job_id] = flight
+        return flight.job_id, flight.future
+
+    def leave(self, job_id: str):
+        """Stop waiting on a job submitted without on_event, e.g. when the client disconnects.
+
+        Waiters with an on_event leave when it raises instead. Once every waiter has left,
+        the job is abandoned at its next progress event. Does nothing for finished jobs.
+        """
+        with self.lock:
+            flight = self.joined.get(job_id)
+            if flight is not None:
+                self._depart(flight)
+
+    def _depart(self, flight: _Flight):
+        """Remove a waiter from a flight. Called with self.lock held."""
+        flight.waiters -= 1
+        if flight.waiters <= 0:
+            flight.abandoned = True
+
+    def _lead_or_follow(self, lease: GenerationLease, job_id: str) -> str:
+        """Take a topic's lease for job_id, or find the job of the process holding it.
+
+        Runs without self.lock, since another process may take a moment to name its job.
+
+        Returns:
+            job_id if the lease was taken, otherwise the leading process's job ID.
+
+        Raises:
+            QueueFullError: If the holding process doesn't name its job within
+                LEASE_NAMING_TIMEOUT_SECONDS; the client should retry later.
+        """
+        deadline = time.monotonic() + LEASE_NAMING_TIMEOUT_SECONDS
+        while not lease.acquire(job_id):
+            leader_id = lease.holder()
+            if leader_id:
+                return leader_id
+            if time.monotonic() >= deadline:
+                raise QueueFullError(self.retry_after())
+            # The other process has the lock but hasn't named its job yet
+            time.sleep(LEASE_NAMING_POLL_SECONDS)
+        return job_id
+
+    def _start_flight(self, key: str, topic: str) -> _Flight:
+        """Start generating a topic, or follow the process already generating it, and register
+        the flight. Called by the one thread starting this key."""
+        job_id = str(uuid.uuid4())
+        lease = GenerationLease(key)
+        flight = None
+        leader_id = self._lead_or_follow(lease, job_id)
+        if leader_id != job_id:
+            # Another worker process is generating this topic; follow its job
+            flight = _Flight(key, leader_id)
+            flight.future = Future()
+            with self.lock:
+                self.flights[key] = flight
+            threading.Thread(target=self._follow, args=(flight, topic), daemon=True).start()
+            return flight
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, topic, status, created_at) VALUES (?, ?, ?, ?)",
+                    (job_id, topic, JOB_QUEUED, time.time()),
+                )
+            flight = _Flight(key, job_id, lease)
+            # Registered along with dispatch, so joiners always see its future and _land
+            # always finds it when the job ends
+            with self.lock:
+                self.flights[key] = flight
+                self._dispatch(job_id, topic, flight)
+        except BaseException:
+            if flight is not None:
+                self._land(flight)
+            else:
+                lease.release()
+            raise
+        return flight
+
+    def _dispatch(self, job_id: str, topic: str, flight: _Flight):
+        with self.lock:
+            future = self.executor.submit(self._run, job_id, topic, flight)
+            self.futures[job_id] = future
+            flight.future = future
+        future.add_done_callback(lambda _: self._forget(job_id))
+        return future
+
+    def _forget(self, job_id: str):
+        with self.lock:
+            self.futures.pop(job_id, None)
+            self.joined.pop(job_id, None)
+
+    def _land(self, flight: _Flight):
+        """Stop coalescing onto a flight and release its lease."""
+        with self.lock:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+            if flight.lease is not None:
+                flight.lease.release()
+
+    def _broadcast(self, flight: _Flight, event: dict):
+        """Pass a progress event to everyone streaming a flight."""
+        with self.lock:
+            listeners = list(flight.listeners)
+        error = None
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                error = e
+                with self.lock:
+                    flight.listeners.remove(listener)
+                    self._depart(flight)
+        if flight.abandoned:
+            raise error if error is not None else JobAbandoned(f"Nobody is waiting on job {flight.job_id}")
+
+    def _mark_failed(self, job_id: str, error: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                (JOB_FAILED, time.time(), error, job_id),
+            )
+
+    def _run(self, job_id: str, topic: str, flight: _Flight):
+        try:
+            started_at = time.time()
+            with self._connect() as conn:
+                conn.execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (JOB_RUNNING, started_at, job_id))
+            try:
+                # Every model and tool call in the job lands in a trace file named after the job
+                with tracing(job_id):
+                    story = self.generate(topic, on_event=lambda event: self._broadcast(flight, event), job_id=job_id)
+            except Exception as e:
+                self._mark_failed(job_id, str(e))
+                raise
+            finished_at = time.time()
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, result_filename = ? WHERE id = ?",
+                    (JOB_SUCCEEDED, finished_at, os.path.basename(story.location), job_id),
+                )
+            # Exponential moving average of job durations for Retry-After estimates
+            self.average_job_seconds = 0.8 * self.average_job_seconds + 0.2 * (finished_at - started_at)
+            return story
+        finally:
+            # Only after the job's outcome is recorded, so followers never see a free lease on an unfinished job
+            self._land(flight)
+
+    def _follow(self, flight: _Flight, topic: str):
+        """Wait for a job running in another process and resolve flight.future with its story.
+
+        Progress events are not relayed across processes; listeners only see the outcome.
+        If the other process dies before finishing, the topic is submitted again here.
+        """
+        lease = GenerationLease(flight.key)
+        try:
+            while True:
+                job = self.get_job(flight.job_id)
+                if job is not None and job["status"] == JOB_SUCCEEDED:
+                    story = load_story(job["result_filename"])
+                    break
+                if job is not None and job["status"] == JOB_FAILED:
+                    raise RuntimeError(job["error"])
+                if not lease.is_held():
+                    job = self.get_job(flight.job_id)
+                    if job is None or job["status"] not in (JOB_SUCCEEDED, JOB_FAILED):
+                        # The leading process died mid-job; generate the topic here instead, relaying
+                        # its progress so this flight's waiters can still abandon it
+                        self._land(flight)
+                        job_id, future = self.submit(topic, on_event=lambda event: self._broadcast(flight, event))
+                        self._mark_failed(flight.job_id, f"Generating process exited; topic resubmitted as job {job_id}")
+                        story = future.result()
+                        break
+                time.sleep(FOLLOW_POLL_SECONDS)
+        except Exception as e:
+            self._land(flight)
+            self._unjoin(flight)
+            flight.future.set_exception(e)
+            return
+        self._land(flight)
+        self._unjoin(flight)
+        flight.future.set_result(story)
+
+    def _unjoin(self, flight: _Flight):
+        with self.lock:
+            self.joined.pop(flight.job_id, None)
+
+    def future(self, job_id: str) -> Future:
+        """Return the in-process future for a queued or running job, or None."""
+        with self.lock:
+            return self.futures.get(job_id)
+
+    def get_job(self, job_id: str) -> dict:
+        """Return the job record as a dict, or None if the job does not exist."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        if job["status"] == JOB_QUEUED:
+            with self._connect() as conn:
+                job["queue_position"] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?",
+                    (JOB_QUEUED, job["created_at"]),
+                ).fetchone()[0]
+        return job
+
+    def stats(self) -> dict:
+        """Return job counts by status plus the worker pool limits."""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            "max_workers": self.max_workers,
+            "max_queued": self.max_queued,
+            "pending": self.pending_count(),
+            "counts": counts,
+        }
@@ -1,13 +1,134 @@
-from fastapi import FastAPI, HTTPException
+import time
+# Startup is measured from the first line of the API module
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from ..stories.story_structure import StoryStructure
-from ..agents.newsAgent.newsAgent import NewsAgent
-from ..agents.newsAgent.prompts import news_agent_writing_action_prompt
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from ..stories.story_structure import StoryStructure, read_story, has_pending_journal
+from ..stories.storage import get_storage
+from ..stories import image_store, payloads, version_store
+from ..agents.instrumentation import metrics, load_trace
+from ..agents.search_service import get_search_service
+from .jobs import GenerationJobQueue, JobAbandoned, QueueFullError, JOB_QUEUED, JOB_SUCCEEDED, JOB_FAILED
+from .topic_cache import TopicCache
+from .responses import project, stream_json, encode_cursor, decode_cursor, http_date, is_not_modified
+from contextlib import asynccontextmanager
 import asyncio
 import os
 import json
+import threading
+
+# Seconds from importing the API to serving requests. The agent SDKs are imported and
+# the news agent graph compiled in the background, outside this budget.
+STARTUP_BUDGET_SECONDS = float(os.getenv("STORYTIME_STARTUP_BUDGET", "1.0"))
+
+def run_story_generation(topic: str, on_event=None, job_id: str = None) -> StoryStructure:
+    """Research a topic, run the news agent on it and save the finished story. Blocks for the whole run.
+
+    The background research is planned in one model call and its searches run concurrently
+    before the agent starts writing (see ResearchPlanner).
+
+    Args:
+        topic: The story topic.
+        on_event: Optional callback receiving progress events while the agent works.
+            If it raises, the agent run is abandoned.
+        job_id: Checkpoint the agent run durably under this ID. If a run with the same ID was
+            interrupted, it continues from its last completed step instead of starting over.
+    """
+    # The agent SDKs are only needed once a story is generated, so the API starts without them
+    from ..agents import checkpoints
+    from ..agents.newsAgent.newsAgent import NewsAgent
+    from ..agents.newsAgent.prompts import news_agent_research_ready_prompt, news_agent_writing_action_prompt
+    from ..agents.newsAgent.research_planning import ResearchPlanner
+
+    started = time.time()
+    # A checkpointed run journals the story, so a resumed run gets back the edits made before the interruption
+    story = StoryStructure(topic, journaled=True if job_id is not None else None)
+    agent = NewsAgent(story, thread_id=job_id)
+    try:
+        if job_id is not None and agent.has_checkpoint():
+            story.load_from_file()
+            input = None
+        else:
+            prompt = news_agent_writing_action_prompt.format(topic=topic)
+            try:
+                research = ResearchPlanner(agent.model).research(story, topic, on_event)
+            except (GenerationCancelled, JobAbandoned):
+                raise
+            except Exception as e:
+                # The agent can still research the topic itself, one search at a time
+                print(f"Research planning failed for {topic!r}: {str(e)}")
+                research = None
+            if research is not None and research["results"]:
+                prompt += news_agent_research_ready_prompt.format(
+                    queries="\n".join(f"- {query}" for query in research["queries"] if query not in research["errors"])
+                )
+            input = {
+                "messages": [{
+                    "role": "user", 
+                    "content": prompt
+                }]
+            }
+        if on_event is None:
+            agent.invoke(input)
+        else:
+            for event in agent.stream(input):
+                on_event(event)
+        if not agent.story.title:
+            raise ValueError("Story generation completed but title is missing")
+        story.finalize()
+    finally:
+        # Runs that end here, finished or failed, are never resumed; only a dead process leaves a checkpoint
+        agent.discard()
+        if job_id is not None:
+            checkpoints.prune()
+    topic_cache.record(topic, os.path.basename(story.location), time.time() - started)
+    return story
+
+job_queue = GenerationJobQueue(run_story_generation)
+topic_cache = TopicCache()
+
+def cached_story(topic: str):
+    """Return a fresh story already generated for this or a near-duplicate topic, or None."""
+    hit = topic_cache.lookup(topic, story_exists=lambda filename: get_storage().story_exists(os.path.splitext(filename)[0]))
+    if hit is None:
+        return None
+    return read_story(os.path.splitext(hit["story_filename"])[0])
+
+def warm_up_agents():
+    """Import the agent SDKs, compile the news agent graph and open the checkpoint database,
+    so the first generation doesn't pay for them."""
+    started = time.perf_counter()
+    try:
+        from ..agents import checkpoints
+        from ..agents.newsAgent.newsAgent import get_news_agent_graph
+        get_news_agent_graph()
+        # Drop checkpoints of jobs abandoned past the retention window
+        checkpoints.prune()
+    except Exception as e:
+        print(f"Agent warm-up failed: {str(e)}")
+        return
+    metrics.set_gauge("storytime_startup_seconds", {"phase": "agent_warmup"}, time.perf_counter() - started,
+                      "Time taken by each startup phase")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Re-index only story files that changed while the API was down
+    get_storage().refresh_index()
+    job_queue.start()
+    threading.Thread(target=warm_up_agents, name="agent-warmup", daemon=True).start()
+    startup_seconds = time.perf_counter() - _import_started
+    metrics.set_gauge("storytime_startup_seconds", {"phase": "api"}, startup_seconds, "Time taken by each startup phase")
+    metrics.set_gauge("storytime_startup_budget_seconds", {}, STARTUP_BUDGET_SECONDS, "Startup time budget")
+    if startup_seconds > STARTUP_BUDGET_SECONDS:
+        print(f"API startup took {startup_seconds:.2f}s, over its {STARTUP_BUDGET_SECONDS:.2f}s budget")
+    yield
+    job_queue.shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -18,66 +139,300 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class GenerateStoryRequest(BaseModel):
+    topic: str
+
+def queue_full_response(e: QueueFullError):
+    return JSONResponse(status_code=429, content={"detail": str(e)}, headers={"Retry-After": str(e.retry_after)})
+
 @app.get("/generate-story")
-async def generate_story(topic: str):
+async def generate_story(topic: str, fresh: bool = False):
+    """Generate a story and wait for it. Runs through the job queue, so it shares its concurrency limits,
+    and concurrent requests for the same topic share a single generation.
+
+    A story generated recently for the same or a near-duplicate topic is returned instead of
+    running the agent again, unless fresh=true.
+    """
     try:
-        story = StoryStructure(topic)
-        agent = NewsAgent(story)
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None,
-            lambda: agent.invoke({
-                "messages": [{
-                    "role": "user", 
-                    "content": news_agent_writing_action_prompt.format(topic=topic)
-                }]
-            })
-        )
-        result = agent.story.to_json()
-        if not result.get("title"):
-            raise HTTPException(status_code=500, detail="Story generation completed but title is missing")
-        return result
-    except HTTPException:
-        raise
+        story = None if fresh else cached_story(topic)
+        if story is not None:
+            return story
+        job_id, future = job_queue.submit(topic)
+        try:
+            story = await asyncio.wrap_future(future)
+        finally:
+            # Also when the client disconnects, so a job nobody waits on any more can be abandoned
+            job_queue.leave(job_id)
+        return story.to_json()
+    except QueueFullError as e:
+        return queue_full_response(e)
     except Exception as e:
         import traceback
         print(f"Error generating story: {str(e)}")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error generating story: {str(e)}")
 
+class GenerationCancelled(Exception):
+    """Raised inside a streamed generation when its client has disconnected."""
+
+def sse_event(event: dict) -> str:
+    """Format an event dict as a Server-Sent Events message."""
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+@app.get("/generate-story/stream")
+async def stream_story(topic: str, request: Request, fresh: bool = False):
+    """Generate a story, streaming progress as Server-Sent Events.
+
+    Emits a "job" event with the job ID, research_planned and research_search_finished events
+    while the background research runs, then tool_started/tool_finished and story edit
+    events (segment_added, text_written, image_added, title_set) while the agent works,
+    and finally "done" with the full story or "error". Disconnecting cancels the run.
+    A cached story for the topic is sent as a single "done" event, unless fresh=true.
+    """
+    story = None if fresh else cached_story(topic)
+    if story is not None:
+        return StreamingResponse(iter([sse_event({"event": "done", "story": story, "cached": True})]),
+                                 media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def on_event(event):
+        if cancelled.is_set():
+            raise GenerationCancelled("Client disconnected")
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    try:
+        job_id, future = job_queue.submit(topic, on_event=on_event)
+    except QueueFullError as e:
+        return queue_full_response(e)
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, None))
+
+    async def event_stream():
+        try:
+            yield sse_event({"event": "job", "job_id": job_id})
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield sse_event(event)
+                if await request.is_disconnected():
+                    return
+            if future.exception() is not None:
+                yield sse_event({"event": "error", "detail": f"Error generating story: {future.exception()}"})
+            else:
+                yield sse_event({"event": "done", "story": future.result().to_json()})
+        finally:
+            cancelled.set()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/jobs", status_code=202)
+async def create_generation_job(request: GenerateStoryRequest):
+    """Enqueue a story generation job and return its ID without waiting for the agent.
+
+    A request for a topic already being generated joins that job, and gets its current status.
+    """
+    try:
+        job_id, _ = job_queue.submit(request.topic)
+    except QueueFullError as e:
+        return queue_full_response(e)
+    job = job_queue.get_job(job_id)
+    return {"job_id": job_id, "status": job["status"] if job is not None else JOB_QUEUED}
+
+@app.get("/jobs")
+async def get_job_stats():
+    """Report queue depth and job counts by status."""
+    return job_queue.stats()
+
+@app.get("/jobs/{job_id}")
+async def get_generation_job(job_id: str):
+    """Get the status of a story generation job."""
+    job = job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/trace")
+async def get_generation_job_trace(job_id: str):
+    """Get the per-step timing, token and cost trace recorded for a job."""
+    trace = load_trace(job_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Expose agent, search cache and job queue metrics in Prometheus text format."""
+    for name, value in get_search_service().stats().items():
+        metrics.set_gauge(f"storytime_search_cache_{name}", {}, value, "Perplexity search cache statistics")
+    stats = job_queue.stats()
+    metrics.set_gauge("storytime_jobs_pending", {}, stats["pending"], "Jobs queued or running in this process")
+    for status, count in stats["counts"].items():
+        metrics.set_gauge("storytime_jobs", {"status": status}, count, "Jobs by status")
+    for name, value in topic_cache.stats().items():
+        metrics.set_gauge(f"storytime_topic_cache_{name}", {}, value, "Near-duplicate topic cache statistics")
+    return metrics.render()
+
+@app.get("/topic-cache")
+async def get_topic_cache_stats():
+    """Report topic cache hits, misses, hit rate and agent time saved by hits."""
+    return topic_cache.stats()
+
+@app.get("/jobs/{job_id}/result")
+async def get_generation_job_result(job_id: str, request: Request):
+    """Get the story produced by a job. Returns 202 with the job status while it is still pending."""
+    job = job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == JOB_FAILED:
+        raise HTTPException(status_code=500, detail=f"Error generating story: {job['error']}")
+    if job["status"] != JOB_SUCCEEDED:
+        return JSONResponse(status_code=202, content=job)
+    return await get_story(job["result_filename"], request)
+
 @app.get("/stories")
-async def list_stories():
-    """List all saved stories from JSON storage."""
+async def list_stories(response: Response, limit: int = None, cursor: str = None):
+    """List saved stories from the storage's metadata index, most recently modified first.
+
+    With limit, one page is returned, and the X-Next-Cursor header holds the cursor
+    to pass for the next page (absent on the last page).
+    """
     try:
-        storage_dir = "src/backend/stories/json_storage"
-        stories = []
-        if os.path.exists(storage_dir):
-            for filename in os.listdir(storage_dir):
-                if filename.endswith('.json'):
-                    with open(os.path.join(storage_dir, filename), 'r') as f:
-                        data = json.load(f)
-                    stat = os.stat(os.path.join(storage_dir, filename))
-                    stories.append({
-                        "filename": filename,
-                        "title": data.get("title", "Untitled"),
-                        "modified_at": stat.st_mtime,
-                        "thumbnail": data.get("segments", [{}])[0].get("images", [None])[0] if data.get("segments") else None
-                    })
-        stories.sort(key=lambda x: x["modified_at"], reverse=True)
-        return stories
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    try:
+        stories = get_storage().list_stories(limit, after)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if limit is not None and len(stories) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(stories[-1])
+    return stories
+
+@app.get("/stories/search")
+async def search_stories(q: str, limit: int = 20, offset: int = 0):
+    """Search story titles, segment titles and text. Results are ranked, with a highlighted
+    snippet each, and paginated with limit and offset."""
+    return get_storage().search_stories(q, limit, offset)
+
+def story_payload_response(request: Request, name: str, meta: dict) -> Response:
+    """Serve a story's precompressed payload in the best encoding the client accepts, or a 304."""
+    encoding = payloads.choose_encoding(request.headers.get("accept-encoding"), meta["encodings"])
+    # Strong ETags identify the exact bytes, so each content encoding gets its own
+    etags = {coding: f'"{meta["etag"]}{"-" + coding if coding else ""}"' for coding in [None] + meta["encodings"]}
+    headers = {
+        "ETag": etags[encoding],
+        "Last-Modified": http_date(meta["modified_at"]),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if is_not_modified(request.headers, list(etags.values()), meta["modified_at"]):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(payloads.payload_path(name, encoding), media_type="application/json", headers=headers)
+
+def current_payload_meta(name: str):
+    """Return the metadata of a story's payloads, encoding them first if they are missing
+    or stale, or None if the story doesn't exist."""
+    version = get_storage().story_version(name)
+    if version is None:
+        return None
+    meta = payloads.load_meta(name)
+    if not payloads.is_current(meta, version):
+        # Drafts, stories saved before payloads existed, and stories changed outside
+        # StoryStructure since (image migration, imports, edited files)
+        story = read_story(name)
+        if story is None:
+            return None
+        meta = payloads.write_payloads(name, story, version)
+    return meta
 
 @app.get("/stories/{filename}")
-async def get_story(filename: str):
-    """Get a specific story by filename."""
+async def get_story(filename: str, request: Request, research_document: bool = False, fields: str = None, exclude: str = None):
+    """Get a specific story by filename.
+
+    Research is returned as structured chunks. Pass research_document=true to also get
+    it rendered as the single string older clients expect.
+
+    fields and exclude are comma-separated dotted paths to keep or drop, e.g.
+    fields=title,segments.title,segments.text or exclude=research,segments.images.
+
+    Plain reads of saved stories are served from precompressed payloads with ETag and
+    Last-Modified, and answer If-None-Match/If-Modified-Since with 304. Projected reads
+    and stories still being written are encoded on the fly and streamed.
+    """
+    name = os.path.splitext(filename)[0]
+    if not (research_document or fields or exclude) and not has_pending_journal(name):
+        # Reading and compressing a whole story blocks, so it stays off the event loop
+        meta = await run_in_threadpool(current_payload_meta, name)
+        if meta is None:
+            raise HTTPException(status_code=404, detail="Story not found")
+        return story_payload_response(request, name, meta)
     try:
-        filepath = os.path.join("src/backend/stories/json_storage", filename)
-        if not os.path.exists(filepath):
+        story = read_story(name, research_document)
+        if story is None:
             raise HTTPException(status_code=404, detail="Story not found")
-        with open(filepath, 'r') as f:
-            return json.load(f)
+        story = project(story, fields, exclude)
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(stream_json(story), media_type="application/json", headers={"Cache-Control": "no-cache"})
+
+@app.get("/stories/{filename}/versions")
+async def list_story_versions(filename: str):
+    """List the saved versions of a story."""
+    return version_store.list_versions(os.path.splitext(filename)[0])
+
+@app.get("/stories/{filename}/versions/{version}")
+async def get_story_version(filename: str, version: str):
+    """Get a saved version of a story."""
+    try:
+        return version_store.load_version(os.path.splitext(filename)[0], version)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="Version not found")
+
+@app.get("/stories/{filename}/versions/{old_version}/diff/{new_version}")
+async def diff_story_versions(filename: str, old_version: str, new_version: str):
+    """Summarize what changed between two saved versions of a story."""
+    try:
+        return version_store.diff_versions(os.path.splitext(filename)[0], old_version, new_version)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="Version not found")
+
+@app.get("/reports")
+async def list_reports(story: str = None, min_accuracy: float = None):
+    """List evaluation reports, newest first, optionally only those of a story or above an accuracy."""
+    return get_storage().list_reports(story_name=story, min_accuracy=min_accuracy)
+
+@app.get("/reports/{name}")
+async def get_report(name: str):
+    """Get an evaluation report by name."""
+    report = get_storage().load_report(name)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return report
+
+@app.get("/images/{image_id}")
+async def get_image(image_id: str, request: Request):
+    """Serve an image from the content-addressed image store.
+
+    Image IDs are content hashes, so the bytes behind an ID never change and can be
+    cached forever.
+    """
+    if not image_store.is_valid_image_id(image_id):
+        raise HTTPException(status_code=404, detail="Image not found")
+    filepath = image_store.image_path(image_id)
+    if not os.path.exists(filepath):
+        raise HTTPException(status_code=404, detail="Image not found")
+    headers = {
+        "ETag": f'"{image_id.split(".")[0]}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if is_not_modified(request.headers, [headers["ETag"]]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(filepath, media_type=image_store.image_media_type(image_id), headers=headers)
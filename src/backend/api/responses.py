@@ -0,0 +1,168 @@
+"""Shaping of story read responses.
+
+Stories carry their whole research corpus and every segment's images, while
+most clients first need only titles and segment text. Projection keeps or drops
+dotted field paths ("segments.text", "research") before anything is encoded,
+and stream_json encodes the result piece by piece, so neither the response
+size nor the encoded copy held in memory depends on the largest story stored.
+Plain reads skip all of this and are served from precompressed payloads
+(stories.payloads), with ETag and Last-Modified validators.
+"""
+
+import base64
+import json
+from email.utils import formatdate, parsedate_to_datetime
+
+STREAM_CHUNK_BYTES = 64 * 1024
+# Containers nested deeper than this are encoded in one piece, e.g. a single segment or research chunk
+STREAM_SPLIT_DEPTH = 2
+
+
+def parse_paths(spec: str) -> dict:
+    """Parse comma-separated dotted paths into a tree of nested dicts.
+
+    A path ending at a key maps it to None, meaning the whole value. A path
+    through a list applies to every element of that list.
+    """
+    tree = {}
+    for path in (spec or "").split(","):
+        keys = [key for key in path.strip().split(".") if key]
+        node = tree
+        for i, key in enumerate(keys):
+            if key in node and node[key] is None:
+                break
+            if i == len(keys) - 1:
+                node[key] = None
+            else:
+                node = node.setdefault(key, {})
+    return tree
+
+
+def _include(value, tree: dict):
+    if isinstance(value, list):
+        return [_include(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {
+        key: value[key] if subtree is None else _include(value[key], subtree)
+        for key, subtree in tree.items()
+        if key in value
+    }
+
+
+def _exclude(value, tree: dict):
+    if isinstance(value, list):
+        return [_exclude(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {
+        key: item if key not in tree else _exclude(item, tree[key])
+        for key, item in value.items()
+        if key not in tree or tree[key] is not None
+    }
+
+
+def project(data: dict, fields: str = None, exclude: str = None) -> dict:
+    """Keep only the fields paths of data, then drop the exclude paths.
+
+    Args:
+        data: A story JSON dict.
+        fields: Comma-separated dotted paths to keep, e.g. "title,segments.title,segments.text".
+            Everything is kept when empty.
+        exclude: Comma-separated dotted paths to drop, e.g. "research,segments.images".
+    """
+    if fields:
+        data = _include(data, parse_paths(fields))
+    if exclude:
+        data = _exclude(data, parse_paths(exclude))
+    return data
+
+
+def iter_json(value, depth: int = STREAM_SPLIT_DEPTH):
+    """Yield the JSON encoding of value in pieces, splitting containers down to depth."""
+    if depth == 0 or not isinstance(value, (dict, list)) or not value:
+        yield json.dumps(value)
+        return
+    if isinstance(value, dict):
+        yield "{"
+        for i, (key, item) in enumerate(value.items()):
+            yield ("," if i else "") + json.dumps(str(key)) + ":"
+            yield from iter_json(item, depth - 1)
+        yield "}"
+    else:
+        yield "["
+        for i, item in enumerate(value):
+            if i:
+                yield ","
+            yield from iter_json(item, depth - 1)
+        yield "]"
+
+
+def stream_json(value, chunk_bytes: int = STREAM_CHUNK_BYTES):
+    """Yield the JSON encoding of value in chunks of about chunk_bytes, for a StreamingResponse."""
+    buffer, size = [], 0
+    for piece in iter_json(value):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_bytes:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def http_date(timestamp: float) -> str:
+    """Format a Unix timestamp for Last-Modified."""
+    return formatdate(timestamp, usegmt=True)
+
+
+def is_not_modified(headers, etags: list, last_modified: float = None) -> bool:
+    """Whether a conditional GET can be answered with 304 Not Modified.
+
+    If-None-Match is checked against etags (any of the representations of the resource)
+    and, when present, takes precedence over If-Modified-Since.
+
+    Args:
+        headers: The request headers.
+        etags: Quoted ETags the current resource may have been served with.
+        last_modified: Unix timestamp of the resource's last modification, if known.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses weak comparison, so W/ prefixes are ignored
+        requested = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return not requested.isdisjoint(etags)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have one-second resolution
+        return int(last_modified) <= since
+    return False
+
+
+def encode_cursor(entry: dict) -> str:
+    """Opaque listing cursor pointing just past a story listing entry."""
+    raw = json.dumps([entry["modified_at"], entry["filename"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """The (modified_at, filename) a cursor points past.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        modified_at, filename = json.loads(raw)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    # Anything else that unpacks into two values, e.g. a two-character string, is not a cursor
+    if isinstance(modified_at, bool) or not isinstance(modified_at, (int, float)) or not isinstance(filename, str):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return float(modified_at), filename
@@ -0,0 +1,174 @@
+"""Near-duplicate topic cache in front of story generation.
+
+Users ask for the same news topic in many phrasings ("fed rate cut", "Federal
+Reserve cuts rates"), and each request used to trigger a full agent run. Every
+generated story is recorded here under its topic. A new topic similar enough to
+a recorded one, whose story is younger than the staleness window, is answered
+with the existing story instead.
+
+Similarity is the Jaccard similarity of the topics' words, after expanding a
+short list of common abbreviations ("fed" to "federal reserve"). A topic may add
+words to another and still match, since it is only more specific, but topics
+that each have a word the other lacks ("rate cut" and "rate hike", "tariffs on
+China" and "tariffs on Canada") or that differ in a number ("2024 election" and
+"2020 election") are about different things and never match.
+
+Settings (environment variables):
+    STORYTIME_TOPIC_CACHE_MAX_AGE=21600     seconds a cached story stays fresh
+    STORYTIME_TOPIC_SIMILARITY=0.6          minimum word similarity for a hit
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+TOPIC_CACHE_DB_PATH = "src/backend/api/topic_cache.db"
+TOPIC_CACHE_MAX_AGE_SECONDS = int(os.getenv("STORYTIME_TOPIC_CACHE_MAX_AGE", str(6 * 60 * 60)))
+TOPIC_SIMILARITY_THRESHOLD = float(os.getenv("STORYTIME_TOPIC_SIMILARITY", "0.6"))
+
+STOPWORDS = frozenset("a an and the of in on for to about at by with from what whats is are was latest news story".split())
+
+# Abbreviations expanded before comparing topics. Only whole words listed here count as the
+# same as their expansion; "war" is not taken to abbreviate "warming"
+ALIASES = {
+    "fed": "federal reserve",
+    "eu": "european union",
+    "uk": "united kingdom",
+    "usa": "united states",
+    "un": "united nations",
+    "gop": "republican party",
+    "scotus": "supreme court",
+}
+
+
+def _normalize_word(word: str) -> str:
+    word = word.lower()
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    return word
+
+
+def topic_words(topic: str) -> set:
+    """The words of a topic, lowercased, crudely singularized and with abbreviations expanded,
+    without filler words."""
+    words = set()
+    for word in re.findall(r"[A-Za-z0-9]+", re.sub(r"['\u2019]s\b", "", topic)):
+        word = word.lower()
+        if word in STOPWORDS:
+            continue
+        words.update(_normalize_word(part) for part in ALIASES.get(word, word).split())
+    return words
+
+
+def normalize_topic(topic: str) -> str:
+    """Lowercase a topic, drop punctuation and filler words, expand abbreviations, crudely
+    singularize and sort its words."""
+    return " ".join(sorted(topic_words(topic)))
+
+
+def topic_similarity(topic: str, other: str) -> float:
+    """Similarity of two topics from 0 to 1, or 0 if each has a word the other lacks or they differ in a number."""
+    words, other_words = topic_words(topic), topic_words(other)
+    if not words or not other_words:
+        return 1.0 if words == other_words else 0.0
+    if {word for word in words if word.isdigit()} != {word for word in other_words if word.isdigit()}:
+        return 0.0
+    # Words on only one side just make that topic more specific; words on both sides
+    # with no counterpart in the other mean they are about different things
+    if words - other_words and other_words - words:
+        return 0.0
+    return len(words & other_words) / len(words | other_words)
+
+
+class TopicCache:
+    def __init__(self, db_path: str = TOPIC_CACHE_DB_PATH, max_age_seconds: int = TOPIC_CACHE_MAX_AGE_SECONDS,
+                 threshold: float = TOPIC_SIMILARITY_THRESHOLD):
+        """
+        Args:
+            db_path: SQLite file holding recorded topics.
+            max_age_seconds: Stories older than this are not reused.
+            threshold: Minimum topic_similarity for a cache hit.
+        """
+        self.db_path = db_path
+        self.max_age_seconds = max_age_seconds
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+    @contextmanager
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                # Records of the earlier MinHash matching, which also stored a signature per topic
+                conn.execute("DROP TABLE IF EXISTS topics")
+                conn.execute(
+                    """CREATE TABLE IF NOT EXISTS cached_topics (
+                        topic TEXT NOT NULL,
+                        normalized TEXT NOT NULL,
+                        story_filename TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        generation_seconds REAL NOT NULL
+                    )"""
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS cached_topics_created_at ON cached_topics (created_at)")
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, topic: str, story_exists=None) -> dict:
+        """Find a fresh story generated for the same or a near-duplicate topic.
+
+        Args:
+            topic: The requested topic.
+            story_exists: Optional callable taking a story filename, used to skip stories
+                that have since been deleted.
+
+        Returns:
+            The best matching record as a dict with its "similarity", or None on a miss.
+        """
+        normalized = normalize_topic(topic)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM cached_topics WHERE created_at >= ? ORDER BY created_at DESC",
+                (time.time() - self.max_age_seconds,),
+            ).fetchall()
+        best = None
+        for row in rows:
+            score = 1.0 if row["normalized"] == normalized else topic_similarity(topic, row["topic"])
+            if score < self.threshold or (best is not None and score <= best["similarity"]):
+                continue
+            if story_exists is not None and not story_exists(row["story_filename"]):
+                continue
+            best = {**dict(row), "similarity": score}
+        with self.lock:
+            if best is None:
+                self.counters["misses"] += 1
+            else:
+                self.counters["hits"] += 1
+                self.counters["saved_seconds"] += best["generation_seconds"]
+        return best
+
+    def record(self, topic: str, story_filename: str, generation_seconds: float):
+        """Record a freshly generated story under its topic, and drop records past the staleness window."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO cached_topics (topic, normalized, story_filename, created_at, generation_seconds)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (topic, normalize_topic(topic), story_filename, now, generation_seconds),
+            )
+            conn.execute("DELETE FROM cached_topics WHERE created_at < ?", (now - self.max_age_seconds,))
+
+    def stats(self) -> dict:
+        """Hit and miss counts, hit rate and agent time saved by hits in this process."""
+        with self.lock:
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {**counters, "lookups": lookups, "hit_rate": counters["hits"] / lookups if lookups else 0.0}
@@ -0,0 +1,203 @@
+"""Offline benchmarks for story generation, agent setup, storage, the API and its startup.
+
+Record a fixture once with real API keys:
+    python -m src.backend.benchmarks.benchmark record --fixture bench.json --topic "Apollo 11"
+then benchmark against it with no network:
+    python -m src.backend.benchmarks.benchmark run --fixture bench.json --topic "Apollo 11" --repeat 5
+
+Each benchmark runs inside a fresh temporary working directory, so the storage
+paths the backend uses (all relative to the working directory) never touch the
+real story store.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from ..agents.replay import activate_replay, deactivate_replay, REPLAY_MODE_RECORD, REPLAY_MODE_REPLAY
+
+
+def _summarize(name: str, timings: list) -> dict:
+    ordered = sorted(timings)
+    return {
+        "benchmark": name,
+        "runs": len(ordered),
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "min_ms": ordered[0] * 1000,
+    }
+
+
+def _reset_clients():
+    # The search service and image HTTP session are process-wide and pick up the
+    # replay session when first built, so drop them to start each run clean
+    from ..agents import search_service
+    from ..agents.newsAgent import image_generation
+    search_service._search_service = None
+    image_generation._session = None
+
+
+def _generate(topic: str):
+    from ..api.main import run_story_generation
+    return run_story_generation(topic)
+
+
+def record_fixture(fixture_path: str, topic: str):
+    """Generate one story against the real services and save every response to a fixture."""
+    fixture_path = os.path.abspath(fixture_path)
+    session = activate_replay(fixture_path, REPLAY_MODE_RECORD)
+    _reset_clients()
+    os.chdir(tempfile.mkdtemp(prefix="storytime-record-"))
+    try:
+        _generate(topic)
+    finally:
+        session.save()
+        deactivate_replay()
+    counts = {kind: len(entries) for kind, entries in session.entries.items()}
+    print(f"Recorded {counts} to {fixture_path}")
+
+
+def benchmark_generation(fixture_path: str, topic: str, repeat: int, latency: float) -> dict:
+    """Time end-to-end story generation replayed from a fixture."""
+    timings = []
+    for _ in range(repeat):
+        activate_replay(fixture_path, REPLAY_MODE_REPLAY, latency)
+        _reset_clients()
+        os.chdir(tempfile.mkdtemp(prefix="storytime-bench-"))
+        started = time.perf_counter()
+        _generate(topic)
+        timings.append(time.perf_counter() - started)
+    deactivate_replay()
+    return _summarize("generation_end_to_end", timings)
+
+
+def benchmark_startup(repeat: int) -> dict:
+    """Time importing the API in a fresh interpreter, against the API's startup budget."""
+    from ..api.main import STARTUP_BUDGET_SECONDS
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    script = "import time; started = time.perf_counter(); import src.backend.api.main; print(time.perf_counter() - started)"
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", script], cwd=tempfile.mkdtemp(prefix="storytime-startup-"),
+                                env={**os.environ, "PYTHONPATH": repo_root}, capture_output=True, text=True, check=True)
+        timings.append(float(output.stdout.strip().splitlines()[-1]))
+    return {**_summarize("api_cold_import", timings), "budget_ms": STARTUP_BUDGET_SECONDS * 1000}
+
+
+def benchmark_agent_setup(fixture_path: str, topic: str, repeat: int) -> list:
+    """Time compiling the news agent graph once, then setting up agents that reuse it."""
+    from ..agents import graph_cache
+    from ..agents.newsAgent.newsAgent import NewsAgent
+    from ..stories.story_structure import StoryStructure
+
+    activate_replay(fixture_path, REPLAY_MODE_REPLAY)
+    try:
+        started = time.perf_counter()
+        NewsAgent(StoryStructure(topic))
+        first = time.perf_counter() - started
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            NewsAgent(StoryStructure(topic))
+            timings.append(time.perf_counter() - started)
+    finally:
+        deactivate_replay()
+    return [
+        _summarize("agent_setup_first", [first]),
+        {**_summarize("agent_setup", timings), "budget_ms": graph_cache.AGENT_SETUP_BUDGET_SECONDS * 1000},
+    ]
+
+
+def benchmark_storage(topic: str, repeat: int) -> list:
+    """Time saving, loading and listing the story generated in the current working directory."""
+    from ..stories.story_structure import StoryStructure
+    from ..stories.storage import get_storage
+
+    story = StoryStructure(topic)
+    story.load_from_file()
+    timings = {"story_save": [], "story_load": [], "catalog_list": [], "catalog_refresh": []}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        story.save_to_file()
+        timings["story_save"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        StoryStructure(topic).load_from_file()
+        timings["story_load"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        get_storage().list_stories()
+        timings["catalog_list"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        get_storage().refresh_index()
+        timings["catalog_refresh"].append(time.perf_counter() - started)
+    return [_summarize(name, values) for name, values in timings.items()]
+
+
+def benchmark_api(topic: str, repeat: int) -> list:
+    """Time the read endpoints in-process, measuring API overhead without a network hop."""
+    from fastapi.testclient import TestClient
+    from ..api.main import app
+
+    client = TestClient(app)
+    filename = f"{topic}.json"
+    timings = {"api_list_stories": [], "api_get_story": []}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        client.get("/stories").raise_for_status()
+        timings["api_list_stories"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        client.get(f"/stories/{filename}").raise_for_status()
+        timings["api_get_story"].append(time.perf_counter() - started)
+    return [_summarize(name, values) for name, values in timings.items()]
+
+
+def run_benchmarks(fixture_path: str, topic: str, repeat: int = 5, latency: float = 0.0) -> list:
+    """Run the generation, storage and API benchmarks and return their summaries."""
+    fixture_path = os.path.abspath(fixture_path)
+    results = [benchmark_generation(fixture_path, topic, repeat, latency)]
+    # The storage and API benchmarks reuse the story left by the last generation run
+    results.extend(benchmark_storage(topic, repeat * 10))
+    results.extend(benchmark_api(topic, repeat * 10))
+    results.extend(benchmark_agent_setup(fixture_path, topic, repeat * 10))
+    results.append(benchmark_startup(repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record fixtures for and run StoryTime's offline benchmarks.")
+    parser.add_argument("command", choices=["record", "run"])
+    parser.add_argument("--fixture", required=True, help="Fixture file to record to or replay from")
+    parser.add_argument("--topic", required=True, help="Story topic; must match the recorded topic when replaying")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of generation runs")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of latency injected into each replayed call")
+    parser.add_argument("--json", dest="json_path", help="Optional file to write results to as JSON")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record_fixture(args.fixture, args.topic)
+        return
+
+    fixture_path = os.path.abspath(args.fixture)
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    results = run_benchmarks(fixture_path, args.topic, args.repeat, args.latency)
+    print(f"{'benchmark':<24}{'runs':>6}{'median ms':>12}{'p95 ms':>12}{'min ms':>12}{'budget ms':>12}")
+    for result in results:
+        budget = f"{result['budget_ms']:>12.2f}" if "budget_ms" in result else ""
+        over = "  OVER BUDGET" if "budget_ms" in result and result["median_ms"] > result["budget_ms"] else ""
+        print(f"{result['benchmark']:<24}{result['runs']:>6}{result['median_ms']:>12.2f}{result['p95_ms']:>12.2f}{result['min_ms']:>12.2f}{budget}{over}")
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
-import json
-import os
+from ..stories.storage import get_storage
 
 REPORT_STORAGE_DIR = "backend/evaluations/json_storage"
 class EvaluationReport:
@@ -18,10 +17,8 @@ class EvaluationReport:
         if citations_report is not None:
             self.report["citations_report"]["Report"] = citations_report
     def save_report(self, report_name: str):
-        report_path = os.path.join(REPORT_STORAGE_DIR, report_name + ".json")
-        os.makedirs(REPORT_STORAGE_DIR, exist_ok=True)
-        with open(report_path, 'w') as f:
-            json.dump(self.report, f)
+        """Save the report to the configured storage, linked to the story it evaluates."""
+        get_storage().save_report(report_name, self.report, story_name=getattr(self.story, "name", None))
     def to_json(self):
         """Return the evaluation report as a JSON-serializable dict."""
         return self.report
\ No newline at end of file
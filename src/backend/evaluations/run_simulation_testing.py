@@ -1,29 +1,187 @@
 from ..agents.newsAgent.newsAgent import NewsAgent
 from ..stories.story_structure import StoryStructure
 from ..agents.testerAgent.testerAgent import TesterAgent
+from ..agents.instrumentation import tracing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import hashlib
+import json
+import os
+import threading
 import time
 
+story_generator_prompt = "Randomly select a news or historical topic that is real and for which there are valid sources and write a story about it. No need to generate images for these stories."
+
+def simulate_topic(i: int, structured_evaluation: bool = False, run_id: str = None) -> dict:
+    """Generate, test and delete one simulation story. Returns the evaluation report.
+
+    Args:
+        i: Topic index, used in the story's name.
+        structured_evaluation: Verify claims with TesterAgent.evaluate_story instead of the agent loop.
+        run_id: Identifies the batch the topic belongs to. With it, the story and its news agent run
+            are saved durably under the batch and topic, and a topic interrupted before it finished
+            continues its generation from the last checkpoint.
+    """
+    if run_id is None:
+        story_location = f"simulation_story_{i}_{int(time.time())}"
+        story = StoryStructure(story_location)
+        thread_id = None
+    else:
+        story_location = f"simulation_story_{run_id}_{i}"
+        story = StoryStructure(story_location, journaled=True)
+        thread_id = f"simulation-{run_id}-{i}"
+
+    news_agent = None
+    finished = False
+    try:
+        with tracing(story_location):
+            news_agent = NewsAgent(story, thread_id=thread_id)
+
+            if thread_id is not None and news_agent.has_checkpoint():
+                story.load_from_file()
+                news_agent.invoke(None)
+            else:
+                news_agent.invoke({
+                    "messages": [{
+                        "role": "user",
+                        "content": story_generator_prompt
+                    }]
+                })
+
+            tester = TesterAgent(story)
+            if structured_evaluation:
+                tester.evaluate_story()
+            else:
+                tester.test_story()
+                tester.discard()
+        finished = True
+    finally:
+        # A failed topic of a batch keeps its story and checkpoint, which are what it resumes from;
+        # anything else is never resumed, so it is cleaned up however it ended
+        if finished or run_id is None:
+            if news_agent is not None:
+                news_agent.discard()
+            story.delete()
+    return tester.evaluation_report.to_json()
+
 def run_simulation_testing(n_topics: int = 10):
-    story_generator_prompt = "Randomly select a news or historical topic that is real and for which there are valid sources and write a story about it. No need to generate images for these stories."
     evaluation_reports = []
-    
+
     for i in range(n_topics):
-        story_location = f"simulation_story_{i}_{int(time.time())}"
-        story = StoryStructure(story_location)
-        
-        news_agent = NewsAgent(story)
-        
-        response = news_agent.invoke({
-            "messages": [{
-                "role": "user", 
-                "content": story_generator_prompt
-            }]
-        })
-        
-        tester = TesterAgent(story)
-        tester.test_story()
-        
-        evaluation_reports.append(tester.evaluation_report.to_json())
-        story.delete()
-    
+        evaluation_reports.append(simulate_topic(i))
+
     return evaluation_reports
+
+class RateLimiter:
+    """Spaces out agent runs across all workers to at most `per_minute` starts per minute."""
+    def __init__(self, per_minute: float = None):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self.next_start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+def load_completed_topics(results_path: str) -> set:
+    """Read topic indices that already have a successful result in a JSONL results file."""
+    completed = set()
+    if not os.path.exists(results_path):
+        return completed
+    with open(results_path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash mid-write can leave a truncated last line; that topic is simply re-run
+                continue
+            if record.get("error") is None:
+                completed.add(record["index"])
+    return completed
+
+def run_simulation_batch(n_topics: int, results_path: str, concurrency: int = 4,
+                         rate_per_minute: float = None, on_result=None, structured_evaluation: bool = False) -> list:
+    """Run simulation topics in parallel, appending each result to a JSONL file as it finishes.
+
+    Topics that already have a successful record in results_path are skipped, so an
+    interrupted run picks up where it left off, and topics that were still generating
+    continue from their news agent's last checkpoint. Failed topics are recorded with
+    their error and retried on the next run.
+
+    Args:
+        n_topics: Total number of topics in the batch.
+        results_path: JSONL file results are appended to and resumed from.
+        concurrency: Number of topics generated and tested at once.
+        rate_per_minute: Optional cap on topic starts per minute, shared by all workers.
+        on_result: Optional callback called with (record, finished, remaining) after each topic.
+        structured_evaluation: Verify claims with TesterAgent.evaluate_story instead of the agent loop.
+
+    Returns:
+        The records produced by this run.
+    """
+    completed = load_completed_topics(results_path)
+    # Stable across runs resuming the same results file, so topics find their checkpoints again
+    run_id = hashlib.sha256(os.path.abspath(results_path).encode()).hexdigest()[:12]
+    pending = [i for i in range(n_topics) if i not in completed]
+    rate_limiter = RateLimiter(rate_per_minute)
+    write_lock = threading.Lock()
+    records = []
+
+    def run_topic(i):
+        rate_limiter.wait()
+        started = time.time()
+        record = {"index": i, "report": None, "error": None}
+        try:
+            record["report"] = simulate_topic(i, structured_evaluation, run_id)
+        except Exception as e:
+            record["error"] = str(e)
+        record["duration_seconds"] = time.time() - started
+        return record
+
+    if os.path.dirname(results_path):
+        os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_topic, i) for i in pending]
+        for finished, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            with write_lock:
+                with open(results_path, 'a') as f:
+                    f.write(json.dumps(record) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            records.append(record)
+            if on_result is not None:
+                on_result(record, finished, len(pending) - finished)
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description="Run StoryTime simulation testing in parallel, resuming from a results file.")
+    parser.add_argument("--topics", type=int, default=10, help="Total number of simulation topics")
+    parser.add_argument("--results", default="simulation_results.jsonl", help="JSONL file to append results to and resume from")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of topics run at once")
+    parser.add_argument("--rate", type=float, default=None, help="Maximum topic starts per minute across all workers")
+    parser.add_argument("--structured-evaluation", action="store_true", help="Verify claims in parallel batches instead of with the tester agent loop")
+    args = parser.parse_args()
+
+    started = time.time()
+
+    def report_progress(record, finished, remaining):
+        elapsed = time.time() - started
+        per_minute = finished / elapsed * 60
+        eta = remaining * elapsed / finished
+        status = "failed: " + record["error"] if record["error"] else "done"
+        print(f"[{finished}/{finished + remaining}] topic {record['index']} {status} in {record['duration_seconds']:.0f}s"
+              f" | {per_minute:.2f} topics/min | ETA {eta / 60:.1f} min", flush=True)
+
+    records = run_simulation_batch(args.topics, args.results, args.concurrency, args.rate, on_result=report_progress,
+                                   structured_evaluation=args.structured_evaluation)
+    failures = sum(1 for record in records if record["error"])
+    print(f"Finished {len(records)} topics ({failures} failed) in {(time.time() - started) / 60:.1f} min. Results in {args.results}")
+
+if __name__ == "__main__":
+    main()
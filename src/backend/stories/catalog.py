@@ -0,0 +1,135 @@
+"""Catalog index of saved stories.
+
+Listing stories used to mean opening and parsing every JSON file in the story
+storage directory. The catalog keeps one small row per story file (title,
+mtime, size, thumbnail) in an SQLite table keyed by filename, so listings only
+read the index and only changed files ever get re-parsed. The thumbnail column
+holds the story's cover image reference; listings return its precomputed
+thumbnails (see thumbnails.py).
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from . import image_store, thumbnails
+
+CATALOG_DB_PATH = "src/backend/stories/catalog.db"
+
+
+@contextmanager
+def _connect():
+    """Open the catalog database, committing on success and always closing."""
+    os.makedirs(os.path.dirname(CATALOG_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(CATALOG_DB_PATH)
+    try:
+        with conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS stories (
+                    filename TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    modified_at REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    thumbnail TEXT
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS stories_modified_at ON stories (modified_at)")
+            yield conn
+    finally:
+        conn.close()
+
+
+def summarize_story(data: dict) -> dict:
+    """Extract the fields the catalog keeps from a story JSON dict, creating its cover thumbnails."""
+    segments = data.get("segments") or []
+    thumbnail = None
+    if segments:
+        images = segments[0].get("images") or [None]
+        thumbnail = images[0]
+    if isinstance(thumbnail, str):
+        # Never index an inline image; the listing would carry all of it
+        thumbnail = image_store.store_data_uri(thumbnail)
+        thumbnails.create_thumbnails(thumbnail)
+    return {"title": data.get("title", "Untitled"), "thumbnail": thumbnail}
+
+
+def record_story(path: str, data: dict):
+    """Insert or update the catalog row for a story file that was just written."""
+    stat = os.stat(path)
+    summary = summarize_story(data)
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO stories (filename, title, modified_at, size, thumbnail) VALUES (?, ?, ?, ?, ?)",
+            (os.path.basename(path), summary["title"], stat.st_mtime, stat.st_size, summary["thumbnail"]),
+        )
+
+
+def remove_story(path: str):
+    """Drop the catalog row for a deleted story file."""
+    with _connect() as conn:
+        conn.execute("DELETE FROM stories WHERE filename = ?", (os.path.basename(path),))
+
+
+def refresh_catalog(storage_dir: str) -> int:
+    """Bring the catalog in line with the files in storage_dir.
+
+    Only files whose mtime or size differ from the indexed row are parsed again,
+    and rows for files that no longer exist are removed.
+
+    Returns:
+        The number of rows that were added, updated or removed.
+    """
+    on_disk = {}
+    if os.path.exists(storage_dir):
+        for entry in os.scandir(storage_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                on_disk[entry.name] = entry.stat()
+
+    changed = 0
+    with _connect() as conn:
+        indexed = {
+            filename: (modified_at, size)
+            for filename, modified_at, size in conn.execute("SELECT filename, modified_at, size FROM stories")
+        }
+        for filename in indexed.keys() - on_disk.keys():
+            conn.execute("DELETE FROM stories WHERE filename = ?", (filename,))
+            changed += 1
+        for filename, stat in on_disk.items():
+            if indexed.get(filename) == (stat.st_mtime, stat.st_size):
+                continue
+            try:
+                with open(os.path.join(storage_dir, filename), 'r') as f:
+                    summary = summarize_story(json.load(f))
+            except (OSError, ValueError):
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO stories (filename, title, modified_at, size, thumbnail) VALUES (?, ?, ?, ?, ?)",
+                (filename, summary["title"], stat.st_mtime, stat.st_size, summary["thumbnail"]),
+            )
+            changed += 1
+    return changed
+
+
+def list_catalog(limit: int = None, after: tuple = None) -> list:
+    """Return catalog entries with their thumbnails, most recently modified first.
+
+    Args:
+        limit: Maximum number of entries to return. All when None.
+        after: (modified_at, filename) of the last entry of the previous page, to resume after it.
+    """
+    query = "SELECT filename, title, modified_at, thumbnail FROM stories"
+    params = []
+    if after is not None:
+        query += " WHERE (modified_at, filename) < (?, ?)"
+        params += list(after)
+    query += " ORDER BY modified_at DESC, filename DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    with _connect() as conn:
+        rows = conn.execute(query, params).fetchall()
+    return [
+        {"filename": filename, "title": title, "modified_at": modified_at, **thumbnails.listing_thumbnail(thumbnail)}
+        for filename, title, modified_at, thumbnail in rows
+    ]
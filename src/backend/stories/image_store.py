@@ -0,0 +1,167 @@
+"""Content-addressed blob store for story images.
+
+Generated images used to be inlined into story JSON as base64 data URIs, which
+made every story file megabytes and every save and read pay for all of them.
+Images are now written once under their SHA-256 hash and stories reference
+them by URL (IMAGE_URL_PREFIX + image ID), served by the API's /images route.
+
+Run this module to migrate stories that still contain inline images:
+    python -m src.backend.stories.image_store
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+IMAGE_STORAGE_DIR = "src/backend/stories/image_storage"
+IMAGE_URL_PREFIX = "/images/"
+
+_IMAGE_ID_PATTERN = re.compile(r"^[0-9a-f]{64}\.(png|jpg|webp|gif)$")
+_MEDIA_TYPES = {"png": "image/png", "jpg": "image/jpeg", "webp": "image/webp", "gif": "image/gif"}
+
+
+def _sniff_extension(data: bytes) -> str:
+    """Guess the image file extension from its magic bytes, defaulting to png."""
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return "png"
+
+
+def is_valid_image_id(image_id: str) -> bool:
+    """Check that an image ID has the <sha256>.<ext> form, so it can't escape the store."""
+    return bool(_IMAGE_ID_PATTERN.match(image_id))
+
+
+def image_path(image_id: str) -> str:
+    """Return the on-disk path for an image ID."""
+    if not is_valid_image_id(image_id):
+        raise ValueError(f"Invalid image id '{image_id}'")
+    return os.path.join(IMAGE_STORAGE_DIR, image_id[:2], image_id)
+
+
+def image_media_type(image_id: str) -> str:
+    """Return the media type for an image ID based on its extension."""
+    return _MEDIA_TYPES[image_id.rsplit(".", 1)[-1]]
+
+
+def image_url(image_id: str) -> str:
+    """Return the reference stored in a story for an image ID."""
+    return IMAGE_URL_PREFIX + image_id
+
+
+def save_image(data: bytes) -> str:
+    """Write image bytes to the store, if not already present, and return the image ID."""
+    image_id = f"{hashlib.sha256(data).hexdigest()}.{_sniff_extension(data)}"
+    path = image_path(image_id)
+    if os.path.exists(path):
+        return image_id
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temp file first so a crash never leaves a truncated blob under its final hash
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return image_id
+
+
+def store_data_uri(image: str) -> str:
+    """Move an inline base64 data URI into the store and return its URL.
+
+    Anything that is not a base64 data URI (regular URLs, existing references)
+    is returned unchanged.
+    """
+    if not image.startswith("data:") or ";base64," not in image:
+        return image
+    try:
+        data = base64.b64decode(image.split(";base64,", 1)[1], validate=True)
+    except (binascii.Error, ValueError):
+        return image
+    return image_url(save_image(data))
+
+
+def _store_inline_images(data: dict) -> bool:
+    """Replace a story's inline images with store references in place. Returns whether any changed."""
+    changed = False
+    for segment in data.get("segments", []):
+        images = segment.get("images", [])
+        rewritten = [store_data_uri(image) if isinstance(image, str) else image for image in images]
+        if rewritten != images:
+            segment["images"] = rewritten
+            changed = True
+    return changed
+
+
+def migrate_story_images(storage_dir: str) -> int:
+    """Rewrite story files in storage_dir so inline images become store references.
+
+    Only JSON story files are migrated; stories kept by another backend are migrated
+    with migrate_storage_images.
+
+    Returns:
+        The number of story files that were rewritten.
+    """
+    from . import catalog
+
+    migrated = 0
+    if not os.path.exists(storage_dir):
+        return migrated
+    for filename in sorted(os.listdir(storage_dir)):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(storage_dir, filename)
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if not _store_inline_images(data):
+            continue
+        fd, tmp_path = tempfile.mkstemp(dir=storage_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        catalog.record_story(path, data)
+        migrated += 1
+    return migrated
+
+
+def migrate_storage_images(storage) -> int:
+    """Rewrite the stories of a StoryStorage so inline images become store references,
+    saving them through the storage (e.g. the SQLite backend).
+
+    Returns:
+        The number of stories that were rewritten.
+    """
+    migrated = 0
+    for story in storage.list_stories():
+        name = os.path.splitext(story["filename"])[0]
+        data = storage.load_story(name)
+        if data is not None and _store_inline_images(data):
+            storage.save_story(name, data)
+            migrated += 1
+    return migrated
+
+
+if __name__ == "__main__":
+    from .storage import STORAGE_BACKEND, get_storage
+    from .story_structure import story_storage_dir
+
+    count = migrate_story_images(story_storage_dir)
+    if STORAGE_BACKEND != "json":
+        count += migrate_storage_images(get_storage())
+    print(f"Migrated inline images in {count} stories")
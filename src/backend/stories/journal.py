@@ -0,0 +1,128 @@
+"""Append-only operation journal for journaled StoryStructure persistence.
+
+In journaled mode every story mutation appends one small JSON line to
+<story>.json.journal instead of re-serializing the whole story. The story's
+JSON snapshot is rebuilt from the journal (compaction) once enough operations
+have accumulated and when the story is finalized. Journal records carry
+sequence numbers and the snapshot stores the last one it includes, so a crash
+between writing a snapshot and truncating the journal never applies an
+operation twice.
+
+Settings (environment variables):
+    STORYTIME_STORY_JOURNAL=1             enable journaled mode for new StoryStructures
+    STORYTIME_JOURNAL_FSYNC=always|interval|never
+    STORYTIME_JOURNAL_COMPACT_OPS=200     operations between automatic compactions
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+JOURNAL_ENABLED = os.getenv("STORYTIME_STORY_JOURNAL", "0").lower() in ("1", "true", "yes")
+JOURNAL_FSYNC_POLICY = os.getenv("STORYTIME_JOURNAL_FSYNC", "interval")
+JOURNAL_COMPACT_OPS = int(os.getenv("STORYTIME_JOURNAL_COMPACT_OPS", "200"))
+# With the "interval" policy, journal writes are fsynced at most this often
+JOURNAL_FSYNC_INTERVAL_SECONDS = 1.0
+
+# Key the snapshot uses to record the last journal sequence number it contains
+SNAPSHOT_SEQ_KEY = "_journal_seq"
+
+
+def journal_path(story_path: str) -> str:
+    return story_path + ".journal"
+
+
+def read_journal(path: str, after_seq: int = 0) -> list:
+    """Return journal records with a sequence number above after_seq, in order.
+
+    A truncated final line (from a crash mid-append) is ignored.
+    """
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if record["seq"] > after_seq:
+                records.append(record)
+    return records
+
+
+class StoryJournal:
+    def __init__(self, path: str, fsync_policy: str = JOURNAL_FSYNC_POLICY, compact_ops: int = JOURNAL_COMPACT_OPS):
+        """
+        Args:
+            path: Journal file path.
+            fsync_policy: "always" to fsync every operation, "interval" to fsync at most
+                once per JOURNAL_FSYNC_INTERVAL_SECONDS, "never" to leave it to the OS.
+            compact_ops: Number of journaled operations after which should_compact is true.
+        """
+        if fsync_policy not in ("always", "interval", "never"):
+            raise ValueError(f"Unknown journal fsync policy '{fsync_policy}'")
+        self.path = path
+        self.fsync_policy = fsync_policy
+        self.compact_ops = compact_ops
+        self.seq = 0
+        self.pending_ops = 0
+        self.last_fsync = 0.0
+        self.lock = threading.Lock()
+
+    def append(self, op: str, args: list, kwargs: dict):
+        """Append one operation record."""
+        with self.lock:
+            self.seq += 1
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({"seq": self.seq, "op": op, "args": args, "kwargs": kwargs}) + "\n")
+                f.flush()
+                now = time.monotonic()
+                if self.fsync_policy == "always" or (
+                        self.fsync_policy == "interval" and now - self.last_fsync >= JOURNAL_FSYNC_INTERVAL_SECONDS):
+                    os.fsync(f.fileno())
+                    self.last_fsync = now
+            self.pending_ops += 1
+
+    def sync(self):
+        """Force journaled operations to disk regardless of the fsync policy."""
+        with self.lock:
+            if os.path.exists(self.path):
+                with open(self.path, 'a') as f:
+                    os.fsync(f.fileno())
+                self.last_fsync = time.monotonic()
+
+    def should_compact(self) -> bool:
+        return self.pending_ops >= self.compact_ops
+
+    def reset(self):
+        """Empty the journal after its operations were written into a snapshot."""
+        with self.lock:
+            if os.path.exists(self.path):
+                with open(self.path, 'w') as f:
+                    os.fsync(f.fileno())
+            self.pending_ops = 0
+
+
+def write_snapshot(path: str, data: dict):
+    """Atomically replace the story snapshot at path, durably."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Persist the rename itself before the journal gets truncated
+    dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
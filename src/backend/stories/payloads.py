@@ -0,0 +1,143 @@
+"""Precompressed HTTP payloads of saved stories.
+
+When a story is finalized, its JSON body is encoded once and written here
+alongside gzip and (when the brotli package is installed) brotli variants, with
+a small metadata file holding the body's content hash, save time and the
+version of the stored story it was encoded from. Plain story reads are then
+served straight from these files, choosing the variant by Accept-Encoding, with
+no per-request JSON parsing or compression.
+
+Drafts saved while a story is written get no payloads, and stories can change
+without going through StoryStructure (image migration, imports, edited files),
+so readers compare the recorded version with StoryStorage.story_version and
+encode the payloads on that read when they differ (see is_current).
+
+    payloads/<name>.json        the body
+    payloads/<name>.json.gz     gzip variant
+    payloads/<name>.json.br     brotli variant
+    payloads/<name>.meta.json   {"etag", "modified_at", "encodings", "source_version"}
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Optional
+
+PAYLOAD_DIR = "src/backend/stories/payloads"
+GZIP_LEVEL = 9
+# Quality 11 is several times slower for a few percent, and drafts are encoded on the read path
+BROTLI_QUALITY = 9
+
+_SUFFIXES = {None: ".json", "gzip": ".json.gz", "br": ".json.br"}
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def payload_path(name: str, encoding: str = None) -> str:
+    """Path of a story's payload, uncompressed or in a content encoding ("gzip" or "br")."""
+    return os.path.join(PAYLOAD_DIR, name + _SUFFIXES[encoding])
+
+
+def _meta_path(name: str) -> str:
+    return os.path.join(PAYLOAD_DIR, name + ".meta.json")
+
+
+def _write_atomic(path: str, payload: bytes):
+    # A temp file per writer, so concurrent writers of the same story never publish each other's partial files
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_payloads(name: str, data: dict, source_version: str = None) -> dict:
+    """Encode a story's response body, write it with its compressed variants, and return its metadata.
+
+    Args:
+        name: The story's name.
+        data: The story as returned by the API.
+        source_version: StoryStorage.story_version of the stored story data was read from or saved as.
+    """
+    os.makedirs(PAYLOAD_DIR, exist_ok=True)
+    body = json.dumps(data, separators=(",", ":")).encode()
+    variants = {None: body, "gzip": gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+    brotli = _brotli()
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+    for encoding, payload in variants.items():
+        _write_atomic(payload_path(name, encoding), payload)
+    stale = [encoding for encoding in _SUFFIXES if encoding not in variants]
+    for encoding in stale:
+        if os.path.exists(payload_path(name, encoding)):
+            os.remove(payload_path(name, encoding))
+    meta = {
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+        "modified_at": time.time(),
+        "encodings": [encoding for encoding in variants if encoding is not None],
+        "source_version": source_version,
+    }
+    # Written last, so a reader never sees metadata for payloads that don't exist yet
+    _write_atomic(_meta_path(name), json.dumps(meta).encode())
+    return meta
+
+
+def load_meta(name: str) -> Optional[dict]:
+    """Return the metadata of a story's payloads, or None if they were never written."""
+    try:
+        with open(_meta_path(name), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(meta: Optional[dict], source_version: Optional[str]) -> bool:
+    """Whether payload metadata was written from the given version of the stored story."""
+    return meta is not None and source_version is not None and meta.get("source_version") == source_version
+
+
+def remove_payloads(name: str):
+    """Delete a story's payloads."""
+    for path in [_meta_path(name)] + [payload_path(name, encoding) for encoding in _SUFFIXES]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def choose_encoding(accept_encoding: str, available: list) -> Optional[str]:
+    """Pick the content encoding to serve from an Accept-Encoding header.
+
+    Returns:
+        "br" or "gzip" if the client accepts it and a variant exists (brotli preferred),
+        or None for the uncompressed body.
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
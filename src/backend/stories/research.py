@@ -0,0 +1,152 @@
+"""Structured research notes for a story.
+
+Research used to be one string that every search result and note was
+concatenated onto, so the same URLs and snippets piled up and the whole blob
+was copied on every append and every save. A ResearchStore keeps research as a
+list of chunks instead, one per search result or note:
+
+    {"kind": "search" | "note", "query", "title", "url", "snippet", "timestamp"}
+
+Chunks whose URL or snippet content is already in the store are dropped, and
+appends only touch the new chunks. The legacy research_document string is
+rendered from the chunks on demand, and a BM25 index over the chunks answers
+"which research is relevant to this claim" without reading all of it.
+"""
+
+import hashlib
+import re
+import time
+
+from .research_index import ResearchIndex
+
+SEARCH_CHUNK = "search"
+NOTE_CHUNK = "note"
+
+
+def search_chunks(query: str, results: list, timestamp: float = None) -> list:
+    """Build chunks for the results of one search.
+
+    Args:
+        query: The search query.
+        results: Search results as returned by SearchService.search.
+        timestamp: When the search ran. Defaults to now.
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    return [{
+        "kind": SEARCH_CHUNK,
+        "query": query,
+        "title": result.get("title", ""),
+        "url": result.get("url", ""),
+        "snippet": result.get("snippet", ""),
+        "timestamp": timestamp,
+    } for result in results]
+
+
+def note_chunk(text: str, timestamp: float = None) -> dict:
+    """Build a chunk for a free-form research note."""
+    return {
+        "kind": NOTE_CHUNK,
+        "query": "",
+        "title": "",
+        "url": "",
+        "snippet": text,
+        "timestamp": time.time() if timestamp is None else timestamp,
+    }
+
+
+def content_hash(chunk: dict) -> str:
+    """Hash a chunk's snippet, ignoring case and whitespace differences."""
+    return hashlib.sha256(re.sub(r"\s+", " ", chunk["snippet"]).strip().lower().encode()).hexdigest()
+
+
+def _entries(chunks: list):
+    """Yield the legacy document entry for each search or note, in order.
+
+    Results of one search share their query and timestamp and render as one entry.
+    """
+    group = []
+    for chunk in chunks:
+        if group and (chunk["kind"] != SEARCH_CHUNK or
+                      (chunk["query"], chunk["timestamp"]) != (group[0]["query"], group[0]["timestamp"])):
+            yield _render_search(group)
+            group = []
+        if chunk["kind"] == SEARCH_CHUNK:
+            group.append(chunk)
+        else:
+            yield chunk["snippet"]
+    if group:
+        yield _render_search(group)
+
+
+def _render_search(group: list) -> str:
+    results = "\n\n".join(
+        f"Title: {chunk['title']}\nURL: {chunk['url']}\nSnippet: {chunk['snippet']}" for chunk in group
+    )
+    return f"\n\n--- Search Query: {group[0]['query']} ---\n{results}"
+
+
+def render_document(chunks: list) -> str:
+    """Render research chunks as the legacy research_document string."""
+    return "\n".join(_entries(chunks))
+
+
+def format_passages(passages: list) -> str:
+    """Format research chunks, such as those returned by ResearchStore.search, for an agent."""
+    lines = []
+    for rank, passage in enumerate(passages, start=1):
+        source = f"{passage['title']} ({passage['url']})" if passage["url"] else "Research note"
+        score = f" [score {passage['score']:.2f}]" if "score" in passage else ""
+        lines.append(f"{rank}. {source}{score}\n{passage['snippet']}")
+    return "\n\n".join(lines)
+
+
+class ResearchStore:
+    def __init__(self, chunks: list = None):
+        self.chunks = []
+        self._urls = set()
+        self._hashes = set()
+        self._document = None
+        self.index = ResearchIndex()
+        self.add(chunks or [])
+
+    def add(self, chunks: list) -> list:
+        """Append chunks not already in the store and return the ones added."""
+        added = []
+        for chunk in chunks:
+            url = chunk["url"]
+            digest = content_hash(chunk) if chunk["snippet"].strip() else None
+            if (url and url in self._urls) or (digest and digest in self._hashes):
+                continue
+            if url:
+                self._urls.add(url)
+            if digest:
+                self._hashes.add(digest)
+            self.chunks.append(chunk)
+            self.index.add(f"{chunk['title']}\n{chunk['snippet']}")
+            added.append(chunk)
+        if added:
+            self._document = None
+        return added
+
+    def clear(self):
+        self.chunks = []
+        self._urls = set()
+        self._hashes = set()
+        self._document = None
+        self.index.clear()
+
+    def search(self, query: str, k: int = 5) -> list:
+        """Return the k chunks most relevant to query, best first, each with its BM25 "score"."""
+        return [{**self.chunks[doc_id], "score": score} for doc_id, score in self.index.search(query, k)]
+
+    def render(self) -> str:
+        """The legacy research_document string, rendered once per change."""
+        if self._document is None:
+            self._document = render_document(self.chunks)
+        return self._document
+
+    def to_json(self) -> list:
+        return list(self.chunks)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
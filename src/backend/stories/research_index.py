@@ -0,0 +1,66 @@
+"""In-process BM25 index over a story's research chunks.
+
+Agents used to get a story's entire research pasted into their context to find
+the few passages relevant to a claim or segment. The index lets them ask for
+the top-k passages instead. It is an inverted index (term -> postings) kept up
+to date as chunks are added, so indexing a chunk only costs its own terms and a
+query only visits the postings of its terms.
+"""
+
+import math
+import re
+from collections import Counter
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his in is it its of on or that the their there "
+    "they this to was were which who will with".split()
+)
+
+
+def tokenize(text: str) -> list:
+    """Lowercase text and split it into index terms, dropping stopwords."""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class ResearchIndex:
+    def __init__(self):
+        self.postings = {}
+        self.doc_lengths = []
+        self.total_length = 0
+
+    def add(self, text: str) -> int:
+        """Index a document and return its ID, which is its position in insertion order."""
+        doc_id = len(self.doc_lengths)
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+        length = sum(terms.values())
+        self.doc_lengths.append(length)
+        self.total_length += length
+        return doc_id
+
+    def clear(self):
+        self.postings = {}
+        self.doc_lengths = []
+        self.total_length = 0
+
+    def search(self, query: str, k: int = 5) -> list:
+        """Return up to k (doc_id, score) pairs for the documents best matching query, best first."""
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            return []
+        average_length = self.total_length / n_docs or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
@@ -0,0 +1,170 @@
+"""Full-text search index over stories.
+
+An SQLite FTS5 table holds each story's title, segment titles and segment text,
+and is updated whenever a story is saved or deleted through the storage, so
+searching never opens story files. With the SQLite storage backend the index
+lives in the story database and is updated in the same transaction as the
+story; with the JSON file backend it has its own database.
+"""
+
+import html
+import json
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+
+SEARCH_INDEX_DB_PATH = "src/backend/stories/search_index.db"
+
+# Relative weight of matches in the title, segment titles and segment text
+BM25_WEIGHTS = (10.0, 4.0, 1.0)
+SNIPPET_TOKENS = 16
+# FTS5 marks matches with these private-use characters, which become <mark> tags only
+# after the snippet is HTML-escaped, so story text can never inject markup
+_MATCH_START, _MATCH_END = "\ue000", "\ue001"
+MAX_RESULTS_PER_PAGE = 100
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS search_docs (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        modified_at REAL NOT NULL
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS story_search USING fts5 (
+        title, segment_titles, body, tokenize = 'porter unicode61'
+    )""",
+)
+
+
+def ensure_schema(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+@contextmanager
+def connect(db_path: str = None):
+    """Open the standalone index database used with the JSON file storage, committing on
+    success and always closing. The SQLite storage keeps the index in its own database."""
+    db_path = db_path or SEARCH_INDEX_DB_PATH
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            ensure_schema(conn)
+            yield conn
+    finally:
+        conn.close()
+
+
+def index_story(conn, name: str, data: dict, modified_at: float):
+    """Add or replace a story's entry in the index."""
+    segments = data.get("segments") or []
+    conn.execute(
+        """INSERT INTO search_docs (name, modified_at) VALUES (?, ?)
+           ON CONFLICT (name) DO UPDATE SET modified_at = excluded.modified_at""",
+        (name, modified_at),
+    )
+    doc_id = conn.execute("SELECT id FROM search_docs WHERE name = ?", (name,)).fetchone()[0]
+    conn.execute("DELETE FROM story_search WHERE rowid = ?", (doc_id,))
+    conn.execute(
+        "INSERT INTO story_search (rowid, title, segment_titles, body) VALUES (?, ?, ?, ?)",
+        (
+            doc_id,
+            data.get("title", ""),
+            "\n".join(segment.get("title", "") for segment in segments),
+            "\n\n".join(segment.get("text", "") for segment in segments),
+        ),
+    )
+
+
+def remove_story(conn, name: str):
+    """Drop a story from the index."""
+    row = conn.execute("SELECT id FROM search_docs WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return
+    conn.execute("DELETE FROM story_search WHERE rowid = ?", (row[0],))
+    conn.execute("DELETE FROM search_docs WHERE id = ?", (row[0],))
+
+
+def indexed_versions(conn) -> dict:
+    """Map of indexed story names to the modified_at they were indexed at."""
+    return dict(conn.execute("SELECT name, modified_at FROM search_docs").fetchall())
+
+
+def match_expression(query: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in the query are never interpreted.
+    """
+    words = re.findall(r"\w+", query.lower())
+    if not words:
+        return ""
+    return " ".join(f'"{word}"' for word in words[:-1]) + (" " if len(words) > 1 else "") + f'"{words[-1]}"*'
+
+
+def _snippet_html(snippet: str) -> str:
+    escaped = html.escape(snippet)
+    return escaped.replace(_MATCH_START, "<mark>").replace(_MATCH_END, "</mark>")
+
+
+def search(conn, query: str, limit: int = 20, offset: int = 0) -> dict:
+    """Rank stories matching query.
+
+    Returns:
+        {"query", "total", "limit", "offset", "results"}, each result with the story's
+        "filename", "title", BM25 "score" (higher is better) and a "snippet" around the match.
+        The snippet is HTML: story text is escaped and matched terms are wrapped in <mark>.
+    """
+    limit = max(1, min(limit, MAX_RESULTS_PER_PAGE))
+    offset = max(0, offset)
+    page = {"query": query, "total": 0, "limit": limit, "offset": offset, "results": []}
+    expression = match_expression(query)
+    if not expression:
+        return page
+    page["total"] = conn.execute("SELECT COUNT(*) FROM story_search WHERE story_search MATCH ?", (expression,)).fetchone()[0]
+    rows = conn.execute(
+        f"""SELECT search_docs.name, story_search.title,
+                   bm25(story_search, {", ".join(str(weight) for weight in BM25_WEIGHTS)}) AS rank,
+                   snippet(story_search, -1, '{_MATCH_START}', '{_MATCH_END}', '…', {SNIPPET_TOKENS})
+            FROM story_search JOIN search_docs ON search_docs.id = story_search.rowid
+            WHERE story_search MATCH ?
+            ORDER BY rank LIMIT ? OFFSET ?""",
+        (expression, limit, offset),
+    ).fetchall()
+    # FTS5's bm25() is lower-is-better; results report it negated
+    page["results"] = [
+        {"filename": name + ".json", "title": title, "score": -rank, "snippet": _snippet_html(snippet)}
+        for name, title, rank, snippet in rows
+    ]
+    return page
+
+
+def refresh_from_files(storage_dir: str, db_path: str = None) -> int:
+    """Re-index story files whose mtime changed since they were indexed, and drop deleted ones.
+
+    Returns:
+        The number of stories indexed or removed.
+    """
+    on_disk = {}
+    if os.path.exists(storage_dir):
+        for entry in os.scandir(storage_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                on_disk[entry.name[:-len(".json")]] = entry
+    changed = 0
+    with connect(db_path) as conn:
+        indexed = indexed_versions(conn)
+        for name in indexed.keys() - on_disk.keys():
+            remove_story(conn, name)
+            changed += 1
+        for name, entry in on_disk.items():
+            modified_at = entry.stat().st_mtime
+            if indexed.get(name) == modified_at:
+                continue
+            try:
+                with open(entry.path, 'r') as f:
+                    index_story(conn, name, json.load(f), modified_at)
+            except (OSError, ValueError):
+                continue
+            changed += 1
+    return changed
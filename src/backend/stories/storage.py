@@ -0,0 +1,488 @@
+"""Pluggable persistence for stories and evaluation reports.
+
+StoryStructure and EvaluationReport read and write through a StoryStorage
+instead of touching files directly. Two backends are available:
+
+    json    loose JSON files in story_storage_dir and REPORT_STORAGE_DIR, with the
+            catalog index for listings (the original layout, and the default)
+    sqlite  one SQLite database in WAL mode: indexed metadata tables for stories
+            (title, created/modified) and reports (story, scores), with the
+            JSON documents themselves in separate blob tables, so listing and
+            filtering never read a story or report body
+
+Both backends keep the full-text search index (search_index) up to date as
+stories are saved and deleted.
+
+Settings (environment variables):
+    STORYTIME_STORAGE_BACKEND=json|sqlite
+    STORYTIME_STORY_DB=src/backend/stories/stories.db
+
+Existing JSON files are imported into the SQLite backend with:
+    python -m src.backend.stories.storage migrate
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Optional
+
+from . import catalog, search_index, thumbnails
+
+STORAGE_BACKEND = os.getenv("STORYTIME_STORAGE_BACKEND", "json")
+STORY_DB_PATH = os.getenv("STORYTIME_STORY_DB", "src/backend/stories/stories.db")
+# Key under which JSON report files record the story they evaluate
+REPORT_STORY_KEY = "_story_name"
+
+
+def report_scores(report: dict) -> tuple:
+    """The (accuracy, citations) proportions of an evaluation report dict."""
+    return (
+        report.get("accuracy_report", {}).get("Metric"),
+        report.get("citations_report", {}).get("Metric"),
+    )
+
+
+def read_report_file(path: str) -> tuple:
+    """Read a JSON report file. Returns the report and the name of the story it evaluates,
+    None for files saved before the story was recorded."""
+    with open(path, 'r') as f:
+        report = json.load(f)
+    story_name = report.pop(REPORT_STORY_KEY, None)
+    return report, story_name
+
+
+class StoryStorage(ABC):
+    """Where stories and evaluation reports are kept. Stories are addressed by name,
+    their storage filename without .json."""
+
+    @abstractmethod
+    def save_story(self, name: str, data: dict, durable: bool = False) -> str:
+        """Insert or replace a story. With durable, the write is on disk when this returns.
+
+        Returns:
+            The stored story's version, as returned by story_version.
+        """
+
+    @abstractmethod
+    def load_story(self, name: str) -> Optional[dict]:
+        """Return a stored story, or None if there is none."""
+
+    @abstractmethod
+    def delete_story(self, name: str) -> bool:
+        """Delete a story. Returns False if it did not exist."""
+
+    @abstractmethod
+    def story_exists(self, name: str) -> bool:
+        pass
+
+    @abstractmethod
+    def story_version(self, name: str) -> Optional[str]:
+        """An opaque token that changes whenever the stored story changes, by any means,
+        or None if there is no such story. Cheap enough to check on every read."""
+
+    @abstractmethod
+    def list_stories(self, limit: int = None, after: tuple = None) -> list:
+        """Story metadata (filename, title, modified_at, thumbnail, thumbnails), most recently modified first.
+
+        thumbnail and thumbnails are as returned by thumbnails.listing_thumbnail.
+
+        Args:
+            limit: Maximum number of stories to return. All when None.
+            after: (modified_at, filename) of the last story of the previous page, to resume after it.
+        """
+
+    @abstractmethod
+    def refresh_index(self) -> int:
+        """Bring listing and search metadata in line with the stored stories. Returns rows changed."""
+
+    @abstractmethod
+    def search_stories(self, query: str, limit: int = 20, offset: int = 0) -> dict:
+        """Full-text search over titles, segment titles and segment text, as returned by search_index.search."""
+
+    @abstractmethod
+    def save_report(self, name: str, report: dict, story_name: str = None):
+        """Insert or replace an evaluation report, optionally linked to the story it evaluates."""
+
+    @abstractmethod
+    def load_report(self, name: str) -> Optional[dict]:
+        """Return a stored evaluation report, or None if there is none."""
+
+    @abstractmethod
+    def list_reports(self, story_name: str = None, min_accuracy: float = None) -> list:
+        """Report metadata (name, story_name, accuracy, citations, modified_at), newest first."""
+
+
+class JSONFileStorage(StoryStorage):
+    def __init__(self, story_dir: str = None, report_dir: str = None):
+        """
+        Args:
+            story_dir: Directory of story files. Defaults to story_storage_dir.
+            report_dir: Directory of report files. Defaults to REPORT_STORAGE_DIR.
+        """
+        self._story_dir = story_dir
+        self._report_dir = report_dir
+
+    @property
+    def story_dir(self) -> str:
+        if self._story_dir is None:
+            from .story_structure import story_storage_dir
+            return story_storage_dir
+        return self._story_dir
+
+    @property
+    def report_dir(self) -> str:
+        if self._report_dir is None:
+            from ..evaluations.evaluation import REPORT_STORAGE_DIR
+            return REPORT_STORAGE_DIR
+        return self._report_dir
+
+    def story_path(self, name: str) -> str:
+        return os.path.join(self.story_dir, name + ".json")
+
+    def save_story(self, name: str, data: dict, durable: bool = False) -> str:
+        from .journal import write_snapshot
+        path = self.story_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if durable:
+            write_snapshot(path, data)
+        else:
+            with open(path, 'w') as f:
+                json.dump(data, f, indent=2)
+        catalog.record_story(path, data)
+        with search_index.connect() as conn:
+            search_index.index_story(conn, name, data, os.stat(path).st_mtime)
+        return self.story_version(name)
+
+    def load_story(self, name: str) -> Optional[dict]:
+        path = self.story_path(name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def delete_story(self, name: str) -> bool:
+        path = self.story_path(name)
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        catalog.remove_story(path)
+        with search_index.connect() as conn:
+            search_index.remove_story(conn, name)
+        return True
+
+    def story_exists(self, name: str) -> bool:
+        return os.path.exists(self.story_path(name))
+
+    def story_version(self, name: str) -> Optional[str]:
+        # The file can also be rewritten outside the storage, e.g. by image_store.migrate_story_images
+        try:
+            stat = os.stat(self.story_path(name))
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def list_stories(self, limit: int = None, after: tuple = None) -> list:
+        return catalog.list_catalog(limit, after)
+
+    def refresh_index(self) -> int:
+        # Files can change outside the storage, so both indexes re-read those whose mtime changed
+        return catalog.refresh_catalog(self.story_dir) + search_index.refresh_from_files(self.story_dir)
+
+    def search_stories(self, query: str, limit: int = 20, offset: int = 0) -> dict:
+        with search_index.connect() as conn:
+            return search_index.search(conn, query, limit, offset)
+
+    def save_report(self, name: str, report: dict, story_name: str = None):
+        os.makedirs(self.report_dir, exist_ok=True)
+        with open(os.path.join(self.report_dir, name + ".json"), 'w') as f:
+            json.dump({**report, REPORT_STORY_KEY: story_name}, f)
+
+    def load_report(self, name: str) -> Optional[dict]:
+        path = os.path.join(self.report_dir, name + ".json")
+        if not os.path.exists(path):
+            return None
+        return read_report_file(path)[0]
+
+    def list_reports(self, story_name: str = None, min_accuracy: float = None) -> list:
+        reports = []
+        if not os.path.exists(self.report_dir):
+            return reports
+        for entry in os.scandir(self.report_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            report, report_story_name = read_report_file(entry.path)
+            if story_name is not None and report_story_name != story_name:
+                continue
+            accuracy, citations = report_scores(report)
+            if min_accuracy is not None and (accuracy is None or accuracy < min_accuracy):
+                continue
+            reports.append({
+                "name": entry.name[:-len(".json")],
+                "story_name": report_story_name,
+                "accuracy": accuracy,
+                "citations": citations,
+                "modified_at": entry.stat().st_mtime,
+            })
+        reports.sort(key=lambda report: report["modified_at"], reverse=True)
+        return reports
+
+
+SQLITE_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS stories (
+        name TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        modified_at REAL NOT NULL,
+        size INTEGER NOT NULL,
+        thumbnail TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS stories_title ON stories (title)",
+    "CREATE INDEX IF NOT EXISTS stories_created_at ON stories (created_at)",
+    "CREATE INDEX IF NOT EXISTS stories_modified_at ON stories (modified_at)",
+    """CREATE TABLE IF NOT EXISTS story_blobs (
+        name TEXT PRIMARY KEY REFERENCES stories (name) ON DELETE CASCADE,
+        data TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS reports (
+        name TEXT PRIMARY KEY,
+        story_name TEXT,
+        accuracy REAL,
+        citations REAL,
+        created_at REAL NOT NULL,
+        modified_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS reports_story_name ON reports (story_name)",
+    "CREATE INDEX IF NOT EXISTS reports_accuracy ON reports (accuracy)",
+    "CREATE INDEX IF NOT EXISTS reports_citations ON reports (citations)",
+    "CREATE INDEX IF NOT EXISTS reports_modified_at ON reports (modified_at)",
+    """CREATE TABLE IF NOT EXISTS report_blobs (
+        name TEXT PRIMARY KEY REFERENCES reports (name) ON DELETE CASCADE,
+        data TEXT NOT NULL
+    )""",
+)
+
+
+def _row_version(modified_at: float, size: int) -> str:
+    return f"{modified_at!r}:{size}"
+
+
+class SQLiteStorage(StoryStorage):
+    def __init__(self, db_path: str = STORY_DB_PATH):
+        self.db_path = db_path
+        self._schema_ready = False
+
+    @contextmanager
+    def _connect(self, durable: bool = False):
+        """Open the database, committing on success and always closing."""
+        if os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            # NORMAL is crash-safe in WAL mode but may lose the last commits on power loss
+            conn.execute(f"PRAGMA synchronous={'FULL' if durable else 'NORMAL'}")
+            with conn:
+                if not self._schema_ready:
+                    for statement in SQLITE_SCHEMA:
+                        conn.execute(statement)
+                    self._drop_topic_column(conn)
+                    search_index.ensure_schema(conn)
+                    self._schema_ready = True
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _drop_topic_column(conn):
+        # Databases created before it was dropped have a topic column that only ever
+        # repeated the name, which is the story's topic and already the primary key
+        if any(row["name"] == "topic" for row in conn.execute("PRAGMA table_info(stories)")):
+            conn.execute("DROP INDEX IF EXISTS stories_topic")
+            conn.execute("ALTER TABLE stories DROP COLUMN topic")
+
+    @staticmethod
+    def _write_story(conn, name: str, data: dict, modified_at: float):
+        payload = json.dumps(data)
+        summary = catalog.summarize_story(data)
+        conn.execute(
+            """INSERT INTO stories (name, title, created_at, modified_at, size, thumbnail)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (name) DO UPDATE SET title = excluded.title, modified_at = excluded.modified_at,
+                   size = excluded.size, thumbnail = excluded.thumbnail""",
+            (name, summary["title"], modified_at, modified_at, len(payload), summary["thumbnail"]),
+        )
+        conn.execute("INSERT OR REPLACE INTO story_blobs (name, data) VALUES (?, ?)", (name, payload))
+        search_index.index_story(conn, name, data, modified_at)
+        return _row_version(modified_at, len(payload))
+
+    def save_story(self, name: str, data: dict, durable: bool = False) -> str:
+        with self._connect(durable) as conn:
+            return self._write_story(conn, name, data, time.time())
+
+    def load_story(self, name: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM story_blobs WHERE name = ?", (name,)).fetchone()
+        return json.loads(row["data"]) if row is not None else None
+
+    def delete_story(self, name: str) -> bool:
+        with self._connect() as conn:
+            search_index.remove_story(conn, name)
+            return conn.execute("DELETE FROM stories WHERE name = ?", (name,)).rowcount > 0
+
+    def story_exists(self, name: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM stories WHERE name = ?", (name,)).fetchone() is not None
+
+    def story_version(self, name: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT modified_at, size FROM stories WHERE name = ?", (name,)).fetchone()
+        return _row_version(row["modified_at"], row["size"]) if row is not None else None
+
+    def list_stories(self, limit: int = None, after: tuple = None) -> list:
+        query = "SELECT name, title, modified_at, thumbnail FROM stories"
+        params = []
+        if after is not None:
+            query += " WHERE (modified_at, name) < (?, ?)"
+            params += [after[0], os.path.splitext(after[1])[0]]
+        query += " ORDER BY modified_at DESC, name DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            {"filename": row["name"] + ".json", "title": row["title"], "modified_at": row["modified_at"],
+             **thumbnails.listing_thumbnail(row["thumbnail"])}
+            for row in rows
+        ]
+
+    def refresh_index(self) -> int:
+        """Index stories missing from or out of date in the search index, e.g. after an upgrade."""
+        changed = 0
+        with self._connect() as conn:
+            indexed = search_index.indexed_versions(conn)
+            stored = dict(conn.execute("SELECT name, modified_at FROM stories").fetchall())
+            for name in indexed.keys() - stored.keys():
+                search_index.remove_story(conn, name)
+                changed += 1
+            for name, modified_at in stored.items():
+                if indexed.get(name) == modified_at:
+                    continue
+                row = conn.execute("SELECT data FROM story_blobs WHERE name = ?", (name,)).fetchone()
+                search_index.index_story(conn, name, json.loads(row["data"]), modified_at)
+                changed += 1
+        return changed
+
+    def search_stories(self, query: str, limit: int = 20, offset: int = 0) -> dict:
+        with self._connect() as conn:
+            return search_index.search(conn, query, limit, offset)
+
+    @staticmethod
+    def _write_report(conn, name: str, report: dict, story_name: str, modified_at: float):
+        accuracy, citations = report_scores(report)
+        conn.execute(
+            """INSERT INTO reports (name, story_name, accuracy, citations, created_at, modified_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (name) DO UPDATE SET story_name = excluded.story_name, accuracy = excluded.accuracy,
+                   citations = excluded.citations, modified_at = excluded.modified_at""",
+            (name, story_name, accuracy, citations, modified_at, modified_at),
+        )
+        conn.execute("INSERT OR REPLACE INTO report_blobs (name, data) VALUES (?, ?)", (name, json.dumps(report)))
+
+    def save_report(self, name: str, report: dict, story_name: str = None):
+        with self._connect() as conn:
+            self._write_report(conn, name, report, story_name, time.time())
+
+    def load_report(self, name: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM report_blobs WHERE name = ?", (name,)).fetchone()
+        return json.loads(row["data"]) if row is not None else None
+
+    def list_reports(self, story_name: str = None, min_accuracy: float = None) -> list:
+        query = "SELECT name, story_name, accuracy, citations, modified_at FROM reports"
+        conditions, params = [], []
+        if story_name is not None:
+            conditions.append("story_name = ?")
+            params.append(story_name)
+        if min_accuracy is not None:
+            conditions.append("accuracy >= ?")
+            params.append(min_accuracy)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY modified_at DESC", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def import_json(self, source: JSONFileStorage) -> tuple:
+        """Copy every story and report from a JSON file storage, keeping file mtimes as timestamps.
+
+        Journaled stories are imported with their journal applied. Returns (stories, reports) imported.
+        """
+        from .story_structure import read_story
+        stories = reports = 0
+        with self._connect(durable=True) as conn:
+            if os.path.exists(source.story_dir):
+                for entry in sorted(os.scandir(source.story_dir), key=lambda entry: entry.name):
+                    if not entry.is_file() or not entry.name.endswith(".json"):
+                        continue
+                    name = entry.name[:-len(".json")]
+                    try:
+                        data = read_story(name, storage=source)
+                    except (OSError, ValueError) as e:
+                        print(f"Skipping story {entry.name}: {e}")
+                        continue
+                    self._write_story(conn, name, data, entry.stat().st_mtime)
+                    stories += 1
+            if os.path.exists(source.report_dir):
+                for entry in sorted(os.scandir(source.report_dir), key=lambda entry: entry.name):
+                    if not entry.is_file() or not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        report, story_name = read_report_file(entry.path)
+                    except (OSError, ValueError) as e:
+                        print(f"Skipping report {entry.name}: {e}")
+                        continue
+                    self._write_report(conn, entry.name[:-len(".json")], report, story_name, entry.stat().st_mtime)
+                    reports += 1
+        return stories, reports
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StoryStorage:
+    """Return the process-wide storage selected by STORYTIME_STORAGE_BACKEND."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND == "sqlite":
+                _storage = SQLiteStorage()
+            elif STORAGE_BACKEND == "json":
+                _storage = JSONFileStorage()
+            else:
+                raise ValueError(f"Unknown storage backend '{STORAGE_BACKEND}'")
+        return _storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage StoryTime story and evaluation report storage.")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--stories", default=None, help="Directory of story JSON files to import (default: story_storage_dir)")
+    parser.add_argument("--reports", default=None, help="Directory of report JSON files to import (default: REPORT_STORAGE_DIR)")
+    parser.add_argument("--db", default=STORY_DB_PATH, help="SQLite database to import into")
+    args = parser.parse_args()
+
+    stories, reports = SQLiteStorage(args.db).import_json(JSONFileStorage(args.stories, args.reports))
+    print(f"Imported {stories} stories and {reports} evaluation reports into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,49 @@
+import functools
 import json
 import os
+import threading
+from . import payloads, version_store
+from .journal import JOURNAL_ENABLED, SNAPSHOT_SEQ_KEY, StoryJournal, journal_path, read_journal
+from .research import ResearchStore, note_chunk, render_document, search_chunks
+from .storage import StoryStorage, get_storage
 
 story_storage_dir = "src/backend/stories/json_storage"
 
+def journaled(method):
+    """Record a successful call to a mutating StoryStructure method in the story's journal."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            result = method(self, *args, **kwargs)
+            if self.journal is not None and not self._replaying:
+                if not self._journal_started:
+                    self._start_journal()
+                self.journal.append(method.__name__, list(args), kwargs)
+            return result
+    return wrapper
+
 class StoryStructure:
-    def __init__(self, location: str):
+    def __init__(self, location: str, journaled: bool = None, storage: StoryStorage = None):
+        """
+        Args:
+            location: Story name; the story is stored under it, as <story_storage_dir>/<location>.json
+                with the JSON file storage.
+            journaled: Persist mutations to an append-only journal as they happen instead of
+                rewriting the whole story on save. Defaults to STORYTIME_STORY_JOURNAL.
+            storage: Where the story is saved. Defaults to the storage selected by STORYTIME_STORAGE_BACKEND.
+        """
         self.location = os.path.join(story_storage_dir, location + ".json")
+        self.storage = storage or get_storage()
         self.title = ""
-        self.research_document = ""
+        self.research = ResearchStore()
         self.segments = []
         self.citations = []
+        self.journal = StoryJournal(journal_path(self.location)) if (JOURNAL_ENABLED if journaled is None else journaled) else None
+        self._lock = threading.RLock()
+        self._replaying = False
+        self._journal_started = False
         
+    @journaled
     def add_segment(self, title: str, text: str = "", images: list = None, citations: list = None):
         """Add a new segment to the story."""
         segment = {
@@ -28,6 +61,7 @@ class StoryStructure:
                 return i
         return -1
     
+    @journaled
     def write_story_section(self, segment_title: str, segment_section: str, value, replace: bool = False):
         """Write to a specific section of a segment."""
         idx = self.find_segment_index(segment_title)
@@ -42,61 +76,198 @@ class StoryStructure:
             else:
                 self.segments[idx][segment_section] += value
     
+    @journaled
     def write_story_title(self, title: str):
         """Set the story title."""
         self.title = title
     
+    @property
+    def research_document(self) -> str:
+        """The research rendered as a single string, as older clients expect it."""
+        return self.research.render()
+
     def set_research_document(self, research_text: str, replace: bool = False):
-        """Set or append to the research document."""
+        """Add a research note, or replace all research with it."""
         if replace:
-            self.research_document = research_text
-        else:
-            self.research_document += "\n" + research_text if self.research_document else research_text
-    
-    def to_json(self) -> dict:
-        """Return story as JSON dict."""
-        return {
+            self.clear_research()
+        self.add_research_chunks([note_chunk(research_text)])
+
+    def add_research_results(self, query: str, results: list) -> list:
+        """Add the results of a search to the research. Returns the results that were new."""
+        return self.add_research_chunks(search_chunks(query, results))
+
+    @journaled
+    def add_research_chunks(self, chunks: list) -> list:
+        """Append research chunks, skipping URLs and snippets the story already has."""
+        return self.research.add(chunks)
+
+    def search_research(self, query: str, k: int = 5) -> list:
+        """Return the k research chunks most relevant to query, best first, each with a BM25 "score"."""
+        with self._lock:
+            return self.research.search(query, k)
+
+    @journaled
+    def clear_research(self):
+        self.research.clear()
+
+    @journaled
+    def clear(self):
+        """Remove the title, research and all segments from the story."""
+        self.title = ""
+        self.research.clear()
+        self.segments = []
+        self.citations = []
+
+    def _start_journal(self):
+        """Start journaling a story that wasn't loaded from disk.
+
+        Sequence numbers continue from whatever is already stored at this location, and
+        the first record clears it, so replaying gives this story rather than the old one.
+        """
+        stored = self.storage.load_story(self.name)
+        last_seq = stored.get(SNAPSHOT_SEQ_KEY, 0) if stored is not None else 0
+        records = read_journal(self.journal.path, last_seq)
+        self.journal.seq = records[-1]["seq"] if records else last_seq
+        self._journal_started = True
+        self.journal.append("clear", [], {})
+
+    def to_json(self, research_document: bool = False) -> dict:
+        """Return story as JSON dict.
+
+        Args:
+            research_document: Also include the research rendered as the legacy string.
+        """
+        data = {
             "title": self.title,
-            "research_document": self.research_document,
+            "research": self.research.to_json(),
             "segments": self.segments
         }
+        if research_document:
+            data["research_document"] = self.research.render()
+        return data
     
     def save_to_file(self, target_path: str = None):
-        """Save story to JSON file.
+        """Save story to its storage.
         
         Args:
-            target_path: Optional explicit path. Defaults to the story's primary location.
+            target_path: Optional path to export the story to as a JSON file instead.
         """
-        os.makedirs(story_storage_dir, exist_ok=True)
-        destination = target_path or self.location
-        os.makedirs(os.path.dirname(destination), exist_ok=True)
-        with open(destination, 'w') as f:
-            json.dump(self.to_json(), f, indent=2)
+        if target_path not in (None, self.location):
+            os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+            with open(target_path, 'w') as f:
+                json.dump(self.to_json(), f, indent=2)
+            return
+        if self.journal is not None:
+            # Mutations are already journaled; only rebuild the snapshot when it's due
+            self.journal.sync()
+            if self.journal.should_compact() or not self.storage.story_exists(self.name):
+                self.compact()
+            return
+        self.storage.save_story(self.name, self.to_json())
     
+    def compact(self):
+        """Write a snapshot of the journaled story and empty its journal."""
+        with self._lock:
+            self.storage.save_story(self.name, {**self.to_json(), SNAPSHOT_SEQ_KEY: self.journal.seq}, durable=True)
+            self.journal.reset()
+
+    def finalize(self):
+        """Persist the finished story and encode its payloads.
+
+        Compacts a journaled story, otherwise saves it. Drafts saved along the way get no
+        payloads, so saving costs the same however large the story grows; a draft read
+        before finalize has its payloads encoded on that read.
+        """
+        with self._lock:
+            if self.journal is not None:
+                self.compact()
+            else:
+                self.save_to_file()
+            payloads.write_payloads(self.name, self.to_json(), self.storage.story_version(self.name))
+
     def load_from_file(self):
-        """Load story from JSON file."""
-        if os.path.exists(self.location):
-            with open(self.location, 'r') as f:
-                data = json.load(f)
-                self.title = data.get('title', '')
-                self.research_document = data.get('research_document', '')
-                self.segments = data.get('segments', [])
-                self.citations = data.get('citations', [])
+        """Load story from its storage, replaying any journaled operations on top of it."""
+        snapshot_seq = 0
+        data = self.storage.load_story(self.name)
+        if data is not None:
+            self.title = data.get('title', '')
+            self.research = load_research(data)
+            self.segments = data.get('segments', [])
+            self.citations = data.get('citations', [])
+            snapshot_seq = data.get(SNAPSHOT_SEQ_KEY, 0)
+        records = read_journal(journal_path(self.location), snapshot_seq)
+        self._replaying = True
+        try:
+            for record in records:
+                getattr(self, record["op"])(*record["args"], **record["kwargs"])
+        finally:
+            self._replaying = False
+        if self.journal is not None:
+            self.journal.seq = records[-1]["seq"] if records else snapshot_seq
+            self.journal.pending_ops = len(records)
+            self._journal_started = True
     def save_story(self, version_name: str) -> str:
-        """Save the current story to a versioned JSON file alongside the base story file."""
+        """Save the current story and record it as a named version in the version store.
+
+        Versions share unchanged segments and research, so each one only costs what changed.
+        """
         if not version_name:
             raise ValueError("version_name must be provided")
-        base_dir = os.path.dirname(self.location)
-        base_name = os.path.splitext(os.path.basename(self.location))[0]
-        version_filename = f"{base_name}-{version_name}.json"
-        version_path = os.path.join(base_dir, version_filename)
-        self.save_to_file(version_path)
-        return version_path
+        self.save_to_file()
+        return version_store.save_version(self.name, version_name, self.to_json())
+
+    @property
+    def name(self) -> str:
+        """The story's storage name, its filename without .json."""
+        return os.path.splitext(os.path.basename(self.location))[0]
     
     def delete(self):
-        """Delete the story file from disk."""
-        if os.path.exists(self.location):
-            os.remove(self.location)
+        """Delete the story, its journal, its versions and its precompressed payloads."""
+        if os.path.exists(journal_path(self.location)):
+            os.remove(journal_path(self.location))
+        version_store.delete_versions(self.name)
+        payloads.remove_payloads(self.name)
+        if self.storage.delete_story(self.name):
             return f"Story deleted: {self.location}"
         else:
-            return f"Story file not found: {self.location}"
\ No newline at end of file
+            return f"Story file not found: {self.location}"
+
+def load_research(data: dict) -> ResearchStore:
+    """Build the research store of a story JSON dict, including ones saved with a research_document string."""
+    if "research" in data:
+        return ResearchStore(data["research"])
+    legacy_document = data.get("research_document", "")
+    return ResearchStore([note_chunk(legacy_document, timestamp=0.0)] if legacy_document else [])
+
+def has_pending_journal(name: str) -> bool:
+    """Whether a story has journaled operations not yet compacted into its stored snapshot."""
+    path = journal_path(os.path.join(story_storage_dir, name + ".json"))
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+def read_story(name: str, research_document: bool = False, storage: StoryStorage = None) -> dict:
+    """Read a stored story as a JSON dict, applying its journal if the story is journaled.
+
+    Args:
+        name: The story's name, its storage filename without .json.
+        research_document: Also include the research rendered as the legacy string.
+        storage: Storage to read from. Defaults to the configured storage.
+
+    Returns:
+        The story, or None if it does not exist.
+    """
+    storage = storage or get_storage()
+    if not has_pending_journal(name):
+        data = storage.load_story(name)
+        if data is None:
+            return None
+        data.pop(SNAPSHOT_SEQ_KEY, None)
+        if "research" not in data:
+            data["research"] = load_research(data).to_json()
+        if research_document:
+            data["research_document"] = render_document(data["research"])
+        else:
+            data.pop("research_document", None)
+        return data
+    story = StoryStructure(name, journaled=False, storage=storage)
+    story.load_from_file()
+    return story.to_json(research_document)
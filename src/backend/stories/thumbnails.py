@@ -0,0 +1,164 @@
+"""Precomputed thumbnails for story listings.
+
+Story listings show each story's first image, which is a full-size generated
+image. When an image is added to a story, and again when a story is saved, the
+image is downscaled to a few widths in WebP and JPEG. The thumbnails go into the
+image store like any other image, so they are content-addressed and served by
+/images with immutable caching. A manifest per source image records its
+thumbnails. Source images never change, so a manifest never needs rebuilding.
+
+    image_storage/thumbnails/<source hash>.json   {"<width>": {"webp": url, "jpg": url}}
+
+Thumbnails need Pillow. Without it listings fall back to the original image.
+
+Run this module to create thumbnails for stories saved before thumbnails
+existed (and move their inline images into the image store):
+    python -m src.backend.stories.thumbnails
+"""
+
+import io
+import json
+import os
+import tempfile
+from typing import Optional
+
+from . import image_store
+
+THUMBNAIL_MANIFEST_DIR = os.path.join(image_store.IMAGE_STORAGE_DIR, "thumbnails")
+# Listing cards are about 400px wide; 800 covers high-density screens
+THUMBNAIL_WIDTHS = (400, 800)
+THUMBNAIL_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+THUMBNAIL_QUALITY = 80
+
+
+def _pillow_image():
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def _source_image_id(image: str) -> Optional[str]:
+    """The image store ID behind a story image reference, or None for images outside the store."""
+    if not isinstance(image, str) or not image.startswith(image_store.IMAGE_URL_PREFIX):
+        return None
+    image_id = image[len(image_store.IMAGE_URL_PREFIX):]
+    return image_id if image_store.is_valid_image_id(image_id) else None
+
+
+def _manifest_path(image_id: str) -> str:
+    return os.path.join(THUMBNAIL_MANIFEST_DIR, image_id.split(".")[0] + ".json")
+
+
+# Manifests never change once written, so they are cached for the life of the process.
+# Misses are not cached: another process may create the thumbnails later.
+_manifests = {}
+
+
+def _load_manifest(image_id: str) -> Optional[dict]:
+    if image_id in _manifests:
+        return _manifests[image_id]
+    try:
+        with open(_manifest_path(image_id), 'r') as f:
+            _manifests[image_id] = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return _manifests[image_id]
+
+
+def _render(Image, source: bytes) -> dict:
+    """Downscale an image to every thumbnail width and format, storing each. Returns the variant URLs."""
+    with Image.open(io.BytesIO(source)) as image:
+        image.load()
+        if image.mode in ("RGBA", "LA", "P"):
+            # JPEG has no alpha; flatten onto white, which is also what the cards sit on
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        variants = {}
+        for width in THUMBNAIL_WIDTHS:
+            scaled = image.copy()
+            scaled.thumbnail((width, width), Image.LANCZOS)
+            variants[str(width)] = {}
+            for extension, pillow_format in THUMBNAIL_FORMATS.items():
+                buffer = io.BytesIO()
+                scaled.save(buffer, format=pillow_format, quality=THUMBNAIL_QUALITY)
+                variants[str(width)][extension] = image_store.image_url(image_store.save_image(buffer.getvalue()))
+    return variants
+
+
+def create_thumbnails(image: str) -> Optional[dict]:
+    """Make sure the thumbnails of a story image exist.
+
+    Args:
+        image: A story image reference. Inline data URIs are moved into the image store first;
+            remote URLs get no thumbnails.
+
+    Returns:
+        The thumbnail URLs by width and format, or None if there are none.
+    """
+    image_id = _source_image_id(image_store.store_data_uri(image) if isinstance(image, str) else image)
+    if image_id is None:
+        return None
+    variants = _load_manifest(image_id)
+    if variants is not None:
+        return variants
+    Image = _pillow_image()
+    if Image is None:
+        return None
+    try:
+        with open(image_store.image_path(image_id), 'rb') as f:
+            variants = _render(Image, f.read())
+    except (OSError, ValueError):
+        # Missing or undecodable source image
+        return None
+    os.makedirs(THUMBNAIL_MANIFEST_DIR, exist_ok=True)
+    # A temp file per writer, since two saves of stories sharing an image can get here at once
+    fd, tmp_path = tempfile.mkstemp(dir=THUMBNAIL_MANIFEST_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(variants, f)
+        os.replace(tmp_path, _manifest_path(image_id))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _manifests[image_id] = variants
+    return variants
+
+
+def listing_thumbnail(image: Optional[str]) -> dict:
+    """Listing fields for a story's cover image.
+
+    Returns:
+        {"thumbnail": the smallest WebP thumbnail URL, falling back to the image itself,
+         "thumbnails": every thumbnail URL by width and format, or None}.
+        Inline data URIs are never returned.
+    """
+    image_id = _source_image_id(image)
+    variants = _load_manifest(image_id) if image_id is not None else None
+    if variants is not None:
+        return {"thumbnail": variants[str(min(THUMBNAIL_WIDTHS))]["webp"], "thumbnails": variants}
+    if isinstance(image, str) and image.startswith("data:"):
+        return {"thumbnail": None, "thumbnails": None}
+    return {"thumbnail": image, "thumbnails": None}
+
+
+if __name__ == "__main__":
+    from .storage import STORAGE_BACKEND, get_storage
+    from .story_structure import story_storage_dir
+
+    migrated = image_store.migrate_story_images(story_storage_dir)
+    if STORAGE_BACKEND != "json":
+        migrated += image_store.migrate_storage_images(get_storage())
+    changed = get_storage().refresh_index()
+    created = 0
+    for story in get_storage().list_stories():
+        if story["thumbnails"] is None and story["thumbnail"] and create_thumbnails(story["thumbnail"]):
+            created += 1
+    print(f"Migrated inline images in {migrated} stories, refreshed {changed} index entries, "
+          f"created thumbnails for {created} stories")
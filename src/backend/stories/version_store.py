@@ -0,0 +1,198 @@
+"""Deduplicated, content-addressed storage for story versions.
+
+Saving a version used to write a full copy of the story. Here each segment and
+each research chunk is stored once as an object named by its SHA-256 hash, and
+a version is a small manifest listing the hashes it uses. Unchanged segments
+and research are shared between versions, so a new version only writes the
+objects that changed plus its manifest. Images are already content-addressed
+by the image store and are referenced from segments by URL.
+
+Layout under VERSION_STORAGE_DIR:
+    objects/<hash[:2]>/<hash>.json
+    manifests/<story name>/<version name>.json
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from . import image_store
+from .research import note_chunk
+
+VERSION_STORAGE_DIR = "src/backend/stories/version_storage"
+
+
+def _write_atomic(path: str, payload: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A temp file per writer, so threads storing the same object never share one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _put_object(value) -> str:
+    """Store a JSON value under its content hash, if not already stored, and return the hash."""
+    payload = json.dumps(value, sort_keys=True).encode()
+    object_hash = hashlib.sha256(payload).hexdigest()
+    path = _object_path(object_hash)
+    if not os.path.exists(path):
+        _write_atomic(path, payload)
+    return object_hash
+
+
+def _object_path(object_hash: str) -> str:
+    return os.path.join(VERSION_STORAGE_DIR, "objects", object_hash[:2], f"{object_hash}.json")
+
+
+def _get_object(object_hash: str):
+    with open(_object_path(object_hash), 'r') as f:
+        return json.load(f)
+
+
+def _manifest_dir(story_name: str) -> str:
+    return os.path.join(VERSION_STORAGE_DIR, "manifests", story_name)
+
+
+def _manifest_path(story_name: str, version_name: str) -> str:
+    for name in (story_name, version_name):
+        if not name or name in (".", "..") or os.path.basename(name) != name:
+            raise ValueError(f"Invalid story or version name '{story_name}/{version_name}'")
+    return os.path.join(_manifest_dir(story_name), f"{version_name}.json")
+
+
+def save_version(story_name: str, version_name: str, story_data: dict) -> str:
+    """Store a version of a story and return its manifest path.
+
+    Args:
+        story_name: Name of the story (its storage filename without .json).
+        version_name: Label of the version, e.g. "draft1" or "final".
+        story_data: The story as returned by StoryStructure.to_json().
+    """
+    segments = []
+    for segment in story_data.get("segments", []):
+        # Legacy inline images move to the image store so segments stay small
+        images = [image_store.store_data_uri(image) if isinstance(image, str) else image for image in segment.get("images", [])]
+        segments.append({"title": segment.get("title", ""), "hash": _put_object({**segment, "images": images})})
+    manifest = {
+        "version": version_name,
+        "created_at": time.time(),
+        "title": story_data.get("title", ""),
+        "segments": segments,
+        "research": [_put_object(chunk) for chunk in story_data.get("research", [])],
+    }
+    path = _manifest_path(story_name, version_name)
+    _write_atomic(path, json.dumps(manifest, indent=2).encode())
+    return path
+
+
+def list_versions(story_name: str) -> list:
+    """List a story's versions, oldest first, without loading their content."""
+    manifest_dir = _manifest_dir(story_name)
+    if not os.path.exists(manifest_dir):
+        return []
+    versions = []
+    for filename in os.listdir(manifest_dir):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(manifest_dir, filename), 'r') as f:
+            manifest = json.load(f)
+        versions.append({
+            "version": manifest["version"],
+            "created_at": manifest["created_at"],
+            "title": manifest["title"],
+            "segments": len(manifest["segments"]),
+        })
+    versions.sort(key=lambda version: version["created_at"])
+    return versions
+
+
+def _load_manifest(story_name: str, version_name: str) -> dict:
+    path = _manifest_path(story_name, version_name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Version '{version_name}' of story '{story_name}' not found")
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_version(story_name: str, version_name: str) -> dict:
+    """Materialize a stored version as a story JSON dict."""
+    manifest = _load_manifest(story_name, version_name)
+    research = [_get_object(chunk) for chunk in manifest["research"]]
+    if research and isinstance(research[0], str):
+        # Versions saved before research was structured hold pieces of the research string
+        research = [note_chunk("".join(research), timestamp=0.0)]
+    return {
+        "title": manifest["title"],
+        "research": research,
+        "segments": [_get_object(segment["hash"]) for segment in manifest["segments"]],
+    }
+
+
+def diff_versions(story_name: str, old_version: str, new_version: str) -> dict:
+    """Describe what changed between two versions of a story.
+
+    Segments are matched by title. Only segments whose content hash differs are
+    loaded, so diffing mostly-identical versions reads almost nothing.
+    """
+    old = _load_manifest(story_name, old_version)
+    new = _load_manifest(story_name, new_version)
+    old_segments = {segment["title"]: segment["hash"] for segment in old["segments"]}
+    new_segments = {segment["title"]: segment["hash"] for segment in new["segments"]}
+    changed = []
+    for title in old_segments.keys() & new_segments.keys():
+        if old_segments[title] == new_segments[title]:
+            continue
+        before, after = _get_object(old_segments[title]), _get_object(new_segments[title])
+        changed.append({
+            "title": title,
+            "fields": sorted(key for key in before.keys() | after.keys() if before.get(key) != after.get(key)),
+        })
+    old_research, new_research = set(old["research"]), set(new["research"])
+    return {
+        "title_changed": old["title"] != new["title"],
+        "segments_added": [title for title in new_segments if title not in old_segments],
+        "segments_removed": [title for title in old_segments if title not in new_segments],
+        "segments_changed": changed,
+        "segment_order_changed": [t for t in old_segments if t in new_segments] != [t for t in new_segments if t in old_segments],
+        "research_chunks_added": len(new_research - old_research),
+        "research_chunks_removed": len(old_research - new_research),
+    }
+
+
+def delete_versions(story_name: str):
+    """Remove all version manifests of a story. Their objects are left for collect_garbage."""
+    manifest_dir = _manifest_dir(story_name)
+    if not os.path.exists(manifest_dir):
+        return
+    for filename in os.listdir(manifest_dir):
+        os.remove(os.path.join(manifest_dir, filename))
+    os.rmdir(manifest_dir)
+
+
+def collect_garbage() -> int:
+    """Delete objects no manifest references any more. Returns the number removed."""
+    referenced = set()
+    manifests_root = os.path.join(VERSION_STORAGE_DIR, "manifests")
+    for dirpath, _, filenames in os.walk(manifests_root):
+        for filename in filenames:
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(dirpath, filename), 'r') as f:
+                manifest = json.load(f)
+            referenced.update(segment["hash"] for segment in manifest["segments"])
+            referenced.update(manifest["research"])
+    removed = 0
+    for dirpath, _, filenames in os.walk(os.path.join(VERSION_STORAGE_DIR, "objects")):
+        for filename in filenames:
+            if filename.endswith(".json") and filename[:-len(".json")] not in referenced:
+                os.remove(os.path.join(dirpath, filename))
+                removed += 1
+    return removed
@@ -8,7 +8,15 @@ type CreateStoryProps = {
 
 export type StoryData = {
   title: string;
-  research_document: string;
+  research: {
+    kind: 'search' | 'note';
+    query: string;
+    title: string;
+    url: string;
+    snippet: string;
+    timestamp: number;
+  }[];
+  research_document?: string;
   segments: {
     title: string;
     text: string;
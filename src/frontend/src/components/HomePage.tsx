@@ -1,5 +1,6 @@
 import { Plus } from 'lucide-react';
 import { useState, useEffect } from 'react';
+import { resolveImageUrl } from '../imageUrl';
 
 type HomePageProps = {
   onCreateStory: () => void;
@@ -11,8 +12,18 @@ type Story = {
   title: string;
   modified_at: number;
   thumbnail?: string;
+  thumbnails?: Record<string, { webp: string; jpg: string }> | null;
 };
 
+// Card widths in the 1/2/3-column grid
+const THUMBNAIL_SIZES = '(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw';
+
+function thumbnailSrcSet(thumbnails: NonNullable<Story['thumbnails']>, format: 'webp' | 'jpg'): string {
+  return Object.entries(thumbnails)
+    .map(([width, variants]) => `${resolveImageUrl(variants[format])} ${width}w`)
+    .join(', ');
+}
+
 export function HomePage({ onCreateStory, onStorySelect }: HomePageProps) {
   const [stories, setStories] = useState<Story[]>([]);
   const [loading, setLoading] = useState(true);
@@ -60,7 +71,20 @@ export function HomePage({ onCreateStory, onStorySelect }: HomePageProps) {
                 >
                   {story.thumbnail && (
                     <div className="w-full h-48 overflow-hidden">
-                      <img src={story.thumbnail} alt={story.title} className="w-full h-full object-cover" />
+                      {story.thumbnails ? (
+                        <picture className="block w-full h-full">
+                          <source type="image/webp" srcSet={thumbnailSrcSet(story.thumbnails, 'webp')} sizes={THUMBNAIL_SIZES} />
+                          <img
+                            src={resolveImageUrl(Object.values(story.thumbnails)[0].jpg)}
+                            srcSet={thumbnailSrcSet(story.thumbnails, 'jpg')}
+                            sizes={THUMBNAIL_SIZES}
+                            alt={story.title}
+                            className="w-full h-full object-cover"
+                          />
+                        </picture>
+                      ) : (
+                        <img src={resolveImageUrl(story.thumbnail)} alt={story.title} className="w-full h-full object-cover" />
+                      )}
                     </div>
                   )}
                   <div className="p-6">
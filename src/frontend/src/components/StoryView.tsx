@@ -1,5 +1,6 @@
 import { ArrowLeft, BookOpen } from 'lucide-react';
 import { StoryData } from './CreateStory';
+import { resolveImageUrl } from '../imageUrl';
 
 type StoryViewProps = {
   story: StoryData;
@@ -42,7 +43,7 @@ export function StoryView({ story, onBack }: StoryViewProps) {
                         className="rounded-[2rem] overflow-hidden shadow-lg"
                       >
                         <img
-                          src={imageUrl}
+                          src={resolveImageUrl(imageUrl)}
                           alt={segment.title}
                           className="w-full h-auto object-cover"
                         />
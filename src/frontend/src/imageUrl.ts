@@ -0,0 +1,6 @@
+const API_BASE_URL = 'http://localhost:8000';
+
+// Stored images are referenced by API-relative paths like /images/<hash>.png
+export function resolveImageUrl(imageUrl: string): string {
+  return imageUrl.startsWith('/') ? `${API_BASE_URL}${imageUrl}` : imageUrl;
+}
@@ -0,0 +1,51 @@
+import base64
+import os
+
+import pytest
+
+from src.backend.stories import image_store
+from src.backend.stories.storage import JSONFileStorage, SQLiteStorage
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+DATA_URI = "data:image/png;base64," + base64.b64encode(PNG).decode()
+
+
+@pytest.fixture(autouse=True)
+def image_dir(tmp_path, monkeypatch):
+    # The catalog and search index of the JSON storage live under relative paths
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(image_store, "IMAGE_STORAGE_DIR", str(tmp_path / "images"))
+
+
+def inline_story():
+    return {"title": "Mars", "segments": [{"title": "Touchdown", "text": "", "images": [DATA_URI]}]}
+
+
+def test_save_image_is_content_addressed():
+    image_id = image_store.save_image(PNG)
+    assert image_store.save_image(PNG) == image_id
+    assert image_id.endswith(".png") and image_store.is_valid_image_id(image_id)
+    with open(image_store.image_path(image_id), "rb") as f:
+        assert f.read() == PNG
+    assert [name for _, _, files in os.walk(image_store.IMAGE_STORAGE_DIR) for name in files] == [image_id]
+
+
+def test_migrate_json_story_files(tmp_path):
+    storage = JSONFileStorage(story_dir=str(tmp_path / "stories"))
+    storage.save_story("mars", inline_story())
+    storage.save_story("venus", {"title": "Venus", "segments": []})
+    assert image_store.migrate_story_images(storage.story_dir) == 1
+    image = storage.load_story("mars")["segments"][0]["images"][0]
+    assert image.startswith(image_store.IMAGE_URL_PREFIX)
+    assert image_store.migrate_story_images(storage.story_dir) == 0
+    assert sorted(os.listdir(storage.story_dir)) == ["mars.json", "venus.json"]
+
+
+def test_migrate_sqlite_stories(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "stories.db"))
+    storage.save_story("mars", inline_story())
+    version = storage.story_version("mars")
+    assert image_store.migrate_storage_images(storage) == 1
+    assert storage.load_story("mars")["segments"][0]["images"][0].startswith(image_store.IMAGE_URL_PREFIX)
+    assert storage.story_version("mars") != version
+    assert image_store.migrate_storage_images(storage) == 0
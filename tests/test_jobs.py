@@ -0,0 +1,234 @@
+import threading
+import time
+
+import pytest
+
+from src.backend.api import jobs
+from src.backend.api.jobs import (
+    JOB_FAILED, JOB_RUNNING, JOB_SUCCEEDED, GenerationJobQueue, GenerationLease, JobAbandoned, QueueFullError, flight_key,
+)
+
+
+class FakeStory:
+    def __init__(self, topic):
+        self.location = f"src/backend/stories/json_storage/{topic}.json"
+
+
+class BlockingGenerator:
+    """Stands in for run_story_generation, holding every job until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, topic, on_event=None, job_id=None):
+        with self.lock:
+            self.calls.append((topic, job_id))
+        self.started.set()
+        assert self.release.wait(10)
+        return FakeStory(topic)
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    # Leases and traces live under relative paths
+    monkeypatch.chdir(tmp_path)
+    generator = BlockingGenerator()
+    queue = GenerationJobQueue(generator, db_path=str(tmp_path / "jobs.db"), max_workers=2, max_queued=1)
+    queue.start()
+    yield queue, generator
+    generator.release.set()
+    executor = queue.executor
+    queue.shutdown()
+    # Let running jobs write their traces before leaving tmp_path
+    executor.shutdown(wait=True)
+
+
+def test_concurrent_submits_share_one_job(queue):
+    queue, generator = queue
+    results = []
+
+    def submit():
+        results.append(queue.submit("Mars rover landing"))
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({job_id for job_id, _ in results}) == 1
+    assert len({id(future) for _, future in results}) == 1
+    generator.release.set()
+    story = results[0][1].result(timeout=10)
+    assert story.location.endswith("Mars rover landing.json")
+    assert len(generator.calls) == 1
+    assert generator.calls[0][1] == results[0][0]
+    assert queue.get_job(results[0][0])["status"] == JOB_SUCCEEDED
+
+
+def test_joining_reports_running_status(queue):
+    queue, generator = queue
+    job_id, _ = queue.submit("Mars rover landing")
+    assert generator.started.wait(10)
+    joined_id, _ = queue.submit("mars rover landing")
+    assert joined_id == job_id
+    assert queue.get_job(joined_id)["status"] == JOB_RUNNING
+
+
+def test_topic_can_run_again_after_landing(queue):
+    queue, generator = queue
+    generator.release.set()
+    first_id, future = queue.submit("Mars rover landing")
+    future.result(timeout=10)
+    second_id, future = queue.submit("Mars rover landing")
+    future.result(timeout=10)
+    assert first_id != second_id
+
+
+def test_queue_full(queue):
+    queue, _ = queue
+    for topic in ("one", "two", "three"):
+        queue.submit(topic)
+    with pytest.raises(QueueFullError):
+        queue.submit("four")
+    # Joining a running topic needs no capacity
+    queue.submit("one")
+
+
+def test_unnamed_lease_times_out_without_blocking_other_topics(queue, monkeypatch):
+    queue, generator = queue
+    monkeypatch.setattr(jobs, "LEASE_NAMING_TIMEOUT_SECONDS", 0.5)
+    # Another process holding the topic's lock before writing its job ID
+    other = GenerationLease(flight_key("Mars rover landing"))
+    assert other.acquire("")
+    errors = []
+
+    def submit_blocked():
+        try:
+            queue.submit("Mars rover landing")
+        except QueueFullError as e:
+            errors.append(e)
+
+    blocked = threading.Thread(target=submit_blocked)
+    blocked.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    job_id, _ = queue.submit("Venus probe")
+    assert time.monotonic() - started < 0.4
+    blocked.join(5)
+    assert len(errors) == 1
+    assert job_id
+    other.release()
+
+
+def test_follows_job_of_another_process(queue):
+    queue, generator = queue
+    other = GenerationLease(flight_key("Mars rover landing"))
+    assert other.acquire("other-process-job")
+    job_id, future = queue.submit("Mars rover landing")
+    assert job_id == "other-process-job"
+    assert not future.done()
+    assert generator.calls == []
+    # The other process exiting mid-job hands the topic to this one
+    other.release()
+    generator.release.set()
+    assert future.result(timeout=10).location.endswith("Mars rover landing.json")
+
+
+class EventGenerator(BlockingGenerator):
+    """Stands in for run_story_generation, sending progress events until released."""
+
+    def __call__(self, topic, on_event=None, job_id=None):
+        with self.lock:
+            self.calls.append((topic, job_id))
+        self.started.set()
+        while not self.release.wait(0.01):
+            on_event({"event": "tool_started", "tool": "perplexity_search"})
+        return FakeStory(topic)
+
+
+@pytest.fixture
+def event_queue(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generator = EventGenerator()
+    queue = GenerationJobQueue(generator, db_path=str(tmp_path / "jobs.db"), max_workers=2, max_queued=1)
+    queue.start()
+    yield queue, generator
+    generator.release.set()
+    executor = queue.executor
+    queue.shutdown()
+    executor.shutdown(wait=True)
+
+
+class Stream:
+    """A streaming client's on_event, raising once the client disconnects."""
+
+    def __init__(self):
+        self.events = []
+        self.disconnected = threading.Event()
+
+    def __call__(self, event):
+        if self.disconnected.is_set():
+            raise RuntimeError("Client disconnected")
+        self.events.append(event)
+
+
+def test_stream_disconnect_abandons_job_once_waiters_left(event_queue):
+    queue, generator = event_queue
+    stream = Stream()
+    job_id, future = queue.submit("Mars rover landing", on_event=stream)
+    queue.submit("Mars rover landing")
+    queue.leave(job_id)
+    stream.disconnected.set()
+    with pytest.raises(RuntimeError, match="Client disconnected"):
+        future.result(timeout=10)
+    assert queue.get_job(job_id)["status"] == JOB_FAILED
+
+
+def test_waiting_caller_keeps_job_alive_after_stream_disconnects(event_queue):
+    queue, generator = event_queue
+    stream = Stream()
+    job_id, future = queue.submit("Mars rover landing", on_event=stream)
+    queue.submit("Mars rover landing")
+    stream.disconnected.set()
+    time.sleep(0.1)
+    assert not future.done()
+    generator.release.set()
+    assert future.result(timeout=10).location.endswith("Mars rover landing.json")
+
+
+def test_job_everyone_left_is_abandoned(event_queue):
+    queue, generator = event_queue
+    job_id, future = queue.submit("Mars rover landing")
+    queue.submit("Mars rover landing")
+    queue.leave(job_id)
+    time.sleep(0.05)
+    assert not future.done()
+    queue.leave(job_id)
+    with pytest.raises(JobAbandoned):
+        future.result(timeout=10)
+    # Leaving a finished job does nothing
+    queue.leave(job_id)
+
+
+def test_followed_job_relays_events_and_abandons_on_disconnect(event_queue):
+    queue, generator = event_queue
+    other = GenerationLease(flight_key("Mars rover landing"))
+    assert other.acquire("other-process-job")
+    stream = Stream()
+    job_id, future = queue.submit("Mars rover landing", on_event=stream)
+    assert job_id == "other-process-job"
+    # The other process exits mid-job, so this one generates the topic and relays its progress
+    other.release()
+    assert generator.started.wait(10)
+    deadline = time.monotonic() + 10
+    while not stream.events and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stream.events
+    stream.disconnected.set()
+    with pytest.raises(RuntimeError, match="Client disconnected"):
+        future.result(timeout=10)
+    assert queue.get_job(generator.calls[0][1])["status"] == JOB_FAILED
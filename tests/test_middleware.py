@@ -0,0 +1,124 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from src.backend.agents.middleware import MIN_COMPACT_CHARS, ContextWindowMiddleware, _estimate_tokens, compact_messages
+
+BIG = "x" * (MIN_COMPACT_CHARS * 2)
+
+
+def conversation(turns: int, tool="perplexity_search"):
+    """A user message, then turns model turns each making one tool call with a large result."""
+    messages = [HumanMessage("Write a story about the Mars rover landing")]
+    for turn in range(turns):
+        call_id = f"call_{turn}"
+        messages.append(AIMessage("", tool_calls=[{"id": call_id, "name": tool, "args": {"query": f"q{turn}"}}]))
+        messages.append(ToolMessage(f"{turn}:{BIG}", tool_call_id=call_id, name=tool))
+    return messages
+
+
+def kept_whole(messages):
+    """Turn numbers whose tool results were sent whole."""
+    return [int(message.content.split(":")[0]) for message in messages
+            if message.type == "tool" and not message.content.startswith("[Result of")]
+
+
+def assert_pairs_preserved(original, compacted):
+    assert len(compacted) == len(original)
+    for before, after in zip(original, compacted):
+        assert after.type == before.type
+        if before.type == "ai":
+            assert after is before
+        if before.type == "tool":
+            assert (after.tool_call_id, after.name) == (before.tool_call_id, before.name)
+    calls = {call["id"] for message in compacted if message.type == "ai" for call in message.tool_calls}
+    assert {message.tool_call_id for message in compacted if message.type == "tool"} == calls
+
+
+def test_keep_turns_zero_still_keeps_latest_turn():
+    messages = conversation(4)
+    compacted, saved = compact_messages(messages, keep_turns=0, token_budget=10**6)
+    assert kept_whole(compacted) == [3]
+    assert saved > 0
+    assert_pairs_preserved(messages, compacted)
+
+
+def test_keep_turns_one():
+    messages = conversation(4)
+    compacted, _ = compact_messages(messages, keep_turns=1, token_budget=10**6)
+    assert kept_whole(compacted) == [3]
+    assert_pairs_preserved(messages, compacted)
+
+
+def test_keep_turns_n():
+    messages = conversation(5)
+    compacted, _ = compact_messages(messages, keep_turns=3, token_budget=10**6)
+    assert kept_whole(compacted) == [2, 3, 4]
+    compacted, saved = compact_messages(messages, keep_turns=10, token_budget=10**6)
+    assert kept_whole(compacted) == [0, 1, 2, 3, 4]
+    assert saved == 0
+    assert_pairs_preserved(messages, compacted)
+
+
+def test_compacted_results_keep_a_reference():
+    messages = conversation(2)
+    compacted, _ = compact_messages(messages, keep_turns=1, token_budget=10**6,
+                                    hints={"perplexity_search": "Search again if needed."})
+    reference = compacted[2].content
+    assert reference.startswith('[Result of perplexity_search({"query": "q0"})')
+    assert reference.endswith("Search again if needed.]")
+    assert messages[2].content.startswith("0:")
+
+
+def test_short_results_are_never_compacted():
+    messages = conversation(3)
+    messages[2] = ToolMessage("short", tool_call_id="call_0", name="perplexity_search")
+    compacted, _ = compact_messages(messages, keep_turns=0, token_budget=0)
+    assert compacted[2] is messages[2]
+
+
+def test_superseded_snapshots_are_compacted():
+    messages = conversation(3, tool="get_story")
+    compacted, _ = compact_messages(messages, keep_turns=10, token_budget=10**6, snapshot_tools={"get_story"})
+    assert kept_whole(compacted) == [2]
+    assert_pairs_preserved(messages, compacted)
+
+
+def test_budget_compacts_oldest_first_but_not_latest_turn():
+    messages = conversation(4)
+    two_turns, _ = compact_messages(messages, keep_turns=2, token_budget=10**6)
+    budget = sum(_estimate_tokens(message) for message in two_turns)
+    compacted, _ = compact_messages(messages, keep_turns=10, token_budget=budget)
+    assert kept_whole(compacted) == [2, 3]
+    compacted, _ = compact_messages(messages, keep_turns=10, token_budget=0)
+    assert kept_whole(compacted) == [3]
+    assert_pairs_preserved(messages, compacted)
+
+
+def test_tool_results_answering_the_latest_turn_in_parallel_are_kept():
+    messages = conversation(1)
+    messages.append(AIMessage("", tool_calls=[{"id": "a", "name": "perplexity_search", "args": {}},
+                                              {"id": "b", "name": "perplexity_search", "args": {}}]))
+    messages.append(ToolMessage(f"1:{BIG}", tool_call_id="a", name="perplexity_search"))
+    messages.append(ToolMessage(f"2:{BIG}", tool_call_id="b", name="perplexity_search"))
+    compacted, _ = compact_messages(messages, keep_turns=0, token_budget=0)
+    assert kept_whole(compacted) == [1, 2]
+    assert_pairs_preserved(messages, compacted)
+
+
+class FakeRequest:
+    def __init__(self, messages):
+        self.messages = messages
+
+    def override(self, messages):
+        return FakeRequest(messages)
+
+
+def test_middleware_sends_compacted_messages():
+    middleware = ContextWindowMiddleware("test", keep_turns=1)
+    messages = conversation(3)
+    sent = []
+    middleware.wrap_model_call(FakeRequest(messages), lambda request: sent.append(request.messages))
+    assert kept_whole(sent[0]) == [2]
+    # Nothing to compact: the request is passed on unchanged
+    request = FakeRequest(conversation(1))
+    middleware.wrap_model_call(request, lambda received: sent.append(received))
+    assert sent[1] is request
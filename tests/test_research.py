@@ -0,0 +1,49 @@
+from src.backend.stories.research import ResearchStore, note_chunk, render_document, search_chunks
+
+
+def result(url, snippet, title=""):
+    return {"url": url, "snippet": snippet, "title": title}
+
+
+def test_duplicate_urls_and_snippets_are_dropped():
+    store = ResearchStore()
+    added = store.add(search_chunks("mars rover", [
+        result("https://nasa.gov/a", "Perseverance landed in Jezero crater."),
+        result("https://nasa.gov/b", "Ingenuity flew on Mars."),
+    ], timestamp=1.0))
+    assert len(added) == 2
+    added = store.add(search_chunks("mars rover landing", [
+        result("https://nasa.gov/a", "A different snippet from the same page."),
+        result("https://example.com/copy", "  perseverance   LANDED in Jezero crater. "),
+        result("https://esa.int/c", "Sample tubes were left on the surface."),
+    ], timestamp=2.0))
+    assert [chunk["url"] for chunk in added] == ["https://esa.int/c"]
+    assert len(store) == 3
+
+
+def test_empty_snippets_are_only_deduplicated_by_url():
+    store = ResearchStore()
+    store.add(search_chunks("q", [result("https://a.com", ""), result("https://b.com", "")], timestamp=1.0))
+    assert len(store) == 2
+    store.add([note_chunk("", timestamp=2.0), note_chunk("", timestamp=3.0)])
+    assert len(store) == 4
+
+
+def test_reloaded_store_keeps_deduplicating():
+    store = ResearchStore()
+    store.add(search_chunks("q", [result("https://a.com", "First")], timestamp=1.0))
+    reloaded = ResearchStore(store.to_json())
+    assert reloaded.add(search_chunks("q", [result("https://a.com", "Again")], timestamp=2.0)) == []
+    assert reloaded.add([note_chunk("first")]) == []
+
+
+def test_render_groups_results_of_one_search():
+    chunks = search_chunks("mars", [result("https://a.com", "One", "A"), result("https://b.com", "Two", "B")], timestamp=1.0)
+    chunks.append(note_chunk("A note", timestamp=2.0))
+    document = render_document(chunks)
+    assert document.count("--- Search Query: mars ---") == 1
+    assert document.endswith("\nA note")
+    store = ResearchStore(chunks)
+    assert store.render() == document
+    store.add([note_chunk("Another note")])
+    assert store.render().endswith("\nAnother note")
@@ -0,0 +1,53 @@
+from src.backend.stories.research_index import ResearchIndex, tokenize
+from src.backend.stories.research import ResearchStore, note_chunk
+
+
+def index_of(*texts):
+    index = ResearchIndex()
+    for text in texts:
+        index.add(text)
+    return index
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("The rover landed, in 2021!") == ["rover", "landed", "2021"]
+
+
+def test_rare_terms_outweigh_common_ones():
+    index = index_of(
+        "mars rover mission overview",
+        "mars rover perseverance landing jezero",
+        "mars rover curiosity gale crater",
+    )
+    assert [doc_id for doc_id, _ in index.search("mars jezero")][0] == 1
+
+
+def test_shorter_documents_rank_higher_for_the_same_matches():
+    index = index_of(
+        "jezero crater delta sediments layered rock outcrop river lake ancient",
+        "jezero crater",
+        "gale crater",
+    )
+    results = index.search("jezero")
+    assert [doc_id for doc_id, _ in results] == [1, 0]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_ties_keep_insertion_order_and_k_limits():
+    index = index_of("ingenuity helicopter", "ingenuity helicopter", "ingenuity helicopter")
+    assert [doc_id for doc_id, _ in index.search("helicopter", k=2)] == [0, 1]
+
+
+def test_no_matches():
+    assert index_of("mars rover").search("venus") == []
+    assert index_of("mars rover").search("the and of") == []
+    assert ResearchIndex().search("mars") == []
+
+
+def test_store_search_returns_chunks_with_scores():
+    store = ResearchStore([note_chunk("Perseverance landed in Jezero crater."), note_chunk("Ingenuity flew on Mars.")])
+    passages = store.search("ingenuity flight", k=5)
+    assert [passage["snippet"] for passage in passages] == ["Ingenuity flew on Mars."]
+    assert passages[0]["score"] > 0
+    store.clear()
+    assert store.search("ingenuity") == []
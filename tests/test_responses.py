@@ -0,0 +1,147 @@
+import base64
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend.api import main
+from src.backend.api.responses import decode_cursor, encode_cursor, is_not_modified, parse_paths, project, stream_json
+from src.backend.stories import storage
+from src.backend.stories.storage import JSONFileStorage, SQLiteStorage
+
+STORY = {
+    "title": "Mars rover landing",
+    "research": [{"url": "https://nasa.gov", "snippet": "Landed"}],
+    "segments": [
+        {"title": "Launch", "text": "July 2020", "images": [{"url": "/images/a.png", "caption": "Liftoff"}]},
+        {"title": "Touchdown", "text": "February 2021", "images": []},
+    ],
+}
+
+
+def test_parse_paths():
+    assert parse_paths("title, segments.title,segments.text,,") == {"title": None, "segments": {"title": None, "text": None}}
+    # A whole field wins over paths inside it, in either order
+    assert parse_paths("segments,segments.title") == {"segments": None}
+    assert parse_paths("segments.title,segments") == {"segments": None}
+
+
+def test_nested_fields_projection():
+    assert project(STORY, fields="title,segments.title,segments.images.caption") == {
+        "title": "Mars rover landing",
+        "segments": [
+            {"title": "Launch", "images": [{"caption": "Liftoff"}]},
+            {"title": "Touchdown", "images": []},
+        ],
+    }
+    assert project(STORY, fields="missing,segments.missing") == {"segments": [{}, {}]}
+
+
+def test_nested_exclude_projection():
+    projected = project(STORY, exclude="research,segments.images.url")
+    assert "research" not in projected
+    assert projected["segments"][0]["images"] == [{"caption": "Liftoff"}]
+    assert projected["segments"][1]["text"] == "February 2021"
+    assert project(STORY, fields="segments", exclude="segments.images") == {
+        "segments": [{"title": "Launch", "text": "July 2020"}, {"title": "Touchdown", "text": "February 2021"}],
+    }
+    assert project(STORY) is STORY
+
+
+@pytest.mark.parametrize("value", [STORY, {}, [], {"a": {"b": [1, {"c": None}]}, "d": "é\\\""}, "text", 3.5, None])
+def test_stream_json_round_trips(value):
+    assert json.loads("".join(stream_json(value))) == value
+
+
+def test_stream_json_chunks():
+    story = {**STORY, "segments": [{"title": str(i), "text": "x" * 100} for i in range(50)]}
+    chunks = list(stream_json(story, chunk_bytes=500))
+    assert len(chunks) > 5
+    assert all(len(chunk) < 1000 for chunk in chunks)
+    assert json.loads("".join(chunks)) == story
+
+
+def test_cursor_round_trip():
+    entry = {"modified_at": 1700000000.123456, "filename": "Mars, rover \"landing\".json"}
+    assert decode_cursor(encode_cursor(entry)) == (entry["modified_at"], entry["filename"])
+    assert "=" not in encode_cursor(entry)
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "!!!",
+    "not base64",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    raw_cursor([1.0]),
+    raw_cursor([1.0, "a.json", "extra"]),
+    raw_cursor({"modified_at": 1.0, "filename": "a.json"}),
+    raw_cursor(5),
+    raw_cursor("12"),
+    raw_cursor(["yesterday", "a.json"]),
+    raw_cursor([1.0, None]),
+    raw_cursor([True, "a.json"]),
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_if_none_match():
+    etags = ['"abc"', '"abc-gzip"']
+    assert is_not_modified({"if-none-match": '"abc-gzip"'}, etags)
+    assert is_not_modified({"if-none-match": 'W/"abc", "other"'}, etags)
+    assert is_not_modified({"if-none-match": "*"}, etags)
+    assert not is_not_modified({"if-none-match": '"other"'}, etags)
+    # If-None-Match takes precedence over If-Modified-Since
+    assert not is_not_modified({"if-none-match": '"other"', "if-modified-since": "Thu, 01 Jan 2099 00:00:00 GMT"}, etags, 10.0)
+
+
+def test_if_modified_since():
+    assert is_not_modified({"if-modified-since": "Thu, 01 Jan 1970 00:00:10 GMT"}, [], 10.9)
+    assert not is_not_modified({"if-modified-since": "Thu, 01 Jan 1970 00:00:10 GMT"}, [], 11.0)
+    assert not is_not_modified({"if-modified-since": "garbage"}, [], 10.0)
+    assert not is_not_modified({}, [], 10.0)
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def tied_storage(request, tmp_path, monkeypatch):
+    """A storage of five stories all modified at the same instant."""
+    monkeypatch.chdir(tmp_path)
+    source = JSONFileStorage(story_dir="src/backend/stories/json_storage")
+    for i in range(5):
+        source.save_story(f"story{i}", {"title": f"Story {i}", "segments": []})
+        os.utime(source.story_path(f"story{i}"), (1700000000.5, 1700000000.5))
+    if request.param == "json":
+        source.refresh_index()
+        backend = source
+    else:
+        backend = SQLiteStorage(str(tmp_path / "stories.db"))
+        backend.import_json(source)
+    monkeypatch.setattr(storage, "_storage", backend)
+    return backend
+
+
+def test_cursor_pages_through_tied_modified_at(tied_storage):
+    client = TestClient(main.app)
+    seen = []
+    cursor = None
+    for _ in range(10):
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/stories", params=params)
+        assert response.status_code == 200
+        seen += [story["filename"] for story in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert sorted(seen) == [f"story{i}.json" for i in range(5)]
+    assert len(seen) == 5
+
+
+def test_malformed_cursor_is_400(tied_storage):
+    response = TestClient(main.app).get("/stories", params={"limit": 2, "cursor": raw_cursor("12")})
+    assert response.status_code == 400
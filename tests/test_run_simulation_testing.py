@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from src.backend.evaluations import run_simulation_testing
+from src.backend.stories import storage
+
+
+class FailingNewsAgent:
+    discarded = []
+
+    def __init__(self, story, thread_id=None):
+        self.story = story
+        self.thread_id = thread_id
+
+    def has_checkpoint(self):
+        return False
+
+    def invoke(self, input):
+        self.story.title = "Half written"
+        self.story.add_segment("Opening")
+        self.story.save_to_file()
+        raise RuntimeError("Model call failed")
+
+    def discard(self):
+        FailingNewsAgent.discarded.append(self.thread_id)
+
+
+@pytest.fixture(autouse=True)
+def story_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "_storage", storage.JSONFileStorage())
+    monkeypatch.setattr(run_simulation_testing, "NewsAgent", FailingNewsAgent)
+    FailingNewsAgent.discarded = []
+
+
+def stored_stories():
+    return [entry["filename"] for entry in storage.get_storage().list_stories()]
+
+
+def test_failed_topic_is_cleaned_up():
+    with pytest.raises(RuntimeError):
+        run_simulation_testing.simulate_topic(0)
+    assert stored_stories() == []
+    assert FailingNewsAgent.discarded == [None]
+
+
+def test_failed_batch_topic_is_kept_to_resume():
+    with pytest.raises(RuntimeError):
+        run_simulation_testing.simulate_topic(0, run_id="batch")
+    assert stored_stories() == ["simulation_story_batch_0.json"]
+    assert FailingNewsAgent.discarded == []
+    assert os.path.exists("src/backend/stories/json_storage/simulation_story_batch_0.json.journal")
@@ -0,0 +1,103 @@
+import pytest
+
+from src.backend.stories import search_index
+
+
+@pytest.fixture
+def conn(tmp_path):
+    with search_index.connect(str(tmp_path / "search_index.db")) as conn:
+        yield conn
+
+
+def index(conn, name, title, *texts):
+    segments = [{"title": f"Part {i}", "text": text} for i, text in enumerate(texts)]
+    search_index.index_story(conn, name, {"title": title, "segments": segments}, 1.0)
+
+
+def test_match_expression_quotes_every_word():
+    assert search_index.match_expression("Mars rover") == '"mars" "rover"*'
+    assert search_index.match_expression("  ") == ""
+    assert search_index.match_expression('"*()') == ""
+
+
+@pytest.mark.parametrize("query", [
+    'mars "rover',
+    'rover"',
+    "rov*",
+    "*",
+    "mars NEAR rover",
+    "NEAR(mars rover)",
+    "(mars",
+    "mars)",
+    "mars AND OR NOT",
+    "title:mars",
+    "mars ^rover",
+    "-mars",
+    "'",
+])
+def test_operator_characters_never_raise(conn, query):
+    index(conn, "mars", "Mars rover landing", "Perseverance touched down near Jezero.")
+    page = search_index.search(conn, query)
+    assert page["query"] == query
+    assert page["total"] == len(page["results"])
+
+
+def test_operator_words_match_literally(conn):
+    index(conn, "mars", "Mars rover landing", "The rover landed near the delta.")
+    index(conn, "venus", "Venus probe", "No rover here, just clouds.")
+    assert [r["filename"] for r in search_index.search(conn, "near delta")["results"]] == ["mars.json"]
+    assert search_index.search(conn, "mars NOT rover")["total"] == 0
+
+
+def test_last_word_matches_as_prefix(conn):
+    index(conn, "mars", "Mars rover landing", "Perseverance touched down.")
+    assert search_index.search(conn, "persev")["total"] == 1
+    assert search_index.search(conn, "persev touched")["total"] == 0
+
+
+def test_snippets_escape_story_text(conn):
+    index(conn, "xss", "Script story", 'The rover said <script>alert("x")</script> & left.')
+    snippet = search_index.search(conn, "rover")["results"][0]["snippet"]
+    assert "<script>" not in snippet
+    assert "&lt;script&gt;" in snippet
+    assert "&amp;" in snippet
+    assert "<mark>rover</mark>" in snippet
+    assert search_index._MATCH_START not in snippet and search_index._MATCH_END not in snippet
+
+
+def test_title_matches_rank_first(conn):
+    index(conn, "body", "Space news", "Jezero crater was explored by the rover.")
+    index(conn, "title", "Jezero crater", "A crater on Mars.")
+    results = search_index.search(conn, "jezero")["results"]
+    assert [r["filename"] for r in results] == ["title.json", "body.json"]
+    assert results[0]["score"] > results[1]["score"]
+
+
+def test_total_and_offset_pagination(conn):
+    for i in range(5):
+        index(conn, f"story{i}", f"Rover story {i}", "rover " * (i + 1))
+    first = search_index.search(conn, "rover", limit=2)
+    second = search_index.search(conn, "rover", limit=2, offset=2)
+    third = search_index.search(conn, "rover", limit=2, offset=4)
+    assert first["total"] == second["total"] == third["total"] == 5
+    names = [r["filename"] for page in (first, second, third) for r in page["results"]]
+    assert len(third["results"]) == 1
+    assert sorted(names) == [f"story{i}.json" for i in range(5)]
+    assert search_index.search(conn, "rover", offset=10)["results"] == []
+
+
+def test_limit_and_offset_are_clamped(conn):
+    index(conn, "mars", "Mars rover", "")
+    page = search_index.search(conn, "mars", limit=10_000, offset=-3)
+    assert (page["limit"], page["offset"]) == (search_index.MAX_RESULTS_PER_PAGE, 0)
+    assert search_index.search(conn, "mars", limit=0)["limit"] == 1
+
+
+def test_reindex_and_remove(conn):
+    index(conn, "mars", "Mars rover", "")
+    index(conn, "mars", "Venus probe", "")
+    assert search_index.search(conn, "mars")["total"] == 0
+    assert search_index.search(conn, "venus")["total"] == 1
+    search_index.remove_story(conn, "mars")
+    search_index.remove_story(conn, "mars")
+    assert search_index.search(conn, "venus")["total"] == 0
@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from src.backend.stories import storage
+from src.backend.stories.storage import JSONFileStorage, SQLiteStorage
+
+
+@pytest.fixture(autouse=True)
+def storage_dir(tmp_path, monkeypatch):
+    # The JSON backend's catalog and search index live under relative paths
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "json":
+        return JSONFileStorage(story_dir=str(tmp_path / "stories"), report_dir=str(tmp_path / "reports"))
+    return SQLiteStorage(str(tmp_path / "stories.db"))
+
+
+def story(title, text="", images=()):
+    return {"title": title, "research": [], "segments": [{"title": "Opening", "text": text, "images": list(images)}]}
+
+
+def save_in_order(backend, *names):
+    for name in names:
+        backend.save_story(name, story(f"Story of {name}", f"All about {name}"))
+        # Distinct modification times, so listings have a defined order
+        time.sleep(0.01)
+
+
+def test_save_load_delete(backend):
+    assert backend.load_story("mars") is None
+    assert backend.story_version("mars") is None
+    version = backend.save_story("mars", story("Mars"))
+    assert backend.story_exists("mars")
+    assert backend.story_version("mars") == version
+    assert backend.load_story("mars") == story("Mars")
+    time.sleep(0.01)
+    assert backend.save_story("mars", story("Mars again")) != version
+    assert backend.delete_story("mars")
+    assert not backend.story_exists("mars")
+    assert not backend.delete_story("mars")
+
+
+def test_list_stories_pages_newest_first(backend):
+    save_in_order(backend, "mars", "venus", "jupiter")
+    listed = backend.list_stories()
+    assert [entry["filename"] for entry in listed] == ["jupiter.json", "venus.json", "mars.json"]
+    assert listed[0]["title"] == "Story of jupiter"
+    first_page = backend.list_stories(limit=2)
+    last = first_page[-1]
+    second_page = backend.list_stories(limit=2, after=(last["modified_at"], last["filename"]))
+    assert [entry["filename"] for entry in first_page + second_page] == [entry["filename"] for entry in listed]
+
+
+def test_search_stories(backend):
+    save_in_order(backend, "mars", "venus")
+    results = backend.search_stories("venus")
+    assert results["total"] == 1
+    assert results["results"][0]["filename"] == "venus.json"
+    backend.delete_story("venus")
+    assert backend.search_stories("venus")["total"] == 0
+
+
+def test_reports(backend):
+    backend.save_report("mars_report", {"accuracy_report": {"Metric": 0.9}}, story_name="mars")
+    time.sleep(0.01)
+    backend.save_report("venus_report", {"accuracy_report": {"Metric": 0.4}}, story_name="venus")
+    assert backend.load_report("mars_report") == {"accuracy_report": {"Metric": 0.9}}
+    assert backend.load_report("missing") is None
+    assert [report["name"] for report in backend.list_reports()] == ["venus_report", "mars_report"]
+    assert [report["name"] for report in backend.list_reports(story_name="mars")] == ["mars_report"]
+    assert backend.list_reports(story_name="mars")[0]["story_name"] == "mars"
+    assert [report["name"] for report in backend.list_reports(min_accuracy=0.5)] == ["mars_report"]
+
+
+def test_import_json(tmp_path):
+    source = JSONFileStorage(story_dir=str(tmp_path / "stories"), report_dir=str(tmp_path / "reports"))
+    save_in_order(source, "mars", "venus")
+    source.save_report("mars_report", {"accuracy_report": {"Metric": 0.9}}, story_name="mars")
+    with open(os.path.join(source.story_dir, "broken.json"), "w") as f:
+        f.write("{")
+    target = SQLiteStorage(str(tmp_path / "stories.db"))
+    assert target.import_json(source) == (2, 1)
+    for name in ("mars", "venus"):
+        assert target.load_story(name) == source.load_story(name)
+    # File modification times carry over, so listings keep their order
+    assert [entry["filename"] for entry in target.list_stories()] == ["venus.json", "mars.json"]
+    assert target.list_reports(story_name="mars")[0]["name"] == "mars_report"
+    assert target.search_stories("venus")["total"] == 1
+
+
+def test_old_topic_column_is_dropped(tmp_path):
+    db_path = str(tmp_path / "stories.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""CREATE TABLE stories (name TEXT PRIMARY KEY, title TEXT NOT NULL, topic TEXT NOT NULL,
+                    created_at REAL NOT NULL, modified_at REAL NOT NULL, size INTEGER NOT NULL, thumbnail TEXT)""")
+    conn.execute("CREATE INDEX stories_topic ON stories (topic)")
+    conn.execute("INSERT INTO stories VALUES ('mars', 'Mars', 'mars', 1, 1, 2, NULL)")
+    conn.commit()
+    conn.close()
+    backend = SQLiteStorage(db_path)
+    backend.save_story("venus", story("Venus"))
+    assert [entry["filename"] for entry in backend.list_stories()] == ["venus.json", "mars.json"]
+    conn = sqlite3.connect(db_path)
+    assert "topic" not in [row[1] for row in conn.execute("PRAGMA table_info(stories)")]
+    conn.close()
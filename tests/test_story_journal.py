@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from src.backend.stories import storage
+from src.backend.stories.journal import SNAPSHOT_SEQ_KEY, StoryJournal, read_journal
+from src.backend.stories.story_structure import StoryStructure, has_pending_journal, read_story
+
+
+@pytest.fixture(autouse=True)
+def story_dir(tmp_path, monkeypatch):
+    # Stories and their journals live under relative paths
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "_storage", storage.JSONFileStorage())
+
+
+def write_story(name="Mars rover landing"):
+    story = StoryStructure(name, journaled=True)
+    story.add_segment("Launch", "The rover launched in July 2020.")
+    story.add_segment("Touchdown")
+    story.write_story_section("Touchdown", "text", "It landed in Jezero crater.")
+    return story
+
+
+def reload(name="Mars rover landing"):
+    story = StoryStructure(name, journaled=True)
+    story.load_from_file()
+    return story
+
+
+def test_append_numbers_records(tmp_path):
+    journal = StoryJournal(str(tmp_path / "story.json.journal"), fsync_policy="never")
+    journal.append("add_segment", ["Launch"], {})
+    journal.append("add_segment", ["Touchdown"], {"text": "Landed"})
+    records = read_journal(journal.path)
+    assert [(record["seq"], record["op"], record["args"]) for record in records] == [
+        (1, "add_segment", ["Launch"]),
+        (2, "add_segment", ["Touchdown"]),
+    ]
+    assert records[1]["kwargs"] == {"text": "Landed"}
+    assert [record["seq"] for record in read_journal(journal.path, after_seq=1)] == [2]
+    assert journal.pending_ops == 2
+
+
+def test_truncated_last_record_is_ignored(tmp_path):
+    journal = StoryJournal(str(tmp_path / "story.json.journal"), fsync_policy="never")
+    journal.append("add_segment", ["Launch"], {})
+    with open(journal.path, "a") as f:
+        f.write('{"seq": 2, "op": "add_seg')
+    assert [record["seq"] for record in read_journal(journal.path)] == [1]
+
+
+def test_mutations_are_journaled_not_saved():
+    story = write_story()
+    assert not story.storage.story_exists(story.name)
+    assert has_pending_journal(story.name)
+    ops = [record["op"] for record in read_journal(story.journal.path)]
+    assert ops == ["clear", "add_segment", "add_segment", "write_story_section"]
+
+
+def test_reload_mid_journal_replays_operations():
+    story = write_story()
+    reloaded = reload()
+    assert reloaded.segments == story.segments
+    assert reloaded.journal.seq == story.journal.seq
+    assert read_story(story.name)["segments"] == story.segments
+    # Operations after the reload continue the sequence and replay on the next load
+    reloaded.add_segment("Samples")
+    assert [segment["title"] for segment in reload().segments] == ["Launch", "Touchdown", "Samples"]
+    seqs = [record["seq"] for record in read_journal(story.journal.path)]
+    assert seqs == sorted(set(seqs))
+
+
+def test_compact_writes_snapshot_and_empties_journal():
+    story = write_story()
+    story.compact()
+    assert not has_pending_journal(story.name)
+    stored = story.storage.load_story(story.name)
+    assert stored[SNAPSHOT_SEQ_KEY] == story.journal.seq
+    assert stored["segments"] == story.segments
+    story.add_segment("Samples")
+    assert has_pending_journal(story.name)
+    assert [segment["title"] for segment in reload().segments] == ["Launch", "Touchdown", "Samples"]
+
+
+def test_crash_between_snapshot_and_truncation_applies_nothing_twice():
+    story = write_story()
+    # The snapshot was written but the process died before the journal was emptied
+    story.storage.save_story(story.name, {**story.to_json(), SNAPSHOT_SEQ_KEY: story.journal.seq}, durable=True)
+    assert has_pending_journal(story.name)
+    assert reload().segments == story.segments
+
+
+def test_save_compacts_once_enough_operations_accumulate():
+    story = write_story()
+    story.journal.compact_ops = 100
+    story.save_to_file()
+    # The first save writes a snapshot so the story exists in storage
+    assert story.storage.story_exists(story.name)
+    story.add_segment("Samples")
+    story.save_to_file()
+    assert has_pending_journal(story.name)
+    story.journal.compact_ops = 1
+    story.save_to_file()
+    assert not has_pending_journal(story.name)
+    with open(story.location) as f:
+        assert [segment["title"] for segment in json.load(f)["segments"]] == ["Launch", "Touchdown", "Samples"]
+
+
+def test_new_story_replaces_an_old_one_at_the_same_location():
+    write_story().compact()
+    story = StoryStructure("Mars rover landing", journaled=True)
+    story.add_segment("Only segment")
+    assert [segment["title"] for segment in reload().segments] == ["Only segment"]
@@ -0,0 +1,90 @@
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend.api import main
+from src.backend.stories import payloads, storage
+from src.backend.stories.story_structure import StoryStructure
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Stories and payloads live under relative paths
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "_storage", storage.JSONFileStorage())
+    return TestClient(main.app)
+
+
+def make_story(name="Mars rover landing", journaled=False):
+    story = StoryStructure(name, journaled=journaled)
+    story.title = "Perseverance lands"
+    story.add_segment("Touchdown", "The rover landed in Jezero crater.")
+    return story
+
+
+def test_drafts_get_no_payloads_until_finalized(client):
+    story = make_story()
+    story.save_to_file()
+    assert payloads.load_meta(story.name) is None
+    story.finalize()
+    meta = payloads.load_meta(story.name)
+    assert payloads.is_current(meta, story.storage.story_version(story.name))
+
+
+def test_draft_payloads_are_encoded_on_read(client):
+    story = make_story()
+    story.save_to_file()
+    response = client.get("/stories/Mars rover landing.json")
+    assert response.status_code == 200
+    assert response.json()["title"] == "Perseverance lands"
+    assert payloads.load_meta(story.name) is not None
+
+
+def test_stale_payloads_are_encoded_again(client):
+    story = make_story()
+    story.finalize()
+    story.storage.save_story(story.name, {**story.to_json(), "title": "Edited elsewhere"})
+    assert client.get("/stories/Mars rover landing.json").json()["title"] == "Edited elsewhere"
+
+
+def test_missing_story_is_404(client):
+    assert client.get("/stories/nothing.json").status_code == 404
+
+
+def test_if_none_match_returns_304(client):
+    make_story().finalize()
+    response = client.get("/stories/Mars rover landing.json", headers={"Accept-Encoding": "identity"})
+    etag = response.headers["etag"]
+    again = client.get("/stories/Mars rover landing.json", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert again.content == b""
+    changed = client.get("/stories/Mars rover landing.json", headers={"Accept-Encoding": "identity", "If-None-Match": '"other"'})
+    assert changed.status_code == 200
+
+
+def test_accept_encoding_selects_variant(client):
+    make_story().finalize()
+    response = client.get("/stories/Mars rover landing.json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].endswith('-gzip"')
+    assert "Accept-Encoding" in response.headers["vary"]
+    raw = client.get("/stories/Mars rover landing.json", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert json.loads(gzip.decompress(open(payloads.payload_path("Mars rover landing", "gzip"), "rb").read())) == raw.json()
+
+
+@pytest.mark.parametrize("header, available, expected", [
+    ("gzip, br", ["gzip", "br"], "br"),
+    ("gzip", ["gzip", "br"], "gzip"),
+    ("br;q=0, gzip", ["gzip", "br"], "gzip"),
+    ("br", ["gzip"], None),
+    ("*", ["gzip"], "gzip"),
+    ("", ["gzip", "br"], None),
+    (None, ["gzip"], None),
+    ("gzip;q=bad", ["gzip"], None),
+])
+def test_choose_encoding(header, available, expected):
+    assert payloads.choose_encoding(header, available) == expected
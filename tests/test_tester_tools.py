@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.backend.agents.testerAgent import tester_tools
+from src.backend.agents.testerAgent.tester_tools import EvaluationContext, generate_story
+from src.backend.stories import storage
+
+
+class FakeNewsAgent:
+    def __init__(self, story):
+        self.story = story
+
+    def invoke(self, input):
+        self.story.title = "Mars rover landing"
+        self.story.add_segment("Touchdown", "It landed.")
+
+
+@pytest.fixture(autouse=True)
+def story_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "_storage", storage.JSONFileStorage())
+    monkeypatch.setattr(tester_tools, "NewsAgent", FakeNewsAgent)
+
+
+def test_generate_story_evaluates_the_new_story():
+    runtime = SimpleNamespace(context=EvaluationContext())
+    result = generate_story.func(runtime, "Mars rover landing")
+    assert result.startswith("Story generated successfully")
+    story = runtime.context.evaluation_report.story
+    assert story.name == "Mars rover landing"
+    assert story.segments[0]["title"] == "Touchdown"
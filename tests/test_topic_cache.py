@@ -0,0 +1,54 @@
+import pytest
+
+from src.backend.api.topic_cache import TopicCache, topic_similarity
+
+
+def make_cache(tmp_path):
+    return TopicCache(db_path=str(tmp_path / "topic_cache.db"))
+
+
+def test_paraphrase_hits(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.record("Federal Reserve cuts rates", "fed.json", 100.0)
+    hit = cache.lookup("fed rate cut")
+    assert hit is not None
+    assert hit["story_filename"] == "fed.json"
+
+
+def test_different_year_misses(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.record("2020 election results", "election_2020.json", 100.0)
+    assert cache.lookup("2024 election results") is None
+    assert topic_similarity("2024 election results", "2020 election results") == 0.0
+
+
+def test_different_entity_misses(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.record("Trump tariffs on Canada", "canada.json", 100.0)
+    assert cache.lookup("Trump tariffs on China") is None
+    assert topic_similarity("Trump tariffs on China", "Trump tariffs on Canada") == 0.0
+
+
+def test_more_specific_topic_still_matches():
+    assert topic_similarity("fed rate cut", "Federal Reserve cuts rates") >= 0.6
+
+
+def test_exact_topic_hits(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.record("Mars rover landing", "mars.json", 100.0)
+    assert cache.lookup("the Mars rover landing")["similarity"] == 1.0
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("topic, other", [
+    ("global war", "global warming"),
+    ("Ukraine war", "Ukraine warship"),
+    ("Apple earnings", "Applebee's earnings"),
+    ("fed rate cut september", "fed rate hike september"),
+    ("trump tariffs china mexico", "trump tariffs china canada"),
+])
+def test_different_subject_misses(tmp_path, topic, other):
+    cache = make_cache(tmp_path)
+    cache.record(other, "other.json", 100.0)
+    assert cache.lookup(topic) is None
+    assert topic_similarity(topic, other) == 0.0
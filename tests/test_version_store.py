@@ -0,0 +1,108 @@
+import os
+import threading
+
+import pytest
+
+from src.backend.stories import version_store
+
+
+@pytest.fixture(autouse=True)
+def version_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(version_store, "VERSION_STORAGE_DIR", str(tmp_path / "versions"))
+
+
+def story(*segments, title="Mars rover landing", research=()):
+    return {
+        "title": title,
+        "research": [{"url": url, "snippet": f"About {url}"} for url in research],
+        "segments": [{"title": seg_title, "text": text, "images": []} for seg_title, text in segments],
+    }
+
+
+def count_objects():
+    root = os.path.join(version_store.VERSION_STORAGE_DIR, "objects")
+    return sum(len([f for f in files if f.endswith(".json")]) for _, _, files in os.walk(root))
+
+
+def test_unchanged_content_is_stored_once():
+    first = story(("Launch", "July 2020"), ("Touchdown", "February 2021"), research=["a", "b"])
+    version_store.save_version("mars", "draft1", first)
+    assert count_objects() == 4
+    second = story(("Launch", "July 2020"), ("Touchdown", "18 February 2021"), research=["a", "b", "c"])
+    version_store.save_version("mars", "draft2", second)
+    # Only the edited segment and the new research chunk are new objects
+    assert count_objects() == 6
+    assert version_store.load_version("mars", "draft1") == first
+    assert version_store.load_version("mars", "draft2") == second
+
+
+def test_list_versions_oldest_first():
+    version_store.save_version("mars", "draft1", story(("Launch", "")))
+    version_store.save_version("mars", "final", story(("Launch", ""), ("Touchdown", ""), title="Perseverance"))
+    versions = version_store.list_versions("mars")
+    assert [(v["version"], v["title"], v["segments"]) for v in versions] == [
+        ("draft1", "Mars rover landing", 1),
+        ("final", "Perseverance", 2),
+    ]
+    assert version_store.list_versions("venus") == []
+
+
+def test_diff_versions():
+    version_store.save_version("mars", "old", story(("Launch", "July"), ("Cruise", "Seven months"), ("Touchdown", "Feb"), research=["a"]))
+    version_store.save_version("mars", "new", story(("Launch", "July"), ("Touchdown", "18 Feb"), ("Samples", "Cores"),
+                                                    title="Perseverance", research=["a", "b"]))
+    diff = version_store.diff_versions("mars", "old", "new")
+    assert diff == {
+        "title_changed": True,
+        "segments_added": ["Samples"],
+        "segments_removed": ["Cruise"],
+        "segments_changed": [{"title": "Touchdown", "fields": ["text"]}],
+        "segment_order_changed": False,
+        "research_chunks_added": 1,
+        "research_chunks_removed": 0,
+    }
+
+
+def test_diff_detects_reordering():
+    version_store.save_version("mars", "old", story(("Launch", ""), ("Touchdown", "")))
+    version_store.save_version("mars", "new", story(("Touchdown", ""), ("Launch", "")))
+    diff = version_store.diff_versions("mars", "old", "new")
+    assert diff["segment_order_changed"]
+    assert diff["segments_changed"] == []
+
+
+def test_missing_and_invalid_versions():
+    with pytest.raises(FileNotFoundError):
+        version_store.load_version("mars", "draft1")
+    with pytest.raises(ValueError):
+        version_store.save_version("mars", "../escape", story())
+
+
+def test_delete_and_collect_garbage():
+    version_store.save_version("mars", "draft1", story(("Launch", "July")))
+    version_store.save_version("venus", "draft1", story(("Launch", "July"), ("Orbit", "Clouds")))
+    version_store.delete_versions("venus")
+    assert version_store.list_versions("venus") == []
+    # The segment mars still uses survives
+    assert version_store.collect_garbage() == 1
+    assert version_store.load_version("mars", "draft1")["segments"][0]["text"] == "July"
+
+
+def test_concurrent_saves_of_the_same_content():
+    data = story(("Launch", "July"), research=["a"])
+    errors = []
+
+    def save(i):
+        try:
+            version_store.save_version("mars", f"v{i}", data)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert count_objects() == 2
+    assert all(version_store.load_version("mars", f"v{i}") == data for i in range(16))